@@ -20,6 +20,22 @@ ENV_VARS = {
     "VAULT_MOUNT_POINT": "prod"
 }
 
+# PVC for the local cache of S3 objects shared by steps, empty to disable.
+S3_CACHE_PVC = ""
+S3_CACHE_DIR = "/s3-cache"
+
+# KFP caching per step. Steps reading external state (new data, current
+# inference model on S3) must not be cached.
+STEP_CACHING = {
+    "download_data": False,
+    "prepare_data": True,
+    "hp_trial": True,
+    "hp_select": True,
+    "train_model": True,
+    "switch_model": False,
+    "model_inference": False,
+}
+
 RETRY_POLICY = {
     "num_retries": 12,
     "backoff_duration": "3600s",
@@ -1,4 +1,7 @@
+import json
 import sys
+from typing import List
+
 from kfp import dsl
 from kfp import kubernetes
 from kfp.compiler.compiler import Compiler
@@ -7,7 +10,12 @@ from kfp.dsl import (container_component, ContainerSpec, Artifact, Dataset, Inpu
 
 sys.path.append(".")
 sys.path.append("..")
-from kubeflow_pipeline.kfp_vars import ENV_VARS, SECRETS, SECRETS_APPROLE, RETRY_POLICY, PIPELINE_PATH
+sys.path.append("src")
+sys.path.append("../src")
+from kubeflow_pipeline.kfp_vars import (ENV_VARS, SECRETS, SECRETS_APPROLE, RETRY_POLICY, PIPELINE_PATH,
+                                        S3_CACHE_PVC, S3_CACHE_DIR, STEP_CACHING)
+from lib import config, hp_search
+from lib.fingerprint import code_fingerprint
 
 
 team_name = "dataplatform"
@@ -22,10 +30,12 @@ def download_data(
 ):
     return ContainerSpec(
         image=f"docker-local-{team_name}.art.lmru.tech/{team_name}/{project_name}/base-image:{tag}",
-        command=["python", "pipeline_steps/download_data/task.py"],
+        command=["python", "-m", "lib.step_runner", "download_data"],
         args=[
         "--executor_input",
             dsl.PIPELINE_TASK_EXECUTOR_INPUT_PLACEHOLDER,
+        "--code_fingerprint",
+            code_fingerprint("download_data"),
     ]
 )
 
@@ -38,10 +48,50 @@ def prepare_data(
 ):
     return ContainerSpec(
         image=f"docker-local-{team_name}.art.lmru.tech/{team_name}/{project_name}/base-image:{tag}",
-        command=["python", "pipeline_steps/prepare_data/task.py"],
+        command=["python", "-m", "lib.step_runner", "prepare_data"],
+        args=[
+        "--executor_input",
+            dsl.PIPELINE_TASK_EXECUTOR_INPUT_PLACEHOLDER,
+        "--code_fingerprint",
+            code_fingerprint("prepare_data"),
+    ]
+)
+
+@container_component
+def hp_trial(
+    train: Input[Dataset],
+    trial: str,
+    fraction: float,
+    metrics: Output[Metrics],
+    result: OutputPath(dict),
+):
+    return ContainerSpec(
+        image=f"docker-local-{team_name}.art.lmru.tech/{team_name}/{project_name}/base-image:{tag}",
+        command=["python", "-m", "lib.step_runner", "hp_trial"],
         args=[
         "--executor_input",
             dsl.PIPELINE_TASK_EXECUTOR_INPUT_PLACEHOLDER,
+        "--code_fingerprint",
+            code_fingerprint("hp_trial"),
+    ]
+)
+
+@container_component
+def hp_select(
+    results: List[dict],
+    keep: int,
+    metrics: Output[Metrics],
+    trials: OutputPath(list),
+    best_params: OutputPath(dict),
+):
+    return ContainerSpec(
+        image=f"docker-local-{team_name}.art.lmru.tech/{team_name}/{project_name}/base-image:{tag}",
+        command=["python", "-m", "lib.step_runner", "hp_select"],
+        args=[
+        "--executor_input",
+            dsl.PIPELINE_TASK_EXECUTOR_INPUT_PLACEHOLDER,
+        "--code_fingerprint",
+            code_fingerprint("hp_select"),
     ]
 )
 
@@ -51,13 +101,16 @@ def train_model(
     test: Input[Dataset],
     metrics: Output[ClassificationMetrics],
     model: Output[Model],
+    params: dict = {},
 ):
     return ContainerSpec(
         image=f"docker-local-{team_name}.art.lmru.tech/{team_name}/{project_name}/base-image:{tag}",
-        command=["python", "pipeline_steps/train_model/task.py"],
+        command=["python", "-m", "lib.step_runner", "train_model"],
         args=[
         "--executor_input",
             dsl.PIPELINE_TASK_EXECUTOR_INPUT_PLACEHOLDER,
+        "--code_fingerprint",
+            code_fingerprint("train_model"),
     ]
 )
 
@@ -70,10 +123,12 @@ def switch_model(
 ):
     return ContainerSpec(
         image=f"docker-local-{team_name}.art.lmru.tech/{team_name}/{project_name}/base-image:{tag}",
-        command=["python", "pipeline_steps/switch_model/task.py"],
+        command=["python", "-m", "lib.step_runner", "switch_model"],
         args=[
         "--executor_input",
             dsl.PIPELINE_TASK_EXECUTOR_INPUT_PLACEHOLDER,
+        "--code_fingerprint",
+            code_fingerprint("switch_model"),
     ]
 )
 
@@ -84,15 +139,17 @@ def inference_model(
 ):
     return ContainerSpec(
         image=f"docker-local-{team_name}.art.lmru.tech/{team_name}/{project_name}/base-image:{tag}",
-        command=["python", "pipeline_steps/model_inference/task.py"],
+        command=["python", "-m", "lib.step_runner", "model_inference"],
         args=[
         "--executor_input",
             dsl.PIPELINE_TASK_EXECUTOR_INPUT_PLACEHOLDER,
+        "--code_fingerprint",
+            code_fingerprint("model_inference"),
     ]
 )
 
 
-def prepare_task(task):
+def prepare_task(task, step=None):
     # Установка retry политик.
     task.set_retry(**RETRY_POLICY)
 
@@ -105,8 +162,18 @@ def prepare_task(task):
     # Добавление переменных окружения.
     for (key, value) in ENV_VARS.items():
         task.set_env_variable(name=key, value=value)
+
+    # Подключение локального кэша S3.
+    if S3_CACHE_PVC:
+        kubernetes.mount_pvc(task, pvc_name=S3_CACHE_PVC, mount_path=S3_CACHE_DIR)
+        task.set_env_variable(name="S3_CACHE_DIR", value=S3_CACHE_DIR)
         
-    task = task.set_caching_options(enable_caching=False)
+    # Кэширование шагов, результат которых определяется входами и кодом.
+    # Код и параметры конфига входят в аргументы шага (--code_fingerprint).
+    enable_caching = STEP_CACHING.get(step, False)
+    if step == "train_model" and config.INCREMENTAL:
+        enable_caching = False
+    task = task.set_caching_options(enable_caching=enable_caching)
 
     return task
 
@@ -115,16 +182,38 @@ def prepare_task(task):
 def pipeline():
     
     task_download_data = download_data()
-    task_download_data = prepare_task(task_download_data)
+    task_download_data = prepare_task(task_download_data, "download_data")
 
     task_prepare_data = prepare_data(data = task_download_data.outputs["data"])
-    task_prepare_data = prepare_task(task_prepare_data)
-
-    task_train_model = train_model(train = task_prepare_data.outputs["train"], test = task_prepare_data.outputs["test"])
-    task_train_model = prepare_task(task_train_model)
+    task_prepare_data = prepare_task(task_prepare_data, "prepare_data")
+
+    # Поиск гиперпараметров последовательным отсевом (successive halving):
+    # испытания каждого раунда обучаются параллельно на доле train,
+    # лучшие 1 / HP_SEARCH_ETA переходят в следующий раунд.
+    params = {}
+    search = hp_search.plan()
+    if config.HP_SEARCH and search["trials"]:
+        # Элементы цикла по выходу шага KFP передаёт строками, испытания передаются в JSON.
+        trials = [json.dumps(trial) for trial in search["trials"]]
+        for i, rung in enumerate(search["rungs"]):
+            with dsl.ParallelFor(items=trials, parallelism=config.HP_SEARCH_PARALLELISM) as trial:
+                task_hp_trial = hp_trial(train = task_prepare_data.outputs["train"], trial = trial,
+                                         fraction = rung["fraction"])
+                task_hp_trial = prepare_task(task_hp_trial, "hp_trial")
+                task_hp_trial.set_display_name(f"hp-trial-rung-{i}")
+            task_hp_select = hp_select(results = dsl.Collected(task_hp_trial.outputs["result"]),
+                                       keep = rung["keep"])
+            task_hp_select = prepare_task(task_hp_select, "hp_select")
+            task_hp_select.set_display_name(f"hp-select-rung-{i}")
+            trials = task_hp_select.outputs["trials"]
+        params = task_hp_select.outputs["best_params"]
+
+    task_train_model = train_model(train = task_prepare_data.outputs["train"], test = task_prepare_data.outputs["test"],
+                                   params = params)
+    task_train_model = prepare_task(task_train_model, "train_model")
 
     task_switch_model = switch_model(model= task_train_model.outputs["model"], test = task_prepare_data.outputs["test"])
-    task_switch_model = prepare_task(task_switch_model)
+    task_switch_model = prepare_task(task_switch_model, "switch_model")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,61 @@
+"""
+Compare Greenplum extract throughput of GreenplumConnector.execute
+(pd.read_sql_query) and GreenplumConnector.execute_copy (COPY TO STDOUT).
+
+Connection is taken from GP_* environmental variables.
+Run from src directory:
+    python benchmarks/gp_extract.py --rows 1000000 --columns 20
+"""
+import argparse
+import json
+import sys
+import time
+
+sys.path.append(".")
+from lib import connectors
+
+
+def build_query(rows: int, columns: int) -> str:
+    """
+    Build a query generating a wide synthetic table on the server.
+
+    :param rows: Number of rows.
+    :param columns: Number of float columns.
+    :return: Query as text.
+    """
+    values = ", ".join(f"random() AS f{i}" for i in range(columns))
+    return f"SELECT g AS id, {values} FROM generate_series(1, {rows}) AS g"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--columns", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    gp_con = connectors.GreenplumConnector()
+    query = build_query(args.rows, args.columns)
+    methods = {"read_sql_query": gp_con.execute, "copy": gp_con.execute_copy}
+
+    results = {}
+    for name, method in methods.items():
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            data = method(query)
+            timings.append(time.perf_counter() - start)
+            assert data.shape[0] == args.rows, f"{name} returned {data.shape[0]} rows"
+            del data
+        best = min(timings)
+        results[name] = {"seconds": best, "rows_per_second": args.rows / best}
+    results["speedup"] = (
+        results["read_sql_query"]["seconds"] / results["copy"]["seconds"]
+    )
+    gp_con.close_conenction()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""
+Run download_data, prepare_data, train_model and switch_model end to end
+on synthetic datasets of growing size and record wall time, peak RSS
+and bytes written by every step.
+
+A dataset with config.FEATURES and config.TARGET columns is generated
+in chunks for every size and written as a Dataset artifact. download_data
+reads it instead of the toy wine dataset, prepare_data gets it as input,
+next steps get outputs of the previous ones. Every step function is called
+in its own subprocess with local KFP artifacts, S3 is a local moto server
+(see devtools/s3_stub.py) and the step cache is off. A step failing or
+running out of time skips the rest of the steps of that size.
+
+Results are written as JSON to --output, compare reports across releases.
+Run from src directory:
+    python benchmarks/pipeline_steps.py --rows 10000 100000 1000000 \
+        --output pipeline_steps.json
+    python benchmarks/pipeline_steps.py --rows 100000000 \
+        --config MODEL_TYPE='"sgd"' --timeout 7200
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(".")
+from lib import config
+
+STEPS = ["download_data", "prepare_data", "train_model", "switch_model"]
+
+# Artifact class by parameter name, and where inputs come from.
+OUTPUTS = {
+    "download_data": {"metrics": "Metrics", "data": "Dataset"},
+    "prepare_data": {"metrics": "Metrics", "train": "Dataset", "test": "Dataset"},
+    "train_model": {"metrics": "ClassificationMetrics", "model": "Model"},
+    "switch_model": {"metrics": "Metrics"},
+}
+INPUTS = {
+    "download_data": {},
+    "prepare_data": {"data": ("source", "data")},
+    "train_model": {
+        "train": ("prepare_data", "train"),
+        "test": ("prepare_data", "test"),
+    },
+    "switch_model": {
+        "model": ("train_model", "model"),
+        "test": ("prepare_data", "test"),
+    },
+}
+INPUT_CLASSES = {
+    "data": "Dataset",
+    "train": "Dataset",
+    "test": "Dataset",
+    "model": "Model",
+}
+
+
+def write_source(path: str, rows: int, chunksize: int = 1_000_000) -> Dict[str, Any]:
+    """
+    Write synthetic dataset with config.FEATURES and config.TARGET columns
+    in chunks, target depends on the features so models have something to learn.
+
+    :param path: Artifact path.
+    :param rows: Number of rows.
+    :param chunksize: Number of rows generated at once.
+    :return: Artifact metadata.
+    """
+    from kfp import dsl
+
+    from lib import artifacts
+
+    rng = np.random.default_rng(0)
+    source = dsl.Dataset(name="data", uri=path, metadata={})
+    with artifacts.open_dataset_writer(source) as writer:
+        for offset in range(0, rows, chunksize):
+            size = min(chunksize, rows - offset)
+            features = rng.random((size, len(config.FEATURES)))
+            chunk = pd.DataFrame(features, columns=config.FEATURES)
+            noise = rng.normal(0, 0.5, size)
+            chunk[config.TARGET] = np.clip(
+                np.round(3 + 6 * features[:, :3].mean(axis=1) + noise), 3, 9
+            ).astype(np.int64)
+            writer.write(chunk)
+    return dict(source.metadata)
+
+
+def load_task(step: str) -> Any:
+    spec = importlib.util.spec_from_file_location(
+        f"{step}_task", f"pipeline_steps/{step}/task.py"
+    )
+    task = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = task
+    spec.loader.exec_module(task)
+    return task
+
+
+def current_rss() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def run_child(spec: Dict[str, Any]) -> None:
+    """
+    Call step function with local artifacts, in a subprocess.
+    Result is written as JSON to spec["result"].
+
+    :param spec: Step, artifacts, source dataset and config overrides.
+    """
+    from kfp import dsl
+
+    for name, value in spec["config"].items():
+        setattr(config, name, value)
+    config.STEP_CACHE = False
+    task = load_task(spec["step"])
+    if spec["step"] == "download_data":
+        from lib import artifacts
+
+        source = dsl.Dataset(
+            name="data", uri=spec["source"], metadata=spec["source_metadata"]
+        )
+
+        def load_source(as_frame: bool = True) -> Dict[str, Any]:
+            frame = artifacts.read_dataset(source)
+            return {"data": frame[config.FEATURES], "target": frame[config.TARGET]}
+
+        task.load_wine = load_source
+
+    kwargs = {}
+    for name, (path, class_name, metadata) in spec["artifacts"].items():
+        kwargs[name] = getattr(dsl, class_name)(name=name, uri=path, metadata=metadata)
+    rss_before = current_rss()
+    start = time.perf_counter()
+    getattr(task, spec["step"])(**kwargs)
+    seconds = time.perf_counter() - start
+    result = {
+        "seconds": seconds,
+        "rss_before_mb": rss_before / 1024**2,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "metadata": {
+            name: kwargs[name].metadata for name in OUTPUTS[spec["step"]]
+        },
+    }
+    with open(spec["result"], "w") as f:
+        json.dump(result, f, default=str)
+
+
+def path_size(path: str) -> int:
+    if os.path.isdir(path):
+        return sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, names in os.walk(path)
+            for name in names
+        )
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def bucket_size(s3_con: Any) -> int:
+    paginator = s3_con.s3_session.get_paginator("list_objects_v2")
+    return sum(
+        obj["Size"]
+        for page in paginator.paginate(Bucket=s3_con.bucket)
+        for obj in page.get("Contents", [])
+    )
+
+
+def run_size(
+    rows: int,
+    workdir: str,
+    steps: List[str],
+    overrides: Dict[str, Any],
+    timeout: Optional[float],
+    s3_con: Any,
+) -> Dict[str, Any]:
+    """
+    Generate dataset of given size and run steps on it one by one.
+
+    :param rows: Number of rows.
+    :param workdir: Directory for artifacts of this size.
+    :param steps: Steps to run.
+    :param overrides: config values for steps.
+    :param timeout: Timeout of a step in seconds.
+    :param s3_con: S3Connector of the stand-in bucket.
+    :return: Results by step.
+    """
+    os.makedirs(workdir, exist_ok=True)
+    source = os.path.join(workdir, "source")
+    start = time.perf_counter()
+    outputs = {"source": {"data": (source, write_source(source, rows))}}
+    results = {
+        "generate_seconds": time.perf_counter() - start,
+        "source_bytes": path_size(source),
+        "steps": {},
+    }
+    # Every size starts without an inference model.
+    for path in (config.INFERENCE_MODEL_PATH, config.LEGACY_INFERENCE_MODEL_PATH):
+        s3_con.s3_session.delete_object(Bucket=s3_con.bucket, Key=path)
+
+    failed = None
+    for step in steps:
+        if failed is not None:
+            results["steps"][step] = {
+                "status": "skipped",
+                "reason": f"{failed} failed",
+            }
+            continue
+        step_artifacts = {}
+        for name, (from_step, from_name) in INPUTS[step].items():
+            path, metadata = outputs[from_step][from_name]
+            step_artifacts[name] = (path, INPUT_CLASSES[name], metadata)
+        for name, class_name in OUTPUTS[step].items():
+            path = os.path.join(workdir, step, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            step_artifacts[name] = (path, class_name, {})
+        spec = {
+            "step": step,
+            "artifacts": step_artifacts,
+            "source": source,
+            "source_metadata": outputs["source"]["data"][1],
+            "config": overrides,
+            "result": os.path.join(workdir, f"{step}.json"),
+        }
+
+        s3_before = bucket_size(s3_con)
+        start = time.perf_counter()
+        try:
+            process = subprocess.run(
+                [sys.executable, __file__, "--child", json.dumps(spec)],
+                capture_output=True,
+                text=True,
+                timeout=timeout,
+            )
+            status = "ok" if process.returncode == 0 else "failed"
+            error = process.stderr.strip().splitlines()[-1:] if status != "ok" else []
+        except subprocess.TimeoutExpired:
+            status, error = "timeout", [f"longer than {timeout}s"]
+        wall = time.perf_counter() - start
+
+        result = {"status": status, "process_seconds": wall}
+        if status == "ok":
+            with open(spec["result"]) as f:
+                child = json.load(f)
+            outputs[step] = {
+                name: (step_artifacts[name][0], metadata)
+                for name, metadata in child.pop("metadata").items()
+            }
+            result.update(child)
+            # Scalar metrics only, confusion matrices are left out.
+            result["metrics"] = {
+                name: value
+                for name, value in outputs[step]["metrics"][1].items()
+                if not isinstance(value, (dict, list))
+            }
+            result["artifact_bytes"] = sum(
+                path_size(step_artifacts[name][0]) for name in OUTPUTS[step]
+            )
+            result["s3_bytes"] = bucket_size(s3_con) - s3_before
+        else:
+            result["error"] = " ".join(error)
+            failed = step
+        results["steps"][step] = result
+        print(f"{rows} rows, {step}: {status} in {wall:.1f}s", file=sys.stderr)
+    return results
+
+
+def parse_overrides(values: List[str]) -> Dict[str, Any]:
+    overrides = {}
+    for value in values:
+        name, _, raw = value.partition("=")
+        if not hasattr(config, name):
+            raise ValueError(f"Unknown config value {name}.")
+        overrides[name] = json.loads(raw)
+    return overrides
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--steps", nargs="+", choices=STEPS, default=STEPS)
+    parser.add_argument(
+        "--config", nargs="*", default=[], help="config overrides NAME=json_value"
+    )
+    parser.add_argument("--timeout", type=float, default=None)
+    parser.add_argument("--workdir", type=str, default=None)
+    parser.add_argument("--output", type=str, default=None)
+    parser.add_argument("--child", type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        run_child(json.loads(args.child))
+        return
+
+    from devtools import s3_stub
+    from lib import connectors, resources
+
+    overrides = parse_overrides(args.config)
+    steps = [step for step in STEPS if step in args.steps]
+    for step in steps:
+        for from_step, _ in INPUTS[step].values():
+            if from_step not in steps + ["source"]:
+                parser.error(f"{step} needs outputs of {from_step}.")
+    workdir = args.workdir or tempfile.mkdtemp(prefix="pipeline_steps_")
+    server = s3_stub.serve("benchmark")
+    s3_con = connectors.S3Connector()
+    report = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "commit": subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+        ).stdout.strip(),
+        "python": platform.python_version(),
+        "cpus": resources.available_cpus(),
+        "config": {"MODEL_TYPE": config.MODEL_TYPE, **overrides},
+        "sizes": {},
+    }
+    try:
+        for rows in args.rows:
+            report["sizes"][str(rows)] = run_size(
+                rows,
+                os.path.join(workdir, str(rows)),
+                steps,
+                overrides,
+                args.timeout,
+                s3_con,
+            )
+            if args.workdir is None:
+                shutil.rmtree(os.path.join(workdir, str(rows)), ignore_errors=True)
+    finally:
+        server.stop()
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Compare wall time and peak traced allocations of prepare_data
+in-memory preprocessing: preprcocess_and_split_data (train_test_split,
+Normalizer and pd.concat) and preprocess_and_split_array (single block,
+in-place normalization).
+
+Run from src directory:
+    python benchmarks/prepare_data.py --rows 10000000
+"""
+import argparse
+import gc
+import importlib.util
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(".")
+from lib import config
+
+
+def load_task():
+    spec = importlib.util.spec_from_file_location(
+        "prepare_data_task", "pipeline_steps/prepare_data/task.py"
+    )
+    task = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(task)
+    return task
+
+
+def synthetic_dataset(rows: int) -> pd.DataFrame:
+    """
+    Dataset with config.FEATURES and config.TARGET columns.
+
+    :param rows: Number of rows.
+    :return: Dataframe.
+    """
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(
+        rng.random((rows, len(config.FEATURES))), columns=config.FEATURES
+    )
+    data[config.TARGET] = rng.integers(3, 9, size=rows)
+    return data
+
+
+def measure(func, data: pd.DataFrame) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(data)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {
+        "seconds": seconds,
+        "peak_allocated_mb": peak / 1024**2,
+        "peak_to_input": peak / data.memory_usage(index=True).sum(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    args = parser.parse_args()
+
+    task = load_task()
+    data = synthetic_dataset(args.rows)
+    results = {
+        "rows": args.rows,
+        "input_mb": data.memory_usage(index=True).sum() / 1024**2,
+        "current": measure(task.preprcocess_and_split_data, data),
+        "array": measure(task.preprocess_and_split_array, data),
+        "array_float32": measure(
+            lambda frame: task.preprocess_and_split_array(frame, dtype=np.float32),
+            data,
+        ),
+    }
+    results["speedup"] = results["current"]["seconds"] / results["array"]["seconds"]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
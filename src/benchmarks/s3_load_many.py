@@ -0,0 +1,106 @@
+"""
+Compare loading many small files from S3 one by one
+and concurrently with S3Connector.load_many, both with a single GET per file.
+Correctness of load_many and save_many is tested in tests/test_s3_connector.py.
+
+Runs against a local moto server (pip install -r requirements-dev.txt)
+unless --external is given, then connection is taken from S3_* environmental
+variables. Round-trip latency of a remote S3 can be simulated
+with --latency_ms, it is added before every request.
+Run from src directory:
+    python benchmarks/s3_load_many.py --files 1000 --latency_ms 20
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(".")
+from devtools import s3_stub
+from lib import connectors
+
+PREFIX = "benchmarks/load_many"
+
+
+def add_latency(s3_con: connectors.S3Connector, latency_ms: float) -> None:
+    def sleep(**kwargs) -> None:
+        time.sleep(latency_ms / 1000)
+
+    s3_con.s3_session.meta.events.register("before-send.s3", sleep)
+
+
+async def load_concurrently(
+    s3_con: connectors.S3Connector, filenames: list, max_concurrency: int
+) -> int:
+    rows = 0
+    async for _, data in s3_con.load_many(filenames, max_concurrency):
+        rows += data.shape[0]
+    return rows
+
+
+def measure(func) -> dict:
+    start = time.perf_counter()
+    rows = func()
+    seconds = time.perf_counter() - start
+    return {"seconds": seconds, "rows": rows}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--max_concurrency", type=int, default=32)
+    parser.add_argument("--latency_ms", type=float, default=0)
+    parser.add_argument("--external", action="store_true")
+    args = parser.parse_args()
+
+    server = None if args.external else s3_stub.serve("benchmark")
+    s3_con = connectors.S3Connector(max_pool_connections=args.max_concurrency)
+    if args.latency_ms:
+        add_latency(s3_con, args.latency_ms)
+
+    rng = np.random.default_rng(0)
+    tables = {
+        f"{PREFIX}/{i:05d}.parquet": pd.DataFrame(
+            rng.random((args.rows, 4)), columns=["a", "b", "c", "d"]
+        )
+        for i in range(args.files)
+    }
+    filenames = list(tables)
+    upload = measure(
+        lambda: len(
+            asyncio.run(s3_con.save_many(tables, max_concurrency=args.max_concurrency))
+        )
+    )
+
+    results = {
+        "files": args.files,
+        "file_bytes": s3_con.s3_session.head_object(
+            Bucket=s3_con.bucket, Key=filenames[0]
+        )["ContentLength"],
+        "latency_ms": args.latency_ms,
+        "save_many": upload,
+        "sequential": measure(
+            lambda: sum(s3_con._load_object(name).shape[0] for name in filenames)
+        ),
+        "load_many": measure(
+            lambda: asyncio.run(
+                load_concurrently(s3_con, filenames, args.max_concurrency)
+            )
+        ),
+    }
+    results["speedup"] = (
+        results["sequential"]["seconds"] / results["load_many"]["seconds"]
+    )
+    print(json.dumps(results, indent=2))
+    s3_con.clean_s3([PREFIX], 0)
+    if server is not None:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
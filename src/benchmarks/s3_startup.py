@@ -0,0 +1,85 @@
+"""
+Measure S3Connector startup latency: constructing a connector and making
+the first request, compared with the eager startup the connector used to do
+(new client, head_bucket, resource and list_objects on every construction).
+
+Connection is taken from S3_* environmental variables.
+Run from src directory:
+    python benchmarks/s3_startup.py --repeat 20
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import boto3
+
+sys.path.append(".")
+from lib import connectors
+
+
+def eager_startup() -> None:
+    """
+    Startup sequence of the connector before lazy shared clients.
+    """
+    endpoint = os.getenv("S3_ENDPOINT")
+    key_id = os.getenv("S3_KEY_ID")
+    access_key = os.getenv("S3_ACCESS_KEY")
+    bucket = os.getenv("S3_BUCKET")
+    client = boto3.session.Session().client(
+        service_name="s3",
+        endpoint_url=endpoint,
+        aws_access_key_id=key_id,
+        aws_secret_access_key=access_key,
+    )
+    client.head_bucket(Bucket=bucket)
+    boto3.resource(
+        "s3",
+        endpoint_url=endpoint,
+        aws_access_key_id=key_id,
+        aws_secret_access_key=access_key,
+    )
+    client.list_objects(Bucket=bucket)
+    client.list_objects_v2(Bucket=bucket, MaxKeys=1)
+
+
+def lazy_startup() -> None:
+    """
+    Current startup: shared client and bucket validated once per process.
+    """
+    s3_con = connectors.S3Connector()
+    s3_con.s3_session.list_objects_v2(Bucket=s3_con.bucket, MaxKeys=1)
+
+
+def measure(func, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {
+        "first_ms": timings[0] * 1000,
+        "median_ms": statistics.median(timings) * 1000,
+        "total_ms": sum(timings) * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    results = {
+        "eager": measure(eager_startup, args.repeat),
+        "lazy": measure(lazy_startup, args.repeat),
+    }
+    results["speedup_total"] = (
+        results["eager"]["total_ms"] / results["lazy"]["total_ms"]
+    )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
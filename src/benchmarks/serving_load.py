@@ -0,0 +1,120 @@
+"""
+Load test of the online inference server: concurrent clients send
+single-row requests, latency percentiles and QPS are reported
+with micro-batching and without it (batch size 1).
+
+A random forest fitted on synthetic data is served from a local file.
+Run from src directory:
+    python benchmarks/serving_load.py --requests 5000 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+sys.path.append(".")
+from lib import config, model_io
+
+
+def fit_model(path: str) -> None:
+    rng = np.random.default_rng(0)
+    X = rng.random((20_000, len(config.FEATURES)))
+    y = (X[:, 0] * 6).astype(int) + 3
+    model_io.dump_model(RandomForestClassifier(100, n_jobs=1).fit(X, y), path)
+
+
+async def wait_ready(url: str, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(f"{url}/health") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            if time.monotonic() > deadline:
+                raise TimeoutError("Server did not start")
+            await asyncio.sleep(0.2)
+
+
+async def load(url: str, n_requests: int, concurrency: int) -> dict:
+    rng = np.random.default_rng(1)
+    latencies = []
+    counter = iter(range(n_requests))
+
+    async def client(session: aiohttp.ClientSession) -> None:
+        for _ in counter:
+            body = {"instances": rng.random((1, len(config.FEATURES))).tolist()}
+            start = time.perf_counter()
+            async with session.post(f"{url}/predict", json=body) as response:
+                await response.json()
+                assert response.status == 200
+            latencies.append(time.perf_counter() - start)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+        seconds = time.perf_counter() - start
+    return {
+        "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+        "p99_ms": float(np.percentile(latencies, 99)) * 1000,
+        "qps": n_requests / seconds,
+    }
+
+
+def run(model_file: str, port: int, max_batch_size: int, args: argparse.Namespace) -> dict:
+    server = subprocess.Popen(
+        [
+            sys.executable, "serving/server.py",
+            "--model_file", model_file,
+            "--port", str(port),
+            "--max_batch_size", str(max_batch_size),
+            "--max_wait_ms", str(args.max_wait_ms),
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        asyncio.run(wait_ready(url))
+        asyncio.run(load(url, min(200, args.requests), args.concurrency))  # warm up
+        return asyncio.run(load(url, args.requests, args.concurrency))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--max_batch_size", type=int, default=config.SERVING_MAX_BATCH_SIZE)
+    parser.add_argument("--max_wait_ms", type=float, default=config.SERVING_MAX_WAIT_MS)
+    parser.add_argument("--port", type=int, default=18080)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        model_file = os.path.join(directory, "model.joblib")
+        fit_model(model_file)
+        results = {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "unbatched": run(model_file, args.port, 1, args),
+            "batched": run(model_file, args.port + 1, args.max_batch_size, args),
+        }
+    results["qps_speedup"] = results["batched"]["qps"] / results["unbatched"]["qps"]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Measure cold startup of pipeline steps through lib.step_runner:
+wall time until the step function could run (--dry_run, without Vault)
+and import time per top-level package from `python -X importtime`.
+
+Run from src directory:
+    python benchmarks/step_startup.py --repeat 3 --top 8
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+sys.path.append(".")
+from lib.step_runner import STEPS
+
+
+def parse_importtime(stderr: str) -> Dict[str, float]:
+    """
+    Self import time in seconds per top-level package
+    from `-X importtime` output.
+
+    :param stderr: Process stderr.
+    :return: Seconds by package.
+    """
+    packages: Dict[str, float] = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line.split("|")
+        packages[name.strip().split(".")[0]] += int(self_us.split(":")[1]) / 1e6
+    return packages
+
+
+def measure(step: str, repeat: int) -> Dict[str, object]:
+    walls: List[float] = []
+    runner: List[dict] = []
+    packages: Dict[str, float] = {}
+    for i in range(repeat):
+        command = [sys.executable]
+        if i == 0:
+            command += ["-X", "importtime"]
+        command += ["-m", "lib.step_runner", step, "--dry_run"]
+        start = time.perf_counter()
+        result = subprocess.run(command, capture_output=True, text=True, check=True)
+        elapsed = time.perf_counter() - start
+        if i == 0:
+            packages = parse_importtime(result.stderr)
+            continue  # importtime itself slows imports down
+        walls.append(elapsed)
+        runner.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return {
+        "wall_s": statistics.median(walls),
+        "imports_s": statistics.median(r["imports"] for r in runner),
+        "import_by_package_s": packages,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument("--steps", nargs="*", default=sorted(STEPS))
+    args = parser.parse_args()
+
+    results = {}
+    for step in args.steps:
+        result = measure(step, args.repeat + 1)
+        packages = result.pop("import_by_package_s")
+        result["top_imports_s"] = dict(
+            sorted(packages.items(), key=lambda item: -item[1])[: args.top]
+        )
+        results[step] = result
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
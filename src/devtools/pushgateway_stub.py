@@ -0,0 +1,153 @@
+"""
+Local stand-in for Prometheus pushgateway, enough to check what steps push.
+Not secure, do not expose.
+
+Run from src directory:
+    python devtools/pushgateway_stub.py --port 9091
+Then:
+    PROMETHEUS_URL=http://127.0.0.1:9091 python -m lib.step_runner ...
+
+PUT and POST /metrics/job/<job>[/<label>/<value>...] replace or merge samples
+of the group, DELETE removes it. GET /metrics returns all samples with
+group labels in text format, GET /stub/groups returns them as JSON.
+"""
+import argparse
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+_GROUP = re.compile(r"^/metrics/job/(?P<labels>[^/]+(?:/[^/]+/[^/]+)*)/?$")
+_SAMPLE = re.compile(
+    r"^(?P<name>[a-zA-Z_:][a-zA-Z0-9_:]*)(?P<labels>\{.*\})?\s+(?P<value>\S+)"
+)
+
+
+class PushgatewayStub:
+    """
+    State of the stand-in: pushed samples by group.
+    """
+
+    def __init__(self) -> None:
+        self.groups: Dict[Tuple[Tuple[str, str], ...], Dict[str, float]] = {}
+        self.stats = {"pushes": 0, "deletes": 0}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def group_key(path: str) -> Optional[Tuple[Tuple[str, str], ...]]:
+        match = _GROUP.match(path.split("?")[0])
+        if match is None:
+            return None
+        parts = ["job"] + match["labels"].split("/")
+        return tuple(zip(parts[::2], parts[1::2]))
+
+    @staticmethod
+    def parse(text: str) -> Dict[str, float]:
+        samples = {}
+        for line in text.splitlines():
+            match = _SAMPLE.match(line.strip())
+            if match is not None and not line.startswith("#"):
+                samples[match["name"] + (match["labels"] or "")] = float(match["value"])
+        return samples
+
+    def push(self, key: Tuple[Tuple[str, str], ...], text: str, replace: bool) -> None:
+        samples = self.parse(text)
+        with self.lock:
+            self.stats["pushes"] += 1
+            if replace or key not in self.groups:
+                self.groups[key] = samples
+            else:
+                self.groups[key].update(samples)
+
+    def delete(self, key: Tuple[Tuple[str, str], ...]) -> None:
+        with self.lock:
+            self.stats["deletes"] += 1
+            self.groups.pop(key, None)
+
+    def exposition(self) -> str:
+        lines = []
+        with self.lock:
+            for key, samples in self.groups.items():
+                group = ",".join(f'{name}="{value}"' for name, value in key)
+                for sample, value in samples.items():
+                    name, _, labels = sample.partition("{")
+                    labels = f"{group},{labels}" if labels else f"{group}}}"
+                    lines.append(f"{name}{{{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def make_handler(stub: PushgatewayStub) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        def _send(
+            self, status: int, body: str, content_type: str = "text/plain"
+        ) -> None:
+            payload = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _push(self, replace: bool) -> None:
+            key = stub.group_key(self.path)
+            if key is None:
+                self._send(404, "not found\n")
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            stub.push(key, self.rfile.read(length).decode("utf-8"), replace)
+            self._send(200, "")
+
+        def do_GET(self) -> None:
+            if self.path == "/metrics":
+                self._send(200, stub.exposition())
+            elif self.path == "/stub/groups":
+                groups = [
+                    {"labels": dict(key), "samples": samples}
+                    for key, samples in stub.groups.items()
+                ]
+                self._send(200, json.dumps(groups), "application/json")
+            else:
+                self._send(404, "not found\n")
+
+        def do_PUT(self) -> None:
+            self._push(replace=True)
+
+        def do_POST(self) -> None:
+            self._push(replace=False)
+
+        def do_DELETE(self) -> None:
+            key = stub.group_key(self.path)
+            if key is None:
+                self._send(404, "not found\n")
+                return
+            stub.delete(key)
+            self._send(202, "")
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    return Handler
+
+
+def serve(stub: PushgatewayStub, port: int = 9091) -> ThreadingHTTPServer:
+    """
+    Start the stand-in in a background thread.
+
+    :param stub: State.
+    :param port: Port, 0 for any free one.
+    :return: Server, stop it with shutdown().
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(stub))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=9091)
+    args = parser.parse_args()
+
+    ThreadingHTTPServer(
+        ("127.0.0.1", args.port), make_handler(PushgatewayStub())
+    ).serve_forever()
@@ -0,0 +1,64 @@
+"""
+Local stand-in for S3 on top of moto server, for benchmarks and local runs
+(pip install -r requirements-dev.txt). Objects are kept in memory.
+
+Run from src directory:
+    python devtools/s3_stub.py --port 5000 --bucket benchmark
+Then:
+    S3_ENDPOINT=http://127.0.0.1:5000 S3_KEY_ID=testing S3_ACCESS_KEY=testing \
+    S3_BUCKET=benchmark python ...
+"""
+import argparse
+import logging
+import os
+import threading
+from typing import Any
+
+KEY_ID = "testing"
+ACCESS_KEY = "testing"
+
+
+def serve(bucket: str, port: int = 0, set_env: bool = True) -> Any:
+    """
+    Start moto server in a background thread and create the bucket.
+
+    :param bucket: Bucket name.
+    :param port: Port, 0 for any free one.
+    :param set_env: Set S3_* env for S3Connector, also inherited by subprocesses.
+    :return: Server, stop it with stop().
+    """
+    import boto3
+    from moto.server import ThreadedMotoServer
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = ThreadedMotoServer(port=port, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    endpoint = f"http://{host}:{port}"
+    boto3.client(
+        "s3",
+        endpoint_url=endpoint,
+        aws_access_key_id=KEY_ID,
+        aws_secret_access_key=ACCESS_KEY,
+        region_name="us-east-1",
+    ).create_bucket(Bucket=bucket)
+    if set_env:
+        os.environ.update(
+            {
+                "S3_ENDPOINT": endpoint,
+                "S3_KEY_ID": KEY_ID,
+                "S3_ACCESS_KEY": ACCESS_KEY,
+                "S3_BUCKET": bucket,
+            }
+        )
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--bucket", type=str, default="benchmark")
+    args = parser.parse_args()
+
+    serve(args.bucket, args.port, set_env=False)
+    threading.Event().wait()
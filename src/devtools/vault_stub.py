@@ -0,0 +1,183 @@
+"""
+Local stand-in for Vault with AppRole login, token renewal and KV v2 reads,
+enough for VaultConnector in local runs and tests. Not secure, do not expose.
+
+Run from src directory:
+    python devtools/vault_stub.py --port 8200 --secrets secrets.json --token_ttl 3600
+
+secrets.json maps "<mount_point>/<path>" to secrets, e.g.
+    {"prod/secret_vars": {"S3_KEY_ID": "...", "S3_ACCESS_KEY": "..."}}
+Any role_id and secret_id are accepted unless --role_id/--secret_id are given.
+Then:
+    VAULT_ADDR=http://127.0.0.1:8200 VAULT_ROLE_ID=x VAULT_SECRET_ID=y \
+    VAULT_NAMESPACE=ns python -m lib.step_runner ...
+
+GET /stub/stats returns counters of logins, renewals and reads.
+"""
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+_KV_DATA = re.compile(r"^/v1/(?P<mount>.+?)/data/(?P<path>.+)$")
+
+
+class VaultStub:
+    """
+    State of the stand-in: secrets with versions, issued tokens, counters.
+
+    :param secrets: Secrets by "<mount_point>/<path>".
+    :param token_ttl: Lease duration of issued tokens in seconds.
+    :param role_id: Accepted role id, any if None.
+    :param secret_id: Accepted secret id, any if None.
+    """
+
+    def __init__(
+        self,
+        secrets: Dict[str, Dict[str, Any]],
+        token_ttl: int = 3600,
+        role_id: Optional[str] = None,
+        secret_id: Optional[str] = None,
+    ) -> None:
+        self.secrets = {key: {"data": value, "version": 1} for key, value in secrets.items()}
+        self.token_ttl = token_ttl
+        self.role_id = role_id
+        self.secret_id = secret_id
+        self.tokens: Dict[str, float] = {}
+        self.stats = {"logins": 0, "renewals": 0, "reads": 0, "writes": 0}
+        self.lock = threading.Lock()
+
+    def _auth(self, token: str) -> Dict[str, Any]:
+        self.tokens[token] = time.time() + self.token_ttl
+        return {
+            "auth": {
+                "client_token": token,
+                "lease_duration": self.token_ttl,
+                "renewable": True,
+                "policies": ["default"],
+            }
+        }
+
+    def login(self, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        if (self.role_id is not None and body.get("role_id") != self.role_id) or (
+            self.secret_id is not None and body.get("secret_id") != self.secret_id
+        ):
+            return 400, {"errors": ["invalid role or secret ID"]}
+        with self.lock:
+            self.stats["logins"] += 1
+            return 200, self._auth(f"s.{uuid.uuid4().hex}")
+
+    def valid(self, token: Optional[str]) -> bool:
+        return token is not None and self.tokens.get(token, 0) > time.time()
+
+    def renew(self, token: str) -> Tuple[int, Dict[str, Any]]:
+        with self.lock:
+            self.stats["renewals"] += 1
+            return 200, self._auth(token)
+
+    def read(self, key: str) -> Tuple[int, Dict[str, Any]]:
+        with self.lock:
+            self.stats["reads"] += 1
+            secret = self.secrets.get(key)
+        if secret is None:
+            return 404, {"errors": []}
+        return 200, {
+            "data": {
+                "data": secret["data"],
+                "metadata": {"version": secret["version"], "destroyed": False},
+            }
+        }
+
+    def write(self, key: str, data: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        with self.lock:
+            self.stats["writes"] += 1
+            version = self.secrets.get(key, {"version": 0})["version"] + 1
+            self.secrets[key] = {"data": data, "version": version}
+        return 200, {"data": {"version": version}}
+
+
+def make_handler(stub: VaultStub) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body: Dict[str, Any]) -> None:
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _body(self) -> Dict[str, Any]:
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def _authorized(self) -> bool:
+            if stub.valid(self.headers.get("X-Vault-Token")):
+                return True
+            self._send(403, {"errors": ["permission denied"]})
+            return False
+
+        def do_GET(self) -> None:
+            if self.path == "/stub/stats":
+                self._send(200, stub.stats)
+                return
+            match = _KV_DATA.match(self.path.split("?")[0])
+            if match is None:
+                self._send(404, {"errors": []})
+            elif self._authorized():
+                self._send(*stub.read(f"{match['mount']}/{match['path']}"))
+
+        def do_POST(self) -> None:
+            body = self._body()
+            if self.path == "/v1/auth/approle/login":
+                self._send(*stub.login(body))
+                return
+            if self.path == "/v1/auth/token/renew-self":
+                if self._authorized():
+                    self._send(*stub.renew(self.headers["X-Vault-Token"]))
+                return
+            match = _KV_DATA.match(self.path)
+            if match is None:
+                self._send(404, {"errors": []})
+            elif self._authorized():
+                self._send(*stub.write(f"{match['mount']}/{match['path']}", body["data"]))
+
+        do_PUT = do_POST
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    return Handler
+
+
+def serve(stub: VaultStub, port: int = 8200) -> ThreadingHTTPServer:
+    """
+    Start the stand-in in a background thread.
+
+    :param stub: State.
+    :param port: Port, 0 for any free one.
+    :return: Server, stop it with shutdown().
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(stub))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument("--secrets", type=str, default=None)
+    parser.add_argument("--token_ttl", type=int, default=3600)
+    parser.add_argument("--role_id", type=str, default=None)
+    parser.add_argument("--secret_id", type=str, default=None)
+    args = parser.parse_args()
+
+    secrets = {}
+    if args.secrets is not None:
+        with open(args.secrets) as f:
+            secrets = json.load(f)
+    vault = VaultStub(secrets, args.token_ttl, args.role_id, args.secret_id)
+    ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(vault)).serve_forever()
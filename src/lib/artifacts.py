@@ -0,0 +1,243 @@
+"""
+Reading and writing of KFP Dataset artifacts passed between steps.
+
+Datasets are written as typed Parquet by default, format, schema and
+number of rows are recorded in artifact metadata. Reading detects the
+format from metadata or from the file itself, so csv artifacts
+of older runs are still read.
+"""
+from __future__ import annotations
+
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow.parquet as pq
+
+# pandas and pyarrow are imported where they are used, so steps
+# can import artifacts before their heavy libraries.
+
+DEFAULT_FORMAT = "parquet"
+FORMATS = ("parquet", "feather", "csv")
+
+
+def write_dataset(
+    data: pd.DataFrame, artifact: Any, file_format: str = DEFAULT_FORMAT
+) -> None:
+    """
+    Write dataframe to artifact path and describe it in artifact metadata.
+    Index is not written.
+
+    :param data: Dataframe.
+    :param artifact: KFP artifact (Output[Dataset]).
+    :param file_format: parquet, feather or csv.
+    """
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    if file_format == "parquet":
+        pq.write_table(
+            pa.Table.from_pandas(data, preserve_index=False),
+            artifact.path,
+            compression="snappy",
+        )
+    elif file_format == "feather":
+        feather.write_feather(data.reset_index(drop=True), artifact.path)
+    elif file_format == "csv":
+        data.to_csv(artifact.path, index=False, encoding="utf-8")
+    else:
+        raise ValueError(
+            f"Artifacts: Supported formats are {FORMATS}, not {file_format}!"
+        )
+
+    _describe(artifact, file_format, data.dtypes.items(), data.shape[0])
+
+
+def _describe(
+    artifact: Any, file_format: str, dtypes: Iterator[Any], num_rows: int
+) -> None:
+    artifact.metadata["format"] = file_format
+    artifact.metadata["schema"] = {str(column): str(dtype) for column, dtype in dtypes}
+    artifact.metadata["num_rows"] = int(num_rows)
+
+
+def read_dataset(artifact: Any, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Read dataframe from artifact written by write_dataset or as legacy csv.
+
+    :param artifact: KFP artifact (Input[Dataset]).
+    :param columns: Columns to read, all if None.
+    :return: Dataframe.
+    """
+    import pandas as pd
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    file_format = dataset_format(artifact)
+    if file_format == "parquet":
+        return pq.read_table(artifact.path, columns=columns).to_pandas()
+    if file_format == "feather":
+        return feather.read_feather(artifact.path, columns=columns)
+    return pd.read_csv(artifact.path, usecols=columns)
+
+
+def dataset_format(artifact: Any) -> str:
+    """
+    Format of dataset artifact from its metadata,
+    or from the file magic bytes if metadata is missing.
+
+    :param artifact: KFP artifact.
+    :return: parquet, feather or csv.
+    """
+    file_format = (artifact.metadata or {}).get("format")
+    if file_format in FORMATS:
+        return file_format
+    with open(artifact.path, "rb") as f:
+        magic = f.read(6)
+    if magic[:4] == b"PAR1":
+        return "parquet"
+    if magic == b"ARROW1":
+        return "feather"
+    return "csv"
+
+
+def dataset_num_rows(artifact: Any) -> Optional[int]:
+    """
+    Number of rows of dataset artifact without reading it,
+    from metadata, parquet footer or feather batch headers. None for csv without metadata.
+
+    :param artifact: KFP artifact.
+    :return: Number of rows.
+    """
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    num_rows = (artifact.metadata or {}).get("num_rows")
+    if num_rows is not None:
+        return int(num_rows)
+    file_format = dataset_format(artifact)
+    if file_format == "parquet":
+        return pq.ParquetFile(artifact.path).metadata.num_rows
+    if file_format == "feather":
+        # Counted from record batch headers, bodies are not read.
+        return ds.dataset(artifact.path, format="ipc").count_rows()
+    return None
+
+
+def iter_dataset(
+    artifact: Any, chunksize: int, columns: Optional[List[str]] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Read dataset artifact in chunks of at most chunksize rows.
+
+    :param artifact: KFP artifact (Input[Dataset]).
+    :param chunksize: Number of rows in a chunk.
+    :param columns: Columns to read, all if None.
+    :return: Iterator of dataframes.
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    file_format = dataset_format(artifact)
+    if file_format == "parquet":
+        parquet_file = pq.ParquetFile(artifact.path)
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    elif file_format == "feather":
+        with pa.memory_map(artifact.path) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                if columns is not None:
+                    batch = batch.select(columns)
+                for offset in range(0, batch.num_rows, chunksize):
+                    yield batch.slice(offset, chunksize).to_pandas()
+    else:
+        yield from pd.read_csv(artifact.path, usecols=columns, chunksize=chunksize)
+
+
+class DatasetWriter:
+    """
+    Incremental writer of dataset artifact, chunk by chunk.
+    Every chunk must have the same columns and dtypes.
+    Metadata is recorded as by write_dataset on close.
+
+    :param artifact: KFP artifact (Output[Dataset]).
+    :param file_format: parquet or csv.
+    """
+
+    def __init__(self, artifact: Any, file_format: str = DEFAULT_FORMAT) -> None:
+        if file_format not in ("parquet", "csv"):
+            raise ValueError(
+                f"Artifacts: Supported formats for chunks are parquet and csv, "
+                f"not {file_format}!"
+            )
+        self._artifact = artifact
+        self._format = file_format
+        self._writer: Optional[pq.ParquetWriter] = None
+        self._dtypes: Optional[Dict[str, Any]] = None
+        self.num_rows = 0
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        """
+        Append chunk to dataset.
+
+        :param chunk: Dataframe.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._format == "parquet":
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(
+                    self._artifact.path, table.schema, compression="snappy"
+                )
+            self._writer.write_table(table)
+        else:
+            chunk.to_csv(
+                self._artifact.path,
+                mode="a" if self._dtypes is not None else "w",
+                header=self._dtypes is None,
+                index=False,
+                encoding="utf-8",
+            )
+        if self._dtypes is None:
+            self._dtypes = chunk.dtypes.to_dict()
+        self.num_rows += chunk.shape[0]
+
+    def close(self) -> None:
+        """
+        Finish the file and record metadata.
+        """
+        import pandas as pd
+
+        if self._writer is not None:
+            self._writer.close()
+        elif self._dtypes is None:
+            write_dataset(pd.DataFrame(), self._artifact, self._format)
+            return
+        _describe(
+            self._artifact, self._format, (self._dtypes or {}).items(), self.num_rows
+        )
+
+
+@contextmanager
+def open_dataset_writer(
+    artifact: Any, file_format: str = DEFAULT_FORMAT
+) -> Iterator[DatasetWriter]:
+    """
+    Incremental writer of dataset artifact, closed on exit.
+
+    :param artifact: KFP artifact (Output[Dataset]).
+    :param file_format: parquet or csv.
+    :return: Writer.
+    """
+    writer = DatasetWriter(artifact, file_format)
+    try:
+        yield writer
+    finally:
+        writer.close()
@@ -14,3 +14,105 @@ FEATURES = [
     "sulphates",
     "alcohol",
 ]
+
+# Model type: "random_forest", "hist_gradient_boosting" or "sgd".
+MODEL_TYPE = "random_forest"
+MODEL_PARAMS = {}
+# Parallel jobs for training, None - all CPUs of the pod (cgroup CPU limit).
+N_JOBS = None
+# Continue training of the current inference model on the train dataset
+# instead of training from scratch: forests and boosting get
+# INCREMENTAL_ESTIMATORS more trees, "sgd" is updated with partial_fit.
+INCREMENTAL = False
+INCREMENTAL_ESTIMATORS = 20
+
+# Hyperparameter search before train_model, by successive halving:
+# HP_SEARCH_TRIALS random configs from HP_SEARCH_SPACE[MODEL_TYPE] are trained
+# in parallel pods on HP_SEARCH_MIN_FRACTION of train rows and scored
+# on a validation part of train (f1 macro). The best 1 / HP_SEARCH_ETA of them
+# go to the next rung with HP_SEARCH_ETA times more rows, until one is left.
+# train_model trains it on all train rows.
+HP_SEARCH = True
+HP_SEARCH_TRIALS = 9
+HP_SEARCH_ETA = 3
+HP_SEARCH_MIN_FRACTION = 0.1
+HP_SEARCH_VALIDATION_SIZE = 0.2
+HP_SEARCH_PARALLELISM = 9
+HP_SEARCH_SEED = 0
+HP_SEARCH_SPACE = {
+    "random_forest": {
+        "n_estimators": [50, 100, 200, 400],
+        "max_depth": [None, 8, 16, 32],
+        "min_samples_leaf": [1, 2, 5, 10],
+        "max_features": ["sqrt", "log2", 0.5],
+    },
+    "hist_gradient_boosting": {
+        "learning_rate": [0.03, 0.1, 0.3],
+        "max_iter": [100, 200, 400],
+        "max_leaf_nodes": [15, 31, 63],
+        "l2_regularization": [0.0, 0.1, 1.0],
+    },
+    "sgd": {
+        "loss": ["hinge", "log_loss", "modified_huber"],
+        "alpha": [1e-5, 1e-4, 1e-3, 1e-2],
+        "penalty": ["l2", "l1", "elasticnet"],
+    },
+}
+
+# Split and normalize in-memory datasets with one vectorized pass instead of
+# sklearn train_test_split and Normalizer. Faster and lighter, but rows
+# go to test by another random permutation, so train/test sets (and metrics)
+# differ from runs without it. Class test counts are rounded like sklearn.
+PREPARE_DATA_VECTORIZED = False
+
+# Datasets with at least STREAMING_MIN_ROWS rows are prepared in chunks.
+STREAMING_MIN_ROWS = 2_000_000
+STREAMING_CHUNKSIZE = 500_000
+
+# Test dataset is scored in batches of EVALUATION_BATCH_SIZE rows
+# by EVALUATION_WORKERS threads, None - all CPUs of the pod.
+EVALUATION_BATCH_SIZE = 100_000
+EVALUATION_WORKERS = None
+
+# Outputs of prepare_data and train_model are stored on S3 by content
+# fingerprint of their inputs, code and config, and reused on a match.
+# The cache uses S3_* env (from Vault), without them it is skipped.
+STEP_CACHE = True
+STEP_CACHE_PATH = "template/step_cache/"
+
+# Instrumentation
+# Phase timings, CPU, peak RSS and byte counters of every step are pushed
+# to Prometheus pushgateway at PROMETHEUS_URL env (if set) under this job.
+PROMETHEUS_JOB = "kubeflow_pipeline"
+# Run steps under cProfile and save stats to S3 (open with snakeviz or pstats).
+PROFILE = False
+PROFILE_PATH = "template/profiles/"
+
+# Model storage
+INFERENCE_MODEL_PATH = "template/models/inference_model.joblib"
+LEGACY_INFERENCE_MODEL_PATH = "template/models/inference_model.pkl"
+
+# Batch inference
+# Source of rows to score: "s3" (parquet file or folder) or "gp" (query).
+INFERENCE_SOURCE = "s3"
+INFERENCE_INPUT_PATH = "template/inference/input/"
+INFERENCE_INPUT_QUERY = "select * from template.inference_input"
+# Sink of predictions: "s3" (parquet file) or "gp" (existing table).
+INFERENCE_SINK = "s3"
+INFERENCE_OUTPUT_PATH = "template/inference/predictions.parquet"
+INFERENCE_OUTPUT_TABLE = "template.inference_predictions"
+# Input columns copied to predictions, e.g. row id.
+INFERENCE_ID_COLUMNS = []
+INFERENCE_PREDICTION_COLUMN = "prediction"
+INFERENCE_CHUNKSIZE = 100_000
+# Scoring processes, None - all CPUs of the pod.
+INFERENCE_WORKERS = None
+
+# Online serving
+SERVING_PORT = 8080
+# Concurrent requests are scored together in batches of at most
+# SERVING_MAX_BATCH_SIZE rows, waiting at most SERVING_MAX_WAIT_MS for a batch.
+SERVING_MAX_BATCH_SIZE = 256
+SERVING_MAX_WAIT_MS = 5
+# Seconds between checks of the inference model ETag on S3.
+SERVING_RELOAD_INTERVAL = 30
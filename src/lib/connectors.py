@@ -1,14 +1,72 @@
+from __future__ import annotations
+
+import asyncio
 import io
+import itertools
 import json
 import logging
 import os
 import pickle
-from typing import Any, Dict, List, Optional
-
-import boto3
-import hvac
-import pandas as pd
-import psycopg2
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import ExitStack, contextmanager
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+from urllib.parse import urlparse
+
+from lib import instrumentation, model_io
+from lib.s3_cache import S3Cache
+from lib.vault_cache import VaultCache
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+
+# pandas, pyarrow, boto3, botocore, hvac and psycopg2 are imported where
+# they are used, so importing connectors is cheap and a step pays only
+# for the clients and formats it needs.
+
+# Arrow type constructors and arguments for Postgres type OIDs
+# in COPY csv output.
+_GP_ARROW_TYPES = {
+    16: ("bool_",),
+    20: ("int64",),
+    21: ("int16",),
+    23: ("int32",),
+    700: ("float32",),
+    701: ("float64",),
+    1700: ("float64",),
+    25: ("string",),
+    1042: ("string",),
+    1043: ("string",),
+    1082: ("date32",),
+    1114: ("timestamp", "us"),
+    1184: ("timestamp", "us", "UTC"),
+}
+
+# S3 minimum size of a multipart upload part.
+_S3_MIN_PART_SIZE = 5 * 1024**2
+
+# S3 maximum number of keys in one delete request.
+_S3_MAX_DELETE_KEYS = 1000
+
+# Arrow dataset formats for columnar file extensions.
+_ARROW_FORMATS = {".parquet": "parquet", ".feather": "ipc", ".arrow": "ipc"}
 
 
 class GreenplumConnector:
@@ -24,6 +82,14 @@ class GreenplumConnector:
       - GP_HOST as host: GreenPlum host
       - GP_PORT as port: GreenPlum port
 
+    Connections are taken from a thread-safe pool shared by all connectors
+    with the same parameters in the process, so repeated queries do not
+    pay for connection setup.
+
+    :param pool_size: Maximum number of open connections in the pool.
+    :param retries: Number of reconnect attempts.
+    :param backoff: Initial delay between reconnect attempts in seconds,
+        doubled after every attempt.
     """
 
     def __init__(
@@ -33,6 +99,9 @@ class GreenplumConnector:
         password: Optional[str] = None,
         host: Optional[str] = None,
         port: Optional[str] = None,
+        pool_size: int = 4,
+        retries: int = 3,
+        backoff: float = 1.0,
     ) -> None:
         self._log = logging.getLogger(__name__)
 
@@ -56,18 +125,31 @@ class GreenplumConnector:
             port = os.getenv("GP_PORT", None)
             assert port is not None, "GP_PORT env not found"
 
-        try:
-            self.con = psycopg2.connect(
-                database=os.getenv("GP_DB"),
-                user=os.getenv("GP_USER"),
-                password=os.getenv("GP_PASS"),
-                host=os.getenv("GP_HOST"),
-                port=os.getenv("GP_PORT"),
-            )
-        except psycopg2.OperationalError as e:
-            self._log.error(e)
+        self._pool = _GreenplumPool.get(
+            pool_size=pool_size,
+            retries=retries,
+            backoff=backoff,
+            database=database,
+            user=user,
+            password=password,
+            host=host,
+            port=port,
+        )
         self._log.info("GP Connector: Connection to GP established.")
 
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """
+        Take a live connection from the pool and return it back on exit.
+
+        :return: psycopg2 connection.
+        """
+        con = self._pool.getconn()
+        try:
+            yield con
+        finally:
+            self._pool.putconn(con)
+
     def execute(self, query: str) -> pd.DataFrame:
         """
         Execute SQL query.
@@ -75,18 +157,815 @@ class GreenplumConnector:
         :param query: Query as text.
         :return: Dataframe with data from query.
         """
+        import pandas as pd
+
         try:
-            data = pd.read_sql_query(query, self.con)
+            with self.connection() as con:
+                data = pd.read_sql_query(query, con)
+            instrumentation.count("gp_rows_read", data.shape[0])
         except Exception as e:
             self._log.error("GP Connector: GP data download failed with %s.", e)
             data = pd.DataFrame()
         return data
 
+    def execute_chunked(
+        self,
+        query: str,
+        chunksize: int = 100_000,
+        dtypes: Optional[Dict[str, Any]] = None,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Execute SQL query through a named (server-side) cursor
+        and yield the result in chunks, so only one chunk is held in memory.
+        Dtypes are fixed on the first chunk (or taken from dtypes param)
+        and reused for every next chunk. Integer and boolean columns
+        are inferred as nullable dtypes, so NULLs in later chunks fit.
+
+        :param query: Query as text.
+        :param chunksize: Number of rows in a chunk.
+        :param dtypes: Dtypes of columns. Inferred from the first chunk if None.
+        :return: Iterator of dataframes.
+        """
+        import pandas as pd
+
+        cursor_name = f"gp_stream_{uuid.uuid4().hex}"
+        with self.connection() as con:
+            try:
+                with con.cursor(name=cursor_name) as cursor:
+                    cursor.itersize = chunksize
+                    cursor.execute(query)
+                    columns = None
+                    while True:
+                        rows = cursor.fetchmany(chunksize)
+                        if not rows:
+                            break
+                        if columns is None:
+                            columns = [column.name for column in cursor.description]
+                        chunk = pd.DataFrame.from_records(
+                            rows, columns=columns, coerce_float=True
+                        )
+                        if dtypes is None:
+                            dtypes = self._infer_dtypes(chunk)
+                        instrumentation.count("gp_rows_read", chunk.shape[0])
+                        yield chunk.astype(dtypes)
+            finally:
+                # Named cursors live inside a transaction, close it.
+                con.rollback()
+
+    @staticmethod
+    def _infer_dtypes(chunk: pd.DataFrame) -> Dict[str, Any]:
+        """
+        Infer dtypes of a chunk, making integer and boolean columns nullable.
+
+        :param chunk: First chunk of the result.
+        :return: Dtypes of columns.
+        """
+        import pandas as pd
+
+        dtypes = {}
+        for column, dtype in chunk.infer_objects().dtypes.items():
+            if pd.api.types.is_bool_dtype(dtype):
+                dtypes[column] = "boolean"
+            elif pd.api.types.is_integer_dtype(dtype):
+                dtypes[column] = "Int64"
+            else:
+                dtypes[column] = dtype
+        return dtypes
+
+    def export(
+        self,
+        query: str,
+        filename: str,
+        chunksize: int = 100_000,
+        s3_connector: Optional["S3Connector"] = None,
+    ) -> int:
+        """
+        Stream query result to a local csv file or, if s3_connector is given,
+        to a csv object on S3. Peak memory is bounded by one chunk.
+
+        :param query: Query as text.
+        :param filename: Local file path or S3 key.
+        :param chunksize: Number of rows in a chunk.
+        :param s3_connector: S3 connector to upload the result with.
+        :return: Number of exported rows.
+        """
+        n_rows = 0
+
+        def counted(chunks: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+            nonlocal n_rows
+            for chunk in chunks:
+                n_rows += chunk.shape[0]
+                yield chunk
+
+        chunks = counted(self.execute_chunked(query, chunksize=chunksize))
+        if s3_connector is not None:
+            s3_connector.save_chunks(chunks, filename)
+        else:
+            with open(filename, "w", encoding="utf-8", newline="") as f:
+                for i, chunk in enumerate(chunks):
+                    chunk.to_csv(f, index=False, header=i == 0)
+        self._log.info("GP Connector: %i rows exported to %s.", n_rows, filename)
+        return n_rows
+
+    def copy_chunks(self, chunks: Iterable[pd.DataFrame], table: str) -> int:
+        """
+        Append chunks to an existing table with COPY FROM STDIN in csv format,
+        in one transaction. Columns are matched by chunk column names.
+
+        :param chunks: Dataframes with the same columns.
+        :param table: Table name, optionally with schema.
+        :return: Number of loaded rows.
+        """
+        n_rows = 0
+        with self.connection() as con:
+            try:
+                with con.cursor() as cursor:
+                    for chunk in chunks:
+                        self._copy_from(cursor, _table_identifier(table), chunk)
+                        n_rows += chunk.shape[0]
+                con.commit()
+            except BaseException:
+                con.rollback()
+                raise
+        self._log.info("GP Connector: %i rows copied to %s.", n_rows, table)
+        return n_rows
+
+    @staticmethod
+    def _copy_from(cursor: Any, table: Any, chunk: pd.DataFrame) -> None:
+        """
+        COPY chunk into table as csv. Serialized with Arrow csv writer,
+        which is much faster than pandas and releases the GIL,
+        pandas is used for columns Arrow can't convert.
+
+        :param cursor: psycopg2 cursor.
+        :param table: Table as psycopg2.sql.Identifier.
+        :param chunk: Dataframe.
+        """
+        import psycopg2.sql
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+
+        statement = psycopg2.sql.SQL(
+            "COPY {} ({}) FROM STDIN WITH (FORMAT csv, HEADER false)"
+        ).format(
+            table,
+            psycopg2.sql.SQL(", ").join(map(psycopg2.sql.Identifier, chunk.columns)),
+        )
+        buffer = io.BytesIO()
+        try:
+            pa_csv.write_csv(
+                pa.Table.from_pandas(chunk, preserve_index=False),
+                buffer,
+                pa_csv.WriteOptions(include_header=False),
+            )
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            buffer = io.BytesIO(
+                chunk.to_csv(index=False, header=False).encode("utf-8")
+            )
+        instrumentation.count("gp_bytes_written", buffer.getbuffer().nbytes)
+        instrumentation.count("gp_rows_written", chunk.shape[0])
+        buffer.seek(0)
+        cursor.copy_expert(statement, buffer)
+
+    def load_table(
+        self,
+        data: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+        table: str,
+        mode: str = "append",
+        key_columns: Optional[List[str]] = None,
+        batch_size: int = 500_000,
+        max_workers: Optional[int] = None,
+        retries: int = 2,
+    ) -> int:
+        """
+        Bulk load dataframe or chunks into an existing table.
+
+        Data is copied with COPY FROM STDIN into a staging table created
+        LIKE the target, by max_workers parallel loaders, one transaction
+        per batch, so a failed batch is retried alone. Then in one transaction:
+          - append: rows are inserted into the table;
+          - replace: staging table gets the owner and privileges of the table
+            and is swapped in place of it (it fails if other objects,
+            e.g. views, depend on the table, or if the owner can't be set);
+          - merge: rows of the table with the same key_columns are deleted
+            and rows are inserted.
+        The staging table is dropped on failure, the target is unchanged.
+
+        :param data: Dataframe or iterator of dataframes with the same columns,
+            named as table columns.
+        :param table: Table name, optionally with schema.
+        :param mode: append, replace or merge.
+        :param key_columns: Key columns for merge.
+        :param batch_size: Rows in a batch, dataframes are split by it.
+        :param max_workers: Parallel loaders, pool size by default.
+        :param retries: Retries of a batch on connection errors before commit.
+        :return: Number of loaded rows.
+        """
+        import psycopg2.sql as sql
+
+        if mode not in ("append", "replace", "merge"):
+            raise ValueError(
+                f"GP Connector: Supported modes are append, replace and merge, not {mode}!"
+            )
+        if mode == "merge" and not key_columns:
+            raise ValueError("GP Connector: key_columns are required for merge!")
+        max_workers = max_workers or self._pool.size
+
+        *schema, name = table.split(".")
+        target = _table_identifier(table)
+        staging_name = f"{name}__staging_{uuid.uuid4().hex[:8]}"
+        staging = sql.Identifier(*schema, staging_name)
+        like = "INCLUDING ALL" if mode == "replace" else "INCLUDING DEFAULTS"
+        self._run(
+            sql.SQL("CREATE TABLE {} (LIKE {} " + like + ")").format(staging, target)
+        )
+
+        try:
+            columns: List[str] = []
+            n_rows = self._load_batches(
+                _batches(data, batch_size), staging, columns, max_workers, retries
+            )
+            column_list = sql.SQL(", ").join(map(sql.Identifier, columns))
+            if mode == "replace":
+                old = sql.Identifier(f"{name}__old_{uuid.uuid4().hex[:8]}")
+                self._run(
+                    *self._privilege_statements(target, staging),
+                    sql.SQL("ALTER TABLE {} RENAME TO {}").format(target, old),
+                    sql.SQL("ALTER TABLE {} RENAME TO {}").format(
+                        staging, sql.Identifier(name)
+                    ),
+                    sql.SQL("DROP TABLE {}").format(sql.Identifier(*schema, old.string)),
+                )
+            elif n_rows:
+                statements = []
+                if mode == "merge":
+                    statements.append(sql.SQL("ANALYZE {}").format(staging))
+                    statements.append(
+                        sql.SQL("DELETE FROM {} t USING {} s WHERE {}").format(
+                            target,
+                            staging,
+                            sql.SQL(" AND ").join(
+                                sql.SQL("t.{0} = s.{0}").format(sql.Identifier(column))
+                                for column in key_columns
+                            ),
+                        )
+                    )
+                statements.append(
+                    sql.SQL("INSERT INTO {} ({}) SELECT {} FROM {}").format(
+                        target, column_list, column_list, staging
+                    )
+                )
+                statements.append(sql.SQL("DROP TABLE {}").format(staging))
+                self._run(*statements)
+            else:
+                self._run(sql.SQL("DROP TABLE {}").format(staging))
+        except BaseException:
+            try:
+                self._run(sql.SQL("DROP TABLE IF EXISTS {}").format(staging))
+            except Exception as e:
+                self._log.error("GP Connector: Staging table not dropped: %s.", e)
+            raise
+
+        self._log.info("GP Connector: %i rows loaded to %s (%s).", n_rows, table, mode)
+        return n_rows
+
+    def _privilege_statements(self, source: Any, target: Any) -> List[Any]:
+        """
+        Statements giving target table the privileges and the owner
+        of source table, which LIKE ... INCLUDING ALL does not copy.
+
+        :param source: Table as psycopg2.sql.Identifier.
+        :param target: Table as psycopg2.sql.Identifier.
+        :return: GRANT and ALTER TABLE ... OWNER TO statements.
+        """
+        import psycopg2.sql as sql
+
+        with self.connection() as con:
+            with con.cursor() as cursor:
+                regclass = sql.Literal(source.as_string(con))
+                cursor.execute(
+                    sql.SQL(
+                        "SELECT pg_get_userbyid(relowner), "
+                        "pg_get_userbyid(relowner) = current_user "
+                        "FROM pg_class WHERE oid = {}::regclass"
+                    ).format(regclass)
+                )
+                owner, is_current_user = cursor.fetchone()
+                # Grantee 0 is PUBLIC. relacl NULL means owner-only defaults.
+                cursor.execute(
+                    sql.SQL(
+                        "SELECT a.grantee = 0, pg_get_userbyid(a.grantee), "
+                        "a.privilege_type, a.is_grantable "
+                        "FROM pg_class c, aclexplode(c.relacl) a "
+                        "WHERE c.oid = {}::regclass"
+                    ).format(regclass)
+                )
+                grants = cursor.fetchall()
+            con.rollback()
+
+        statements = []
+        for is_public, grantee, privilege, is_grantable in grants:
+            if grantee == owner:
+                continue
+            statements.append(
+                sql.SQL("GRANT {} ON {} TO {}{}").format(
+                    sql.SQL(privilege),
+                    target,
+                    sql.SQL("PUBLIC") if is_public else sql.Identifier(grantee),
+                    sql.SQL(" WITH GRANT OPTION" if is_grantable else ""),
+                )
+            )
+        # Granted first, the new owner may not let us grant.
+        if not is_current_user:
+            statements.append(
+                sql.SQL("ALTER TABLE {} OWNER TO {}").format(
+                    target, sql.Identifier(owner)
+                )
+            )
+        return statements
+
+    def _run(self, *statements: Any) -> None:
+        """
+        Execute statements in one transaction.
+
+        :param statements: SQL statements.
+        """
+        with self.connection() as con:
+            try:
+                with con.cursor() as cursor:
+                    for statement in statements:
+                        cursor.execute(statement)
+                con.commit()
+            except BaseException:
+                con.rollback()
+                raise
+
+    def _load_batches(
+        self,
+        batches: Iterable[pd.DataFrame],
+        staging: Any,
+        columns: List[str],
+        max_workers: int,
+        retries: int,
+    ) -> int:
+        """
+        COPY batches into staging table in parallel, at most two batches
+        per loader are held in memory.
+
+        :param batches: Dataframes.
+        :param staging: Staging table as psycopg2.sql.Identifier.
+        :param columns: List to put column names of the first batch in.
+        :param max_workers: Number of loaders.
+        :param retries: Retries of a batch on connection errors before commit.
+        :return: Number of loaded rows.
+        """
+        import psycopg2
+
+        def load(batch: pd.DataFrame) -> int:
+            delay = self._pool.backoff
+            for attempt in range(retries + 1):
+                committing = False
+                try:
+                    with self.connection() as con:
+                        try:
+                            with con.cursor() as cursor:
+                                self._copy_from(cursor, staging, batch)
+                            committing = True
+                            con.commit()
+                        except BaseException:
+                            if not con.closed:
+                                con.rollback()
+                            raise
+                    return batch.shape[0]
+                except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                    # The server may have committed the batch already,
+                    # a retry could load it twice.
+                    if attempt == retries or committing:
+                        raise
+                    self._log.warning(
+                        "GP Connector: Batch load failed with %s, retry in %.1fs.",
+                        e,
+                        delay,
+                    )
+                    time.sleep(delay)
+                    delay *= 2
+            return 0
+
+        n_rows = 0
+        pending: List[Future] = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for batch in batches:
+                if not columns:
+                    columns.extend(map(str, batch.columns))
+                elif list(batch.columns) != columns:
+                    raise ValueError("GP Connector: All chunks must have the same columns!")
+                pending.append(executor.submit(load, batch))
+                if len(pending) >= 2 * max_workers:
+                    n_rows += pending.pop(0).result()
+            for future in pending:
+                n_rows += future.result()
+        return n_rows
+
+    def execute_copy(
+        self, query: str, filename: Optional[str] = None
+    ) -> Optional[pd.DataFrame]:
+        """
+        Execute SQL query with COPY (query) TO STDOUT in csv format
+        and parse the stream with Arrow multithreaded csv reader.
+        Much faster than execute for big results, as rows are never
+        built as python tuples. Column types are taken from the query
+        description, so they do not depend on the data.
+
+        The stream is spooled to a temporary file, so memory holds
+        only the parsed result (or one batch if filename is given).
+
+        :param query: Query as text.
+        :param filename: Parquet file to write the result to.
+            If None, the result is returned as dataframe.
+        :return: Dataframe with data from query or None if filename given.
+        """
+        table = self._copy(query, filename)
+        if table is None:
+            self._log.info("GP Connector: COPY result saved to %s.", filename)
+            return None
+        return table.to_pandas()
+
+    def _copy(self, query: str, filename: Optional[str] = None) -> Optional[pa.Table]:
+        """
+        Run COPY (query) TO STDOUT and parse it into Arrow table
+        or into a Parquet file if filename is given.
+
+        :param query: Query as text.
+        :param filename: Parquet file to write the result to.
+        :return: Arrow table or None if filename given.
+        """
+        import pyarrow.csv as pa_csv
+        import pyarrow.parquet as pq
+
+        schema = self._describe(query)
+        read_options = pa_csv.ReadOptions(column_names=schema.names)
+        parse_options = pa_csv.ParseOptions(newlines_in_values=True)
+        convert_options = pa_csv.ConvertOptions(
+            column_types=schema,
+            true_values=["t"],
+            false_values=["f"],
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=False,
+        )
+        with tempfile.TemporaryFile() as buffer:
+            with self.connection() as con:
+                with con.cursor() as cursor:
+                    cursor.copy_expert(
+                        f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER false)",
+                        buffer,
+                    )
+                con.rollback()
+            instrumentation.count("gp_bytes_read", buffer.tell())
+            buffer.seek(0)
+
+            if filename is None:
+                return pa_csv.read_csv(
+                    buffer,
+                    read_options=read_options,
+                    parse_options=parse_options,
+                    convert_options=convert_options,
+                )
+
+            reader = pa_csv.open_csv(
+                buffer,
+                read_options=read_options,
+                parse_options=parse_options,
+                convert_options=convert_options,
+            )
+            with pq.ParquetWriter(filename, reader.schema) as writer:
+                for batch in reader:
+                    writer.write_batch(batch)
+        return None
+
+    def _describe(self, query: str) -> pa.Schema:
+        """
+        Get Arrow schema of query result without fetching rows.
+        Unknown types are read as strings.
+
+        :param query: Query as text.
+        :return: Schema.
+        """
+        import pyarrow as pa
+
+        with self.connection() as con:
+            with con.cursor() as cursor:
+                cursor.execute(f"SELECT * FROM ({query}) AS q LIMIT 0")
+                description = cursor.description
+            con.rollback()
+        fields = []
+        for column in description:
+            name, *args = _GP_ARROW_TYPES.get(column.type_code, ("string",))
+            fields.append((column.name, getattr(pa, name)(*args)))
+        return pa.schema(fields)
+
+    def execute_partitioned(
+        self,
+        query: str,
+        partitions: List[str],
+        max_workers: int = 4,
+        retries: int = 2,
+        output_dir: Optional[str] = None,
+    ) -> Union[pd.DataFrame, List[str]]:
+        """
+        Execute SQL query split into partitions in parallel threads,
+        each partition on its own pooled connection through COPY.
+        Partition predicates can be built with lib.gp_partitions.
+
+        If query contains {partition} placeholder, it is replaced with
+        the predicate (required for gp_segment_id, which only exists on tables),
+        otherwise the query is wrapped as SELECT * FROM (query) WHERE predicate.
+
+        With output_dir every partition is streamed to its own Parquet part file,
+        so memory is bounded by max_workers parse batches. Without it partial
+        results are collected as Arrow tables and converted to one dataframe.
+        A partition failed with a connection error is retried with backoff
+        on its own.
+
+        :param query: Query as text.
+        :param partitions: SQL predicates, one per partition.
+        :param max_workers: Number of partitions executed at the same time.
+            Effective concurrency is also limited by the pool size.
+        :param retries: Number of retries of a partition on connection errors.
+        :param output_dir: Directory for part files.
+        :return: Dataframe or list of part files if output_dir is given.
+        """
+        import psycopg2
+        import pyarrow as pa
+
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+
+        def run_partition(i: int, predicate: str) -> Optional[pa.Table]:
+            if "{partition}" in query:
+                partition_query = query.replace("{partition}", f"({predicate})")
+            else:
+                partition_query = f"SELECT * FROM ({query}) AS q WHERE {predicate}"
+            filename = None
+            if output_dir is not None:
+                filename = os.path.join(output_dir, f"part-{i:05d}.parquet")
+            delay = self._pool.backoff
+            for attempt in range(retries + 1):
+                try:
+                    return self._copy(partition_query, filename)
+                # SQL errors, e.g. syntax or permissions, would fail again.
+                except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                    if attempt == retries:
+                        self._log.error(
+                            "GP Connector: Partition %s failed with %s.", predicate, e
+                        )
+                        raise
+                    self._log.warning(
+                        "GP Connector: Partition %s failed with %s, retry in %.1fs.",
+                        predicate,
+                        e,
+                        delay,
+                    )
+                    time.sleep(delay)
+                    delay *= 2
+
+        tables: Dict[int, pa.Table] = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(run_partition, i, predicate): i
+                for i, predicate in enumerate(partitions)
+            }
+            for future in as_completed(futures):
+                table = future.result()
+                if table is not None:
+                    tables[futures[future]] = table
+        self._log.info(
+            "GP Connector: %i partitions downloaded from GP.", len(partitions)
+        )
+
+        if output_dir is not None:
+            return [
+                os.path.join(output_dir, f"part-{i:05d}.parquet")
+                for i in range(len(partitions))
+            ]
+        data = pa.concat_tables([tables[i] for i in sorted(tables)])
+        del tables
+        return data.to_pandas()
+
+    def segment_count(self) -> int:
+        """
+        Number of primary GreenPlum segments, to split by gp_segment_id.
+
+        :return: Number of segments.
+        """
+        with self.connection() as con:
+            with con.cursor() as cursor:
+                cursor.execute(
+                    "SELECT count(*) FROM gp_segment_configuration "
+                    "WHERE role = 'p' AND content >= 0"
+                )
+                n_segments = cursor.fetchone()[0]
+            con.rollback()
+        return n_segments
+
     def close_conenction(self) -> None:
         """
-        Close SQL connection.
+        Release the pool. Its SQL connections are closed when no other
+        connector uses it.
         """
-        self.con.close()
+        if self._pool is not None:
+            self._pool.release()
+            self._pool = None
+
+
+def _table_identifier(table: str) -> Any:
+    """
+    Quoted identifier of table name, optionally with schema.
+
+    :param table: Table name, e.g. schema.table.
+    :return: psycopg2.sql.Identifier.
+    """
+    import psycopg2.sql
+
+    return psycopg2.sql.Identifier(*table.split("."))
+
+
+def _batches(
+    data: Union[pd.DataFrame, Iterable[pd.DataFrame]], batch_size: int
+) -> Iterator[pd.DataFrame]:
+    """
+    Split dataframe or chunks into batches of at most batch_size rows.
+
+    :param data: Dataframe or iterator of dataframes.
+    :param batch_size: Number of rows in a batch.
+    :return: Iterator of dataframes.
+    """
+    import pandas as pd
+
+    chunks = [data] if isinstance(data, pd.DataFrame) else data
+    for chunk in chunks:
+        for offset in range(0, chunk.shape[0], batch_size):
+            yield chunk.iloc[offset: offset + batch_size]
+
+
+class _GreenplumPool:
+    """
+    Bounded thread-safe pool of GreenPlum connections.
+    Callers wait for a free connection instead of failing when the pool
+    is exhausted. Connections idle for longer than health_check_interval
+    are checked with a trivial query before being handed out, and broken
+    ones are replaced. Connecting is retried with exponential backoff.
+
+    Use _GreenplumPool.get to share one pool per connection parameters
+    and pool size, and release to give it back.
+
+    :param pool_size: Maximum number of open connections.
+    :param retries: Number of reconnect attempts.
+    :param backoff: Initial delay between attempts in seconds.
+    :param health_check_interval: Idle seconds after which a connection is checked.
+    :param dsn: psycopg2 connection parameters.
+    """
+
+    _pools: Dict[tuple, "_GreenplumPool"] = {}
+    _pools_lock = threading.Lock()
+
+    def __init__(
+        self,
+        pool_size: int,
+        retries: int,
+        backoff: float,
+        health_check_interval: float = 30.0,
+        **dsn: Any,
+    ) -> None:
+        import psycopg2.pool
+
+        self._log = logging.getLogger(__name__)
+        self._retries = retries
+        self._health_check_interval = health_check_interval
+        self.size = pool_size
+        self.backoff = backoff
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._last_used: Dict[int, float] = {}
+        # minconn is the pool size, so every returned connection is kept
+        # for reuse instead of being closed.
+        self._pool = self._with_retries(
+            lambda: psycopg2.pool.ThreadedConnectionPool(pool_size, pool_size, **dsn)
+        )
+        self._key: Optional[tuple] = None
+        self._refs = 0
+
+    @classmethod
+    def get(
+        cls, pool_size: int, retries: int, backoff: float, **dsn: Any
+    ) -> "_GreenplumPool":
+        """
+        Get the pool for connection parameters and pool size, creating it
+        on first call. Every call must be paired with release.
+
+        :return: Pool.
+        """
+        key = (pool_size,) + tuple(sorted(dsn.items()))
+        with cls._pools_lock:
+            pool = cls._pools.get(key)
+            if pool is None:
+                pool = cls(pool_size, retries, backoff, **dsn)
+                pool._key = key
+                cls._pools[key] = pool
+            pool._refs += 1
+        return pool
+
+    def _with_retries(self, connect: Callable[[], Any]) -> Any:
+        import psycopg2
+
+        delay = self.backoff
+        for attempt in range(self._retries + 1):
+            try:
+                return connect()
+            except psycopg2.OperationalError as e:
+                if attempt == self._retries:
+                    self._log.error("GP Connector: Connection to GP failed with %s.", e)
+                    raise
+                self._log.warning(
+                    "GP Connector: Connection to GP failed with %s, retry in %.1fs.",
+                    e,
+                    delay,
+                )
+                time.sleep(delay)
+                delay *= 2
+
+    def _is_alive(self, con: Any) -> bool:
+        import psycopg2
+
+        if con.closed:
+            return False
+        last_used = self._last_used.get(id(con))
+        # Fresh connections need no check.
+        if last_used is None:
+            return True
+        if time.monotonic() - last_used < self._health_check_interval:
+            return True
+        try:
+            with con.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            con.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def getconn(self) -> Any:
+        """
+        Wait for a free slot and take a live connection.
+
+        :return: psycopg2 connection.
+        """
+        self._slots.acquire()
+        try:
+            con = self._with_retries(self._pool.getconn)
+            while not self._is_alive(con):
+                self._log.warning("GP Connector: Dead connection replaced.")
+                self._last_used.pop(id(con), None)
+                self._pool.putconn(con, close=True)
+                con = self._with_retries(self._pool.getconn)
+        except BaseException:
+            self._slots.release()
+            raise
+        return con
+
+    def putconn(self, con: Any) -> None:
+        """
+        Return connection to the pool. Open transaction is rolled back.
+
+        :param con: psycopg2 connection.
+        """
+        if con.closed:
+            self._last_used.pop(id(con), None)
+        else:
+            self._last_used[id(con)] = time.monotonic()
+        try:
+            self._pool.putconn(con, close=bool(con.closed))
+        finally:
+            self._slots.release()
+
+    def release(self) -> None:
+        """
+        Drop one reference taken by get, close the pool with the last one.
+        """
+        with self._pools_lock:
+            self._refs -= 1
+            if self._refs > 0:
+                return
+            # Forgotten under the lock, so get can't hand out a closing pool.
+            if self._pools.get(self._key) is self:
+                del self._pools[self._key]
+        self.close()
+
+    def close(self) -> None:
+        """
+        Close all connections and forget the pool.
+        """
+        with self._pools_lock:
+            if self._pools.get(self._key) is self:
+                del self._pools[self._key]
+        self._pool.closeall()
 
 
 class S3Connector:
@@ -101,6 +980,27 @@ class S3Connector:
       - S3_ACCESS_KEY for s3_access_key: aws(yandex) secret key
       - S3_BUCKET for s3_bucket: s3 bucket name
 
+    Objects are uploaded and downloaded in parts of part_size bytes,
+    up to max_concurrency parts at the same time. Serializers write
+    straight into the upload stream, downloads are spooled to disk
+    when bigger than part_size.
+
+    The boto3 client is created lazily and shared by all connectors
+    with the same parameters, keep-alive connections are reused.
+
+    Downloads go through a local S3Cache if cache directory is given
+    either as cache_dir or as S3_CACHE_DIR env (and S3_CACHE_MAX_SIZE in bytes).
+
+    :param part_size: Multipart part size in bytes, at least 5 MiB.
+    :param max_concurrency: Number of parts transferred at the same time.
+    :param cache_dir: Directory of the local cache of downloaded objects.
+    :param cache_max_size: Maximum size of the cache in bytes.
+    :param max_pool_connections: Size of botocore HTTP connection pool,
+        by default enough for 2 * max_concurrency parallel requests.
+    :param max_attempts: Maximum attempts of a request with standard retries.
+    :param connect_timeout: Connect timeout in seconds.
+    :param read_timeout: Read timeout in seconds.
+    :param validate_bucket: Check the bucket once per process on init.
     """
 
     def __init__(
@@ -109,6 +1009,15 @@ class S3Connector:
         s3_key_id: Optional[str] = None,
         s3_access_key: Optional[str] = None,
         s3_bucket: Optional[str] = None,
+        part_size: int = 8 * 1024**2,
+        max_concurrency: int = 8,
+        cache_dir: Optional[str] = None,
+        cache_max_size: Optional[int] = None,
+        max_pool_connections: Optional[int] = None,
+        max_attempts: int = 5,
+        connect_timeout: float = 10,
+        read_timeout: float = 60,
+        validate_bucket: bool = True,
     ) -> None:
         self._log = logging.getLogger(__name__)
 
@@ -130,50 +1039,182 @@ class S3Connector:
         else:
             self.bucket = s3_bucket
 
-        self.s3_session = boto3.session.Session().client(
-            service_name="s3",
-            endpoint_url=s3_endpoint,
-            aws_access_key_id=s3_key_id,
-            aws_secret_access_key=s3_access_key,
-        )
-        try:
-            self.s3_session.head_bucket(Bucket=self.bucket)
-        except self.s3_session.exceptions.ClientError:
-            self._log.info("S3Connector: Access to S3 denied.")
-
-        self.s3_resource = boto3.resource(
-            "s3",
-            endpoint_url=s3_endpoint,
-            aws_access_key_id=s3_key_id,
-            aws_secret_access_key=s3_access_key,
+        self._credentials = {
+            "endpoint": s3_endpoint,
+            "key_id": s3_key_id,
+            "access_key": s3_access_key,
+        }
+        self._arrow_fs: Optional[Any] = None
+        self._part_size = max(part_size, _S3_MIN_PART_SIZE)
+        self._max_concurrency = max_concurrency
+        from boto3.s3.transfer import TransferConfig
+        from botocore.config import Config as BotocoreConfig
+
+        self._transfer_config = TransferConfig(
+            multipart_threshold=self._part_size,
+            multipart_chunksize=self._part_size,
+            max_concurrency=max_concurrency,
         )
 
-        try:
-            self.s3_session.list_objects(Bucket=self.bucket)
-        except self.s3_session.exceptions.NoSuchBucket:
-            self._log.error("S3Connector: There is no %s on s3.", self.bucket)
+        if cache_dir is None:
+            cache_dir = os.getenv("S3_CACHE_DIR", None)
+        if cache_max_size is None:
+            cache_max_size = int(os.getenv("S3_CACHE_MAX_SIZE", 10 * 1024**3))
+        self.cache: Optional[S3Cache] = None
+        if cache_dir:
+            self.cache = S3Cache(cache_dir, max_size=cache_max_size)
+
+        self._client_config = BotocoreConfig(
+            max_pool_connections=max_pool_connections or max(10, 2 * max_concurrency),
+            tcp_keepalive=True,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            retries={"max_attempts": max_attempts, "mode": "standard"},
+        )
+        self._s3_resource = None
+        if validate_bucket:
+            self.validate_bucket()
 
         self._log.info("S3Connector: Connection successfully inited.")
 
-    def clean_s3(self, folders: List[str], n: int) -> None:
+    @property
+    def s3_session(self) -> Any:
+        """
+        boto3 S3 client, created on first use and shared
+        by all connectors with the same parameters in the process.
+        """
+        return _get_s3_client(
+            self._credentials["endpoint"],
+            self._credentials["key_id"],
+            self._credentials["access_key"],
+            self._client_config,
+        )
+
+    @property
+    def s3_resource(self) -> Any:
+        """
+        boto3 S3 resource, created on first use.
+        """
+        if self._s3_resource is None:
+            import boto3
+
+            self._s3_resource = boto3.resource(
+                "s3",
+                endpoint_url=self._credentials["endpoint"],
+                aws_access_key_id=self._credentials["key_id"],
+                aws_secret_access_key=self._credentials["access_key"],
+                config=self._client_config,
+            )
+        return self._s3_resource
+
+    def validate_bucket(self) -> None:
+        """
+        Check that the bucket exists and is accessible with one HEAD request.
+        The result is remembered for the process, so only the first
+        connector to a bucket pays for it.
+        """
+        from botocore.exceptions import ClientError
+
+        key = (self._credentials["endpoint"], self.bucket)
+        if key in _VALIDATED_BUCKETS:
+            return
+        try:
+            self.s3_session.head_bucket(Bucket=self.bucket)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchBucket"):
+                self._log.error("S3Connector: There is no %s on s3.", self.bucket)
+            else:
+                self._log.info("S3Connector: Access to S3 denied.")
+            return
+        _VALIDATED_BUCKETS.add(key)
+
+    def clean_s3(
+        self,
+        folders: List[str],
+        n: int,
+        dry_run: bool = False,
+        max_workers: int = 8,
+    ) -> Dict[str, List[str]]:
         """
         Clean S3 folders, leaving the last N objects.
+        Folders are cleaned concurrently, objects are deleted
+        in batches of up to 1000 keys per request.
 
         :param folders: Which folders to clean.
         :param n: How many last files to leave in each folder.
+        :param dry_run: Only report what would be deleted.
+        :param max_workers: Number of folders cleaned at the same time.
+        :return: Deleted (or to be deleted in dry run) keys by folder.
         """
-        for folder in folders:
+
+        def clean_folder(folder: str) -> List[str]:
             list_of_files = self.list_folder(folder)
-            if list_of_files:
-                if len(list_of_files) > n:
-                    for obj_name in list_of_files[:-n]:
-                        self.s3_session.delete_object(
-                            Bucket=self.bucket,
-                            Key=obj_name,
-                        )
+            keys = [
+                f"{folder}/{obj_name}"
+                for obj_name in list_of_files[: max(len(list_of_files) - n, 0)]
+            ]
+            if dry_run:
+                self._log.info(
+                    "S3Connector: Dry run, %i objects to delete in %s.",
+                    len(keys),
+                    folder,
+                )
+                return keys
+            for i in range(0, len(keys), _S3_MAX_DELETE_KEYS):
+                response = self.s3_session.delete_objects(
+                    Bucket=self.bucket,
+                    Delete={
+                        "Objects": [
+                            {"Key": key} for key in keys[i : i + _S3_MAX_DELETE_KEYS]
+                        ],
+                        "Quiet": True,
+                    },
+                )
+                for error in response.get("Errors", []):
+                    self._log.error(
+                        "S3Connector: Failed to delete %s with %s.",
+                        error["Key"],
+                        error["Message"],
+                    )
             self._log.info(
                 "S3Connector: Clean-up s3 %s up to %i versions.", folder, n
             )
+            return keys
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            report = dict(zip(folders, executor.map(clean_folder, folders)))
+        return report
+
+    def iter_folder(
+        self,
+        folder: str,
+        start_after: Optional[str] = None,
+        delimiter: Optional[str] = None,
+    ) -> Iterator[str]:
+        """
+        Iterate over objects in a folder page by page,
+        in lexicographical order. The folder marker object is skipped.
+
+        :param folder: Folder name.
+        :param start_after: Name in the folder to start listing after.
+        :param delimiter: Group names by delimiter, e.g. "/" lists only
+            direct children, subfolders are yielded as "name/".
+        :return: Iterator of files' names relative to the folder.
+        """
+        prefix = f"{folder}/"
+        params = {"Bucket": self.bucket, "Prefix": prefix}
+        if start_after is not None:
+            params["StartAfter"] = f"{prefix}{start_after}"
+        if delimiter is not None:
+            params["Delimiter"] = delimiter
+
+        paginator = self.s3_session.get_paginator("list_objects_v2")
+        for page in paginator.paginate(**params):
+            names = [obj["Key"] for obj in page.get("Contents", [])]
+            names += [obj["Prefix"] for obj in page.get("CommonPrefixes", [])]
+            for name in sorted(names):
+                if name != prefix:
+                    yield name[len(prefix) :]
 
     def list_folder(self, folder: str) -> List[str]:
         """
@@ -184,95 +1225,685 @@ class S3Connector:
         """
         s3_session, bucket = self.s3_session, self.bucket
 
-        list_of_files = [
-            x["Key"] for x in s3_session.list_objects(Bucket=bucket)["Contents"]
-        ]
-        if f"{folder}/" not in list_of_files:
-            raise NameError(
-                f"S3Connector: Folder {folder} not found in bucket {bucket}."
+        list_of_files = list(self.iter_folder(folder))
+        if not list_of_files:
+            response = s3_session.list_objects_v2(
+                Bucket=bucket, Prefix=f"{folder}/", MaxKeys=1
             )
-        list_of_files = [
-            x.split(f"{folder}/")[1] for x in list_of_files if f"{folder}" in x
-        ]
-        list_of_files.sort()
+            if response["KeyCount"] == 0:
+                raise NameError(
+                    f"S3Connector: Folder {folder} not found in bucket {bucket}."
+                )
 
         return list_of_files
 
-    def load_file(self, filename: str) -> pd.DataFrame:
+    def load_file(
+        self,
+        filename: str,
+        columns: Optional[List[str]] = None,
+        filters: Optional[List[Any]] = None,
+    ) -> pd.DataFrame:
         """
-        Load file by name. Support pkl, csv and json extensions.
+        Load file by name. Support pkl, csv, json, parquet and feather (arrow)
+        extensions.
+
+        For parquet and feather only the footer and the requested columns
+        are downloaded with ranged GETs, and parquet row groups
+        not matching filters by their statistics are skipped.
 
         :param filename: File name.
+        :param columns: Columns to read, parquet and feather only.
+        :param filters: Row filters in pyarrow format, e.g. [("quality", ">", 5)],
+            parquet and feather only.
         :return: Dataframe.
         """
         s3_session, bucket = self.s3_session, self.bucket
+        _, fextension = os.path.splitext(filename)
+        if fextension in _ARROW_FORMATS:
+            return self._load_arrow(
+                filename, _ARROW_FORMATS[fextension], columns, filters
+            )
+        if columns is not None or filters is not None:
+            raise ValueError(
+                f"S3Connector: columns and filters are not supported for {fextension}."
+            )
+
+        if fextension not in (".pkl", ".csv", ".json"):
+            raise NotImplementedError(f"S3Connector: {fextension} not yet supported.")
+
+        with self.open_reader(filename) as file:
+            dataset = _read_table(file, fextension)
+
+        return dataset
+
+    def load_many(
+        self,
+        filenames: Iterable[str],
+        max_concurrency: Optional[int] = None,
+        loader: Optional[Callable[[str], Any]] = None,
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Load many files concurrently, yielding (filename, result) pairs
+        as downloads complete, not in the order of filenames.
+
+        Files are fetched and deserialized in a pool of max_concurrency threads.
+        Filenames are taken lazily and a new download starts only when
+        the consumer takes a result, so at most max_concurrency results
+        are held in memory. Each file is read with a single GET,
+        use it for many small files, load_file is better for big ones.
+
+            async for filename, data in s3_con.load_many(filenames):
+                ...
+
+        :param filenames: File names, any supported by load_file.
+        :param max_concurrency: Number of files transferred at the same time,
+            by default the size of the HTTP connection pool.
+        :param loader: Function loading a file by name, e.g. read_model,
+            by default the file is read as a table.
+        :return: Async iterator of (filename, result).
+        """
+        return self._map_concurrently(
+            loader or self._load_object, filenames, max_concurrency
+        )
+
+    async def save_many(
+        self,
+        tables: Union[Dict[str, Any], Iterable[Tuple[str, Any]]],
+        max_concurrency: Optional[int] = None,
+        saver: Optional[Callable[[Any, str], None]] = None,
+    ) -> List[str]:
+        """
+        Save many tables concurrently, see load_many.
+        Tables are taken lazily from an iterable, at most max_concurrency
+        of them are being serialized and uploaded at the same time.
+
+        :param tables: Dict or iterable of (filename, data).
+        :param max_concurrency: Number of files transferred at the same time,
+            by default the size of the HTTP connection pool.
+        :param saver: Function saving data by file name, e.g. save_model,
+            by default save_table.
+        :return: Saved file names in order of completion.
+        """
+        if isinstance(tables, dict):
+            tables = tables.items()
+        saver = saver or self.save_table
+        saved = []
+        async for (filename, _), _ in self._map_concurrently(
+            lambda item: saver(item[1], item[0]), tables, max_concurrency
+        ):
+            saved.append(filename)
+        return saved
+
+    async def _map_concurrently(
+        self,
+        func: Callable[[Any], Any],
+        items: Iterable[Any],
+        max_concurrency: Optional[int],
+    ) -> AsyncIterator[Tuple[Any, Any]]:
+        """
+        Run func on items in a bounded thread pool,
+        yielding (item, result) in order of completion. Items are submitted
+        only while fewer than max_concurrency are pending or not yet consumed.
+        Pending calls are cancelled if func fails or the consumer stops.
+
+        :param func: Blocking function of an item.
+        :param items: Items.
+        :param max_concurrency: Number of calls at the same time.
+        :return: Async iterator of (item, result).
+        """
+        if max_concurrency is None:
+            max_concurrency = self._client_config.max_pool_connections
+        loop = asyncio.get_running_loop()
+        items = iter(items)
+        pending: Dict[asyncio.Future, Any] = {}
+        executor = ThreadPoolExecutor(max_workers=max_concurrency)
         try:
-            file = s3_session.get_object(Bucket=bucket, Key=filename)
-        except s3_session.exceptions.NoSuchKey:
-            self._log.error("S3Connector: There is no %s in %s." , filename, bucket)
+            while True:
+                for item in itertools.islice(items, max_concurrency - len(pending)):
+                    pending[loop.run_in_executor(executor, func, item)] = item
+                if not pending:
+                    break
+                done, _ = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for future in done:
+                    yield pending.pop(future), future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+            # Do not block the event loop on calls already running.
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _load_object(self, filename: str) -> pd.DataFrame:
+        """
+        Load file with a single GET into memory. For small files
+        it saves the extra round trips of ranged and multipart downloads.
+
+        :param filename: File name.
+        :return: Dataframe.
+        """
+        from botocore.exceptions import ClientError
 
         _, fextension = os.path.splitext(filename)
-        if fextension == ".pkl":
-            dataset = pickle.loads(file["Body"].read())
-        elif fextension == ".csv":
-            dataset = pd.read_csv(file["Body"])
-        elif fextension == ".json":
-            obj = self.s3_resource.Object(bucket_name=bucket, key=filename)
-            dataset = json.load(obj.get()["Body"])
-            dataset = pd.DataFrame(dataset)
-        else:
+        if fextension not in (".pkl", ".csv", ".json") + tuple(_ARROW_FORMATS):
             raise NotImplementedError(f"S3Connector: {fextension} not yet supported.")
+        if self.cache is not None:
+            return self.load_file(filename)
+        try:
+            response = self.s3_session.get_object(Bucket=self.bucket, Key=filename)
+        except ClientError:
+            self._log.error("S3Connector: There is no %s in %s.", filename, self.bucket)
+            raise
+        with response["Body"] as body:
+            data = body.read()
+        return _read_table(io.BytesIO(data), fextension)
+
+    @contextmanager
+    def open_reader(self, filename: str) -> Iterator[BinaryIO]:
+        """
+        Download file with parallel ranged GETs into a temporary file,
+        kept in memory only if smaller than part size.
+        With cache enabled, the cached copy is opened instead.
 
-        return dataset
+        :param filename: File name.
+        :return: Binary file object positioned at the start.
+        """
+        from botocore.exceptions import ClientError
 
-    def save_table(self, data: pd.DataFrame, filename: str) -> None:
+        s3_session, bucket = self.s3_session, self.bucket
+        if self.cache is not None:
+            with self.fetch_file(filename) as path, open(path, "rb") as file:
+                yield file
+            return
+
+        with tempfile.SpooledTemporaryFile(max_size=self._part_size) as file:
+            try:
+                s3_session.download_fileobj(
+                    bucket, filename, file, Config=self._transfer_config
+                )
+            except ClientError:
+                self._log.error("S3Connector: There is no %s in %s." , filename, bucket)
+                raise
+            file.seek(0)
+            yield file
+
+    @contextmanager
+    def open_writer(self, filename: str) -> Iterator[BinaryIO]:
+        """
+        Binary file object streaming everything written to it to S3
+        with parallel multipart upload. The upload is completed on exit
+        and aborted on exception.
+
+        :param filename: File name.
+        :return: Binary file object.
+        """
+        writer = _S3MultipartWriter(
+            self.s3_session,
+            self.bucket,
+            filename,
+            part_size=self._part_size,
+            max_concurrency=self._max_concurrency,
+        )
+        try:
+            yield writer
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+
+    def iter_table(
+        self,
+        filename: str,
+        chunksize: int = 100_000,
+        columns: Optional[List[str]] = None,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Read parquet or feather file, or a folder of them,
+        in chunks of at most chunksize rows through Arrow S3 filesystem.
+        Only the requested columns of one chunk are held in memory.
+
+        :param filename: File name or folder (prefix ending with /).
+        :param chunksize: Number of rows in a chunk.
+        :param columns: Columns to read, all if None.
+        :return: Iterator of dataframes.
+        """
+        import pyarrow.dataset as ds
+
+        _, fextension = os.path.splitext(filename.rstrip("/"))
+        file_format = _ARROW_FORMATS.get(fextension, "parquet")
+        dataset = ds.dataset(
+            f"{self.bucket}/{filename.rstrip('/')}",
+            format=file_format,
+            filesystem=self._get_arrow_fs(),
+        )
+        for batch in dataset.to_batches(columns=columns, batch_size=chunksize):
+            if batch.num_rows:
+                instrumentation.count("s3_arrow_decoded_bytes", batch.nbytes)
+                yield batch.to_pandas()
+
+    @contextmanager
+    def fetch_file(self, filename: str) -> Iterator[str]:
+        """
+        Get local path of an up-to-date copy of file from the cache,
+        valid until exit.
+
+        :param filename: File name.
+        :return: Local path.
+        """
+        from botocore.exceptions import ClientError
+
+        assert self.cache is not None, "S3Connector: cache is not enabled"
+        with ExitStack() as stack:
+            try:
+                path = stack.enter_context(
+                    self.cache.fetch(
+                        self.s3_session, self.bucket, filename, self._transfer_config
+                    )
+                )
+            except ClientError:
+                self._log.error(
+                    "S3Connector: There is no %s in %s.", filename, self.bucket
+                )
+                raise
+            yield path
+
+    def download_file(self, filename: str, path: str) -> None:
+        """
+        Download file to a local path with parallel ranged GETs.
+
+        :param filename: File name.
+        :param path: Local path.
         """
-        Save table to S3. Supported extensions are pkl and csv.
+        self.s3_session.download_file(
+            self.bucket, filename, path, Config=self._transfer_config
+        )
+
+    def upload_file(self, path: str, filename: str) -> None:
+        """
+        Upload local file with parallel multipart upload.
+
+        :param path: Local path.
+        :param filename: File name.
+        """
+        self.s3_session.upload_file(
+            path, self.bucket, filename, Config=self._transfer_config
+        )
+
+    def _load_arrow(
+        self,
+        filename: str,
+        file_format: str,
+        columns: Optional[List[str]],
+        filters: Optional[List[Any]],
+    ) -> pd.DataFrame:
+        """
+        Read parquet or feather file with column projection and filters
+        through Arrow S3 filesystem.
 
         :param filename: File name.
+        :param file_format: parquet or ipc.
+        :param columns: Columns to read.
+        :param filters: Row filters in pyarrow format.
+        :return: Dataframe.
+        """
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+
+        with ExitStack() as stack:
+            if self.cache is not None:
+                path = stack.enter_context(self.fetch_file(filename))
+                dataset = ds.dataset(path, format=file_format)
+            else:
+                dataset = ds.dataset(
+                    f"{self.bucket}/{filename}",
+                    format=file_format,
+                    filesystem=self._get_arrow_fs(),
+                )
+            table = dataset.to_table(
+                columns=columns,
+                filter=pq.filters_to_expression(filters) if filters else None,
+            )
+        # Arrow filesystem reads bypass boto3, decoded size is counted instead.
+        instrumentation.count("s3_arrow_decoded_bytes", table.nbytes)
+        return table.to_pandas()
+
+    def _get_arrow_fs(self) -> Any:
+        """
+        Arrow S3 filesystem with connector credentials, created on first use.
+
+        :return: Filesystem.
+        """
+        import pyarrow.fs as pafs
+
+        if self._arrow_fs is None:
+            endpoint = urlparse(self._credentials["endpoint"])
+            self._arrow_fs = pafs.S3FileSystem(
+                access_key=self._credentials["key_id"],
+                secret_key=self._credentials["access_key"],
+                endpoint_override=endpoint.netloc or endpoint.path,
+                scheme=endpoint.scheme or "https",
+            )
+        return self._arrow_fs
+
+    def save_table(
+        self, data: pd.DataFrame, filename: str, compression: Optional[str] = None
+    ) -> None:
         """
-        filebuffer = io.BytesIO()
+        Save table to S3. Supported extensions are pkl, csv, parquet
+        and feather (arrow).
+
+        :param filename: File name.
+        :param compression: Compression codec for parquet (default snappy)
+            and feather (default lz4), e.g. zstd.
+        """
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        import pyarrow.parquet as pq
+
         _, fextension = os.path.splitext(filename)
-        if fextension == ".csv":
-            data.to_csv(filebuffer, index=False)
-        elif fextension == ".pkl":
-            data.to_pickle(filebuffer, protocol=4)
-        else:
+        if fextension not in (".csv", ".pkl", ".parquet", ".feather", ".arrow"):
             raise ValueError(
-                f"S3_connector: Supported formats are csv or pkl, not {fextension}!"
+                "S3_connector: Supported formats are csv, pkl, parquet or feather, "
+                f"not {fextension}!"
             )
-        s3_resource, bucket = self.s3_resource, self.bucket
-        s3_resource.Object(bucket, filename).put(Body=filebuffer.getvalue())
+        with self.open_writer(filename) as filebuffer:
+            if fextension == ".csv":
+                data.to_csv(filebuffer, index=False, mode="wb")
+            elif fextension == ".pkl":
+                pickle.dump(data, filebuffer, protocol=4)
+            elif fextension == ".parquet":
+                pq.write_table(
+                    pa.Table.from_pandas(data, preserve_index=False),
+                    filebuffer,
+                    compression=compression or "snappy",
+                )
+            else:
+                feather.write_feather(
+                    data.reset_index(drop=True),
+                    filebuffer,
+                    compression=compression or "lz4",
+                )
         self._log.info("S3_connector: Table saved to S3 : %s", filename)
-        
+
+    def save_chunks(self, chunks: Iterable[pd.DataFrame], filename: str) -> None:
+        """
+        Save table given as chunks to S3 in csv format with multipart upload,
+        so the whole table never has to fit in memory.
+
+        :param chunks: Dataframes with the same columns.
+        :param filename: File name.
+        """
+        _, fextension = os.path.splitext(filename)
+        if fextension != ".csv":
+            raise ValueError(
+                f"S3_connector: Supported format for chunks is csv, not {fextension}!"
+            )
+        with self.open_writer(filename) as writer:
+            for i, chunk in enumerate(chunks):
+                writer.write(chunk.to_csv(index=False, header=i == 0).encode("utf-8"))
+        self._log.info("S3_connector: Table saved to S3 : %s", filename)
+
     def save_model(self, model:Any, filename:str) -> None:
         """
-        Save model to S3 in pkl format.
+        Save model to S3 in pkl or joblib format (by extension).
+        Joblib format stores numpy arrays out-of-band, see lib.model_io.
 
         :param model: Model.
         :param filename: Model file name.
         """
-        obj = pickle.dumps(model)
-        s3_resource, bucket = self.s3_resource, self.bucket
-        s3_resource.Object(bucket, filename).put(Body=obj)
+        _, fextension = os.path.splitext(filename)
+        with self.open_writer(filename) as f:
+            if fextension == model_io.MODEL_EXTENSION:
+                model_io.dump_model(model, f)
+            else:
+                pickle.dump(model, f, protocol=4)
         self._log.info("S3_connector: Model saved to S3 : %s", filename)
         
-    def read_model(self, filename:str) -> None:
+    def read_model(self, filename:str, mmap: bool = True) -> Any:
         """
-        Read pkl-format model from S3.
+        Read pkl or joblib format model from S3.
+        Joblib models are downloaded to a local file (or taken from cache)
+        and their numpy arrays are memory-mapped instead of read into memory
+        (not the nodes of sklearn trees, see lib.model_io).
 
         :param filename: Model file name.
+        :param mmap: Memory-map arrays of joblib models, they are read-only then.
         :return: Model.
         """
-        s3_session, bucket = self.s3_session, self.bucket
+        _, fextension = os.path.splitext(filename)
+        if fextension != model_io.MODEL_EXTENSION:
+            with self.open_reader(filename) as f:
+                model = pickle.load(f)
+            return model
+
+        if self.cache is not None:
+            # Mapped arrays keep the data alive after the link is removed.
+            with self.fetch_file(filename) as path:
+                return model_io.load_model(path, mmap=mmap)
+        with tempfile.NamedTemporaryFile(suffix=fextension, delete=False) as f:
+            path = f.name
         try:
-            obj = s3_session.get_object(Bucket=bucket, Key=filename)
-        except s3_session.exceptions.NoSuchKey:
-            self._log.error("S3Connector: There is no %s in %s." , filename, bucket)
-        model = pickle.loads(obj["Body"].read())
-        
+            self.download_file(filename, path)
+            model = model_io.load_model(path, mmap=mmap)
+        finally:
+            # Mapped arrays keep the data alive after unlink.
+            os.remove(path)
+
         return model
 
+    def exists(self, filename: str) -> bool:
+        """
+        Check if file exists.
+
+        :param filename: File name.
+        :return: Whether file exists.
+        """
+        from botocore.exceptions import ClientError
+
+        try:
+            self.s3_session.head_object(Bucket=self.bucket, Key=filename)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                return False
+            raise
+        return True
+
+
+def _read_table(file: BinaryIO, fextension: str) -> pd.DataFrame:
+    """
+    Deserialize table from a file object by file extension.
+
+    :param file: Binary file object positioned at the start.
+    :param fextension: pkl, csv, json, parquet, feather or arrow extension.
+    :return: Dataframe.
+    """
+    import pandas as pd
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    if fextension == ".pkl":
+        return pickle.load(file)
+    if fextension == ".csv":
+        return pd.read_csv(file)
+    if fextension == ".json":
+        return pd.DataFrame(json.load(file))
+    if fextension == ".parquet":
+        return pq.read_table(file).to_pandas()
+    return feather.read_feather(file)
+
+
+_VALIDATED_BUCKETS = set()
+_S3_CLIENTS: Dict[tuple, Any] = {}
+_S3_CLIENTS_LOCK = threading.Lock()
+
+
+def _get_s3_client(
+    endpoint: str, key_id: str, access_key: str, config: Any
+) -> Any:
+    """
+    Get boto3 S3 client for parameters, creating it on first call.
+    boto3 clients are thread-safe, so one client serves the process.
+
+    :param endpoint: S3 endpoint.
+    :param key_id: Key id.
+    :param access_key: Secret key.
+    :param config: botocore client config.
+    :return: boto3 S3 client.
+    """
+    key = (endpoint, key_id, access_key, repr(sorted(vars(config).items())))
+    client = _S3_CLIENTS.get(key)
+    if client is None:
+        with _S3_CLIENTS_LOCK:
+            client = _S3_CLIENTS.get(key)
+            if client is None:
+                import boto3
+
+                client = boto3.session.Session().client(
+                    service_name="s3",
+                    endpoint_url=endpoint,
+                    aws_access_key_id=key_id,
+                    aws_secret_access_key=access_key,
+                    config=config,
+                )
+                client.meta.events.register(
+                    "after-call.s3.GetObject", _count_s3_bytes_read
+                )
+                for operation in ("PutObject", "UploadPart"):
+                    client.meta.events.register(
+                        f"before-send.s3.{operation}", _count_s3_bytes_written
+                    )
+                _S3_CLIENTS[key] = client
+    return client
+
+
+def _count_s3_bytes_read(http_response: Any, **kwargs: Any) -> None:
+    if http_response.status_code in (200, 206):
+        instrumentation.count(
+            "s3_bytes_read", int(http_response.headers.get("Content-Length", 0))
+        )
+
+
+def _count_s3_bytes_written(request: Any, **kwargs: Any) -> None:
+    instrumentation.count(
+        "s3_bytes_written", int(request.headers.get("Content-Length", 0))
+    )
+
+
+class _S3MultipartWriter(io.BufferedIOBase):
+    """
+    Binary file-like writer to an S3 object through multipart upload.
+    Data is buffered up to part_size and full parts are uploaded
+    in background threads, at most max_concurrency at the same time,
+    so memory is bounded by (max_concurrency + 1) * part_size.
+    Objects smaller than one part are uploaded with a single PUT.
+
+    :param client: boto3 S3 client.
+    :param bucket: Bucket name.
+    :param key: Object key.
+    :param part_size: Size of a part in bytes, S3 minimum is 5 MiB.
+    :param max_concurrency: Number of parts uploaded at the same time.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        bucket: str,
+        key: str,
+        part_size: int = 8 * 1024**2,
+        max_concurrency: int = 8,
+    ) -> None:
+        super().__init__()
+        self._client = client
+        self._bucket = bucket
+        self._key = key
+        self._part_size = max(part_size, _S3_MIN_PART_SIZE)
+        self._buffer = bytearray()
+        self._position = 0
+        self._upload_id: Optional[str] = None
+        self._futures: List[Future] = []
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def write(self, data: bytes) -> int:
+        if self.closed:
+            raise ValueError("S3_connector: write to closed writer.")
+        self._buffer += data
+        self._position += len(data)
+        while len(self._buffer) >= self._part_size:
+            self._submit_part(bytes(self._buffer[: self._part_size]))
+            del self._buffer[: self._part_size]
+        return len(data)
+
+    def _submit_part(self, body: bytes) -> None:
+        if self._upload_id is None:
+            self._upload_id = self._client.create_multipart_upload(
+                Bucket=self._bucket, Key=self._key
+            )["UploadId"]
+        part_number = len(self._futures) + 1
+        self._slots.acquire()
+        future = self._executor.submit(self._upload_part, part_number, body)
+        future.add_done_callback(lambda _: self._slots.release())
+        self._futures.append(future)
+
+    def _upload_part(self, part_number: int, body: bytes) -> Dict[str, Any]:
+        response = self._client.upload_part(
+            Bucket=self._bucket,
+            Key=self._key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=body,
+        )
+        return {"ETag": response["ETag"], "PartNumber": part_number}
+
+    def close(self) -> None:
+        """
+        Upload the rest of the buffer and complete the upload.
+        """
+        if self.closed:
+            return
+        try:
+            if self._upload_id is None:
+                self._client.put_object(
+                    Bucket=self._bucket, Key=self._key, Body=bytes(self._buffer)
+                )
+            else:
+                # The last part can be smaller than 5 MiB.
+                if self._buffer:
+                    self._submit_part(bytes(self._buffer))
+                parts = [future.result() for future in self._futures]
+                self._client.complete_multipart_upload(
+                    Bucket=self._bucket,
+                    Key=self._key,
+                    UploadId=self._upload_id,
+                    MultipartUpload={"Parts": parts},
+                )
+        except BaseException:
+            self.abort()
+            raise
+        self._buffer = bytearray()
+        self._executor.shutdown()
+        super().close()
+
+    def abort(self) -> None:
+        """
+        Abort the upload, nothing is saved.
+        """
+        if self.closed:
+            return
+        self._executor.shutdown(cancel_futures=True)
+        if self._upload_id is not None:
+            self._client.abort_multipart_upload(
+                Bucket=self._bucket, Key=self._key, UploadId=self._upload_id
+            )
+        self._buffer = bytearray()
+        super().close()
+
 
 class VaultConnector:
     """
@@ -284,10 +1915,23 @@ class VaultConnector:
       - VAULT_ROLE_ID for role_id
       - VAULT_SECRET_ID for secret_id
       - VAULT_NAMESPACE for namespace
+      - VAULT_ADDR for url (https://vault.lmru.tech/ by default)
+      - VAULT_CACHE_DIR for cache_dir
+      - VAULT_CACHE_TTL for cache_ttl
+
+    The token of AppRole login is reused by all connectors until it expires,
+    and renewed shortly before. KV secrets are cached for cache_ttl seconds.
+    Both are kept in memory of the process or, with cache_dir, in a file
+    shared by the pod's containers (see VaultCache), so steps and their
+    retries skip the login and reads.
 
     :param role_id: Vault role id.
     :param secret_id: Vault secret id.
     :param namespace: Vault namespace.
+    :param url: Vault address.
+    :param cache_dir: Directory of shared cache on tmpfs, in-memory if None.
+    :param cache_ttl: Seconds to reuse read secrets, 0 to read every time.
+    :param renew_before: Renew token that expires in less than these seconds.
     """
 
     def __init__(
@@ -295,6 +1939,10 @@ class VaultConnector:
         role_id: Optional[str] = None,
         secret_id: Optional[str] = None,
         namespace: Optional[str] = None,
+        url: Optional[str] = None,
+        cache_dir: Optional[str] = None,
+        cache_ttl: Optional[float] = None,
+        renew_before: float = 60.0,
     ) -> None:
         if role_id is None:
             role_id = os.getenv("VAULT_ROLE_ID", None)
@@ -308,17 +1956,75 @@ class VaultConnector:
             namespace = os.getenv("VAULT_NAMESPACE", None)
             assert namespace is not None, "VAULT_NAMESPACE env not found"
 
-        self.client = hvac.Client(url="https://vault.lmru.tech/", namespace=namespace)
+        if url is None:
+            url = os.getenv("VAULT_ADDR", "https://vault.lmru.tech/")
+        if cache_dir is None:
+            cache_dir = os.getenv("VAULT_CACHE_DIR", None) or None
+        if cache_ttl is None:
+            cache_ttl = float(os.getenv("VAULT_CACHE_TTL", 300))
 
-        self.client.auth.approle.login(
-            role_id=role_id,
-            secret_id=secret_id,
-        )
+        import hvac
 
         self._log = logging.getLogger(__name__)
+        self.client = hvac.Client(url=url, namespace=namespace)
+        self._role_id = role_id
+        self._secret_id = secret_id
+        self._cache = VaultCache(cache_dir)
+        self._cache_ttl = cache_ttl
+        self._renew_before = renew_before
+        # Cache entries are separate for every Vault, namespace and role.
+        self._cache_key = f"{url}|{namespace}|{role_id}"
+
+        self._ensure_token()
         self._log.info("Vault Connector: Connection to Vault established.")
 
-    def get_connector(self) -> hvac.Client:
+    def _ensure_token(self, force_login: bool = False) -> None:
+        """
+        Use cached token, renew it if it expires soon, or log in.
+
+        :param force_login: Log in even if a cached token looks valid.
+        """
+        import hvac
+
+        with self._cache.transaction() as state:
+            entry = state["tokens"].get(self._cache_key)
+            now = time.time()
+            if entry is not None and not force_login:
+                expires_at = entry["expires_at"]
+                if expires_at is None or expires_at - now > self._renew_before:
+                    self.client.token = entry["token"]
+                    return
+                if entry["renewable"] and expires_at > now:
+                    self.client.token = entry["token"]
+                    try:
+                        auth = self.client.auth.token.renew_self()["auth"]
+                    except hvac.exceptions.VaultError as e:
+                        self._log.warning("Vault Connector: Token renewal failed with %s.", e)
+                    else:
+                        state["tokens"][self._cache_key] = self._token_entry(auth, now)
+                        self._log.info("Vault Connector: Token renewed.")
+                        return
+
+            auth = self.client.auth.approle.login(
+                role_id=self._role_id,
+                secret_id=self._secret_id,
+            )["auth"]
+            self.client.token = auth["client_token"]
+            state["tokens"][self._cache_key] = self._token_entry(auth, now)
+            # Secrets cached with a previous token may be stale.
+            state["secrets"].pop(self._cache_key, None)
+            self._log.info("Vault Connector: Logged in with AppRole.")
+
+    @staticmethod
+    def _token_entry(auth: Dict[str, Any], now: float) -> Dict[str, Any]:
+        lease_duration = auth.get("lease_duration") or 0
+        return {
+            "token": auth["client_token"],
+            "expires_at": now + lease_duration if lease_duration > 0 else None,
+            "renewable": bool(auth.get("renewable")),
+        }
+
+    def get_connector(self) -> Any:
         """
         HVac Client.
         """
@@ -334,18 +2040,64 @@ class VaultConnector:
         :param mount_point: Vault mount point.
         :return: Secrets.
         """
+        import hvac
+
         if path is None:
             path = "/"
 
         if mount_point is None:
             mount_point = "/"
 
-        secrets_dict = self.client.secrets.kv.v2.read_secret(
-            path=f"{path}", mount_point=f"{mount_point}"
-        )["data"]["data"]
+        secret_key = f"{mount_point}|{path}"
+        with self._cache.transaction() as state:
+            entry = state["secrets"].get(self._cache_key, {}).get(secret_key)
+            if entry is not None and time.time() - entry["read_at"] < self._cache_ttl:
+                return entry["data"]
+
+        self._ensure_token()
+        try:
+            response = self.client.secrets.kv.v2.read_secret(
+                path=f"{path}", mount_point=f"{mount_point}"
+            )
+        except hvac.exceptions.Forbidden:
+            # Token revoked before its TTL, log in again once.
+            self._ensure_token(force_login=True)
+            response = self.client.secrets.kv.v2.read_secret(
+                path=f"{path}", mount_point=f"{mount_point}"
+            )
+        secrets_dict = response["data"]["data"]
+        version = response["data"].get("metadata", {}).get("version")
+
+        with self._cache.transaction() as state:
+            state["secrets"].setdefault(self._cache_key, {})[secret_key] = {
+                "data": secrets_dict,
+                "version": version,
+                "read_at": time.time(),
+            }
+        self._log.info(
+            "Vault Connector: Secrets %s/%s version %s read.", mount_point, path, version
+        )
 
         return secrets_dict
 
+    def get_secrets_many(
+        self, paths: List[Tuple[str, str]], max_workers: int = 8
+    ) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """
+        Get secrets of several paths concurrently.
+
+        :param paths: Pairs of Vault path and mount point.
+        :param max_workers: Number of threads.
+        :return: Secrets by (path, mount point).
+        """
+        self._ensure_token()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self._get_secrets, path, mount_point): (path, mount_point)
+                for path, mount_point in paths
+            }
+            return {futures[future]: future.result() for future in as_completed(futures)}
+
     def list_secrets_keys(
         self, path: Optional[str] = None, mount_point: Optional[str] = None
     ) -> None:
@@ -393,3 +2145,18 @@ class VaultConnector:
 
         for key in secrets:
             os.environ[key] = secrets_dict[key]
+
+    def set_secrets_many_as_envvars(
+        self, paths: List[Tuple[str, str]], max_workers: int = 8
+    ) -> None:
+        """
+        Set all secrets of several paths, read concurrently,
+        as environmental variables. Later paths override earlier ones.
+
+        :param paths: Pairs of Vault path and mount point.
+        :param max_workers: Number of threads.
+        """
+        secrets = self.get_secrets_many(paths, max_workers=max_workers)
+        for path in paths:
+            for key, value in secrets[path].items():
+                os.environ[key] = value
@@ -0,0 +1,157 @@
+"""
+Batched evaluation of several classification models on one dataset.
+
+Models score every batch concurrently in a thread pool (sklearn and numpy
+release the GIL in prediction), batches are read ahead only as far as
+the pool can take, so memory is bounded by a few batches whatever the size
+of the dataset. Metrics are accumulated in confusion matrices in one pass.
+"""
+import logging
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+_log = logging.getLogger(__name__)
+
+
+class ConfusionAccumulator:
+    """
+    Confusion matrix updated batch by batch, labels are added as they appear.
+    """
+
+    def __init__(self) -> None:
+        self.labels: Optional[np.ndarray] = None
+        self.matrix = np.zeros((0, 0), dtype=np.int64)
+        self.predict_seconds = 0.0
+
+    def update(self, y_true: np.ndarray, y_pred: np.ndarray) -> None:
+        """
+        Add batch predictions.
+
+        :param y_true: True labels.
+        :param y_pred: Predicted labels.
+        """
+        labels = np.union1d(y_true, y_pred)
+        if self.labels is not None:
+            labels = np.union1d(self.labels, labels)
+        if self.labels is None or labels.shape[0] != self.labels.shape[0]:
+            matrix = np.zeros((labels.shape[0], labels.shape[0]), dtype=np.int64)
+            if self.labels is not None:
+                index = np.searchsorted(labels, self.labels)
+                matrix[np.ix_(index, index)] = self.matrix
+            self.labels, self.matrix = labels, matrix
+        n = self.labels.shape[0]
+        true_index = np.searchsorted(self.labels, y_true)
+        pred_index = np.searchsorted(self.labels, y_pred)
+        self.matrix += np.bincount(
+            true_index * n + pred_index, minlength=n * n
+        ).reshape(n, n)
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Accuracy, macro and per-class precision, recall and F1
+        (0 where undefined, as sklearn with zero_division=0), latency.
+
+        :return: Metrics.
+        """
+        labels = self.labels if self.labels is not None else np.array([])
+        rows = int(self.matrix.sum())
+        true_positive = np.diag(self.matrix).astype(np.float64)
+        predicted = self.matrix.sum(axis=0)
+        actual = self.matrix.sum(axis=1)
+        precision = np.divide(
+            true_positive, predicted, out=np.zeros_like(true_positive),
+            where=predicted > 0,
+        )
+        recall = np.divide(
+            true_positive, actual, out=np.zeros_like(true_positive),
+            where=actual > 0,
+        )
+        denominator = precision + recall
+        f1 = np.divide(
+            2 * precision * recall, denominator, out=np.zeros_like(true_positive),
+            where=denominator > 0,
+        )
+        return {
+            "rows": rows,
+            "accuracy": float(true_positive.sum() / rows) if rows else 0.0,
+            "f1_macro": float(f1.mean()) if f1.size else 0.0,
+            "precision_macro": float(precision.mean()) if precision.size else 0.0,
+            "recall_macro": float(recall.mean()) if recall.size else 0.0,
+            "latency_ms_per_1k_rows": (
+                self.predict_seconds * 1000 * 1000 / rows if rows else 0.0
+            ),
+            "per_class": {
+                label.item(): {
+                    "precision": float(precision[i]),
+                    "recall": float(recall[i]),
+                    "f1": float(f1[i]),
+                    "support": int(actual[i]),
+                }
+                for i, label in enumerate(labels)
+            },
+            "labels": [label.item() for label in labels],
+            "confusion_matrix": self.matrix.tolist(),
+        }
+
+
+def _predict(model: Any, X: pd.DataFrame) -> Tuple[np.ndarray, float]:
+    start = time.perf_counter()
+    y_pred = np.asarray(model.predict(X))
+    return y_pred, time.perf_counter() - start
+
+
+def evaluate_models(
+    models: Dict[str, Any],
+    batches: Iterable[pd.DataFrame],
+    features: List[str],
+    target: str,
+    max_workers: Optional[int] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Score all models on every batch concurrently and compute their metrics.
+
+    :param models: Models by name.
+    :param batches: Batches of dataset with features and target columns.
+    :param features: Feature columns.
+    :param target: Target column.
+    :param max_workers: Number of threads, by default one per model.
+    :return: Metrics of ConfusionAccumulator.metrics by model name.
+    """
+    max_workers = max_workers or len(models)
+    accumulators = {name: ConfusionAccumulator() for name in models}
+    # Batches in flight with futures of their predictions.
+    pending: Deque[Tuple[np.ndarray, Dict[str, Future]]] = deque()
+    max_pending = max(1, max_workers // len(models)) + 1
+
+    def collect() -> None:
+        y_true, futures = pending.popleft()
+        for name, future in futures.items():
+            y_pred, seconds = future.result()
+            accumulators[name].update(y_true, y_pred)
+            accumulators[name].predict_seconds += seconds
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for batch in batches:
+            X = batch[features]
+            futures = {
+                name: executor.submit(_predict, model, X)
+                for name, model in models.items()
+            }
+            pending.append((batch[target].to_numpy(), futures))
+            if len(pending) >= max_pending:
+                collect()
+        while pending:
+            collect()
+
+    results = {name: acc.metrics() for name, acc in accumulators.items()}
+    for name, result in results.items():
+        _log.info(
+            "Evaluation: %s f1 %.4f on %i rows, %.2f ms per 1k rows.",
+            name, result["f1_macro"], result["rows"], result["latency_ms_per_1k_rows"],
+        )
+    return results
@@ -0,0 +1,131 @@
+"""
+Content fingerprints of pipeline steps.
+
+A step result depends on its input artifacts, its source code, the config
+parameters it reads and the image it runs in. The code part is known when
+the pipeline is compiled and is passed to components as an argument,
+so KFP cache keys change with the code. The full fingerprint, with hashes
+of input artifacts, is computed at runtime by step_cache.StepCache.
+
+Only hashlib and config are imported, so the pipeline compiler can use it.
+"""
+import hashlib
+import json
+import os
+from typing import Any, Dict, Iterable, Optional
+
+from lib import config
+
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Config parameters a step result depends on.
+STEP_CONFIG = {
+    "download_data": [],
+    "prepare_data": [
+        "FEATURES", "TARGET", "TEST_SIZE", "PREPARE_DATA_VECTORIZED",
+        "STREAMING_MIN_ROWS", "STREAMING_CHUNKSIZE",
+    ],
+    "hp_trial": [
+        "FEATURES", "TARGET", "MODEL_TYPE", "MODEL_PARAMS",
+        "HP_SEARCH_VALIDATION_SIZE", "HP_SEARCH_SEED",
+    ],
+    "hp_select": [],
+    "train_model": [
+        "FEATURES", "TARGET", "MODEL_TYPE", "MODEL_PARAMS",
+        "INCREMENTAL", "INCREMENTAL_ESTIMATORS",
+    ],
+    "switch_model": ["FEATURES", "TARGET"],
+    "model_inference": [
+        "FEATURES", "INFERENCE_ID_COLUMNS", "INFERENCE_PREDICTION_COLUMN",
+    ],
+}
+
+
+def hash_file(path: str, digest: Optional[Any] = None) -> Any:
+    """
+    Feed file content, or content of all files in a directory, to digest.
+
+    :param path: File or directory path.
+    :param digest: hashlib object, new sha256 if None.
+    :return: Digest.
+    """
+    digest = digest or hashlib.sha256()
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                digest.update(os.path.relpath(file_path, path).encode("utf-8"))
+                hash_file(file_path, digest)
+        return digest
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024**2), b""):
+            digest.update(block)
+    return digest
+
+
+def source_files(step: str) -> Iterable[str]:
+    """
+    Source files of step: its task.py and lib modules except config,
+    which is taken into account by parameters.
+
+    :param step: Step directory name in pipeline_steps.
+    :return: Paths.
+    """
+    yield os.path.join(_SRC_DIR, "pipeline_steps", step, "task.py")
+    lib_dir = os.path.join(_SRC_DIR, "lib")
+    for name in sorted(os.listdir(lib_dir)):
+        if name.endswith(".py") and name != "config.py":
+            yield os.path.join(lib_dir, name)
+
+
+def config_values(step: str) -> Dict[str, Any]:
+    """
+    Values of config parameters step depends on.
+
+    :param step: Step directory name in pipeline_steps.
+    :return: Parameters by name.
+    """
+    return {name: getattr(config, name) for name in STEP_CONFIG.get(step, [])}
+
+
+def code_fingerprint(step: str) -> str:
+    """
+    Fingerprint of step source and config parameters.
+
+    :param step: Step directory name in pipeline_steps.
+    :return: Hex digest.
+    """
+    digest = hashlib.sha256()
+    for path in source_files(step):
+        digest.update(os.path.relpath(path, _SRC_DIR).encode("utf-8"))
+        hash_file(path, digest)
+    digest.update(
+        json.dumps(config_values(step), sort_keys=True, default=str).encode("utf-8")
+    )
+    return digest.hexdigest()[:16]
+
+
+def step_fingerprint(
+    step: str, inputs: Dict[str, Any], parameters: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    Fingerprint of step run: code, input artifacts content, input parameters
+    and image digest from IMAGE_DIGEST environmental variable if set.
+
+    :param step: Step directory name in pipeline_steps.
+    :param inputs: Input artifacts by name.
+    :param parameters: Input parameters by name, JSON serializable.
+    :return: Hex digest.
+    """
+    digest = hashlib.sha256()
+    digest.update(code_fingerprint(step).encode("utf-8"))
+    digest.update(os.getenv("IMAGE_DIGEST", "").encode("utf-8"))
+    for name in sorted(inputs):
+        digest.update(name.encode("utf-8"))
+        digest.update(hash_file(inputs[name].path).digest())
+    if parameters:
+        digest.update(
+            json.dumps(parameters, sort_keys=True, default=str).encode("utf-8")
+        )
+    return digest.hexdigest()[:32]
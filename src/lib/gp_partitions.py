@@ -0,0 +1,66 @@
+"""
+Partition predicates for GreenplumConnector.execute_partitioned.
+"""
+from datetime import date, datetime
+from typing import List, Union
+
+import pandas as pd
+
+
+def key_range(column: str, lower: int, upper: int, n_partitions: int) -> List[str]:
+    """
+    Split integer key range [lower, upper] into n_partitions equal ranges.
+
+    :param column: Key column.
+    :param lower: Minimum key value.
+    :param upper: Maximum key value.
+    :param n_partitions: Number of partitions.
+    :return: SQL predicates.
+    """
+    assert upper >= lower, "upper must not be less than lower"
+    step = max((upper - lower + 1) // n_partitions, 1)
+    bounds = list(range(lower, upper + 1, step))[:n_partitions] + [upper + 1]
+    return [
+        f"{column} >= {start} AND {column} < {end}"
+        for start, end in zip(bounds[:-1], bounds[1:])
+    ]
+
+
+def date_range(
+    column: str,
+    start: Union[str, date, datetime],
+    end: Union[str, date, datetime],
+    freq: str = "1D",
+) -> List[str]:
+    """
+    Split dates [start, end) into ranges of pandas frequency freq.
+
+    :param column: Date or timestamp column.
+    :param start: First date, inclusive.
+    :param end: Last date, exclusive.
+    :param freq: Pandas frequency of partitions, e.g. 1D, 7D, MS.
+    :return: SQL predicates.
+    """
+    bounds = list(pd.date_range(start, end, freq=freq))
+    if not bounds or bounds[0] > pd.Timestamp(start):
+        bounds.insert(0, pd.Timestamp(start))
+    if bounds[-1] < pd.Timestamp(end):
+        bounds.append(pd.Timestamp(end))
+    return [
+        f"{column} >= '{left.isoformat()}' AND {column} < '{right.isoformat()}'"
+        for left, right in zip(bounds[:-1], bounds[1:])
+    ]
+
+
+def segments(n_segments: int, column: str = "gp_segment_id") -> List[str]:
+    """
+    One partition per GreenPlum segment, so every segment serves
+    only its own rows. Get n_segments from GreenplumConnector.segment_count.
+    Query must select from the table with a {partition} placeholder,
+    as gp_segment_id is a system column of tables only.
+
+    :param n_segments: Number of primary segments.
+    :param column: Segment id column, qualified with table alias if needed.
+    :return: SQL predicates.
+    """
+    return [f"{column} = {segment}" for segment in range(n_segments)]
@@ -0,0 +1,98 @@
+"""
+Successive halving hyperparameter search plan and trial selection.
+
+The plan is fixed when the pipeline is compiled: trials are sampled
+from the search space and rungs get growing shares of train rows,
+every rung keeps the best 1 / eta of its trials. Only the standard library
+and config are imported, so the pipeline compiler can use it.
+"""
+import random
+from typing import Any, Dict, List, Optional
+
+from lib import config
+
+
+def sample_trials(
+    space: Dict[str, List[Any]], n_trials: int, seed: int = 0
+) -> List[Dict[str, Any]]:
+    """
+    Sample distinct parameter combinations from the search space.
+    Fewer trials are returned if the space is smaller than n_trials.
+
+    :param space: Candidate values by parameter name.
+    :param n_trials: Number of trials.
+    :param seed: Random seed.
+    :return: Trials as {"trial": number, "params": {...}}.
+    """
+    rng = random.Random(seed)
+    size = 1
+    for values in space.values():
+        size *= len(values)
+    seen = set()
+    trials = []
+    while len(trials) < min(n_trials, size):
+        params = {name: rng.choice(values) for name, values in sorted(space.items())}
+        key = repr(sorted(params.items()))
+        if key in seen:
+            continue
+        seen.add(key)
+        trials.append({"trial": len(trials), "params": params})
+    return trials
+
+
+def rungs(n_trials: int, eta: int, min_fraction: float) -> List[Dict[str, Any]]:
+    """
+    Rungs of successive halving: share of train rows a trial is trained on
+    and number of trials kept after the rung. The last rung keeps one.
+
+    :param n_trials: Number of trials in the first rung.
+    :param eta: Reduction factor, at least 2.
+    :param min_fraction: Share of train rows in the first rung.
+    :return: Rungs as {"fraction": share, "keep": number}.
+    """
+    if eta < 2:
+        raise ValueError(f"HP search: eta must be at least 2, not {eta}!")
+    plan = []
+    n, fraction = n_trials, min_fraction
+    while True:
+        keep = max(1, n // eta)
+        plan.append({"fraction": min(1.0, fraction), "keep": keep})
+        if keep == 1:
+            return plan
+        n, fraction = keep, fraction * eta
+
+
+def plan(model_type: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Search plan from config.
+
+    :param model_type: Key of config.HP_SEARCH_SPACE, config.MODEL_TYPE if None.
+    :return: {"trials": [...], "rungs": [...]}.
+    """
+    model_type = model_type or config.MODEL_TYPE
+    trials = sample_trials(
+        config.HP_SEARCH_SPACE.get(model_type, {}),
+        config.HP_SEARCH_TRIALS,
+        config.HP_SEARCH_SEED,
+    )
+    return {
+        "trials": trials,
+        "rungs": rungs(
+            len(trials), config.HP_SEARCH_ETA, config.HP_SEARCH_MIN_FRACTION
+        ),
+    }
+
+
+def select(results: List[Dict[str, Any]], keep: int) -> List[Dict[str, Any]]:
+    """
+    Best trials by score, ties broken by trial number.
+
+    :param results: Trials with "score".
+    :param keep: Number of trials to keep.
+    :return: Trials without score, as sample_trials returns them.
+    """
+    ranked = sorted(results, key=lambda result: (-result["score"], result["trial"]))
+    return [
+        {"trial": result["trial"], "params": result["params"]}
+        for result in ranked[:keep]
+    ]
@@ -0,0 +1,250 @@
+"""
+Instrumentation of a pipeline step: phase timings, CPU time and peak RSS
+of the process, and byte counters fed by connectors.
+
+A step process is instrumented as a whole, state is kept in the module:
+
+    instrumentation.start("train_model")
+    with instrumentation.phase("fit"):
+        ...
+    instrumentation.count("s3_bytes_read", n)
+    instrumentation.log_metrics(metrics)  # into KFP Metrics artifact
+    instrumentation.finish()  # log, push to pushgateway, dump profile
+
+Values are pushed to the Prometheus pushgateway at PROMETHEUS_URL env,
+if it is set. With config.PROFILE the step runs under cProfile
+and stats are uploaded to S3 (pstats format, open with snakeviz).
+Only the standard library is imported, step startup is not slowed down.
+"""
+import cProfile
+import logging
+import os
+import re
+import resource
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional
+
+from lib import config
+
+_log = logging.getLogger(__name__)
+
+_LOCK = threading.Lock()
+_STATE: Dict[str, Any] = {
+    "step": None,
+    "started": time.perf_counter(),
+    "cpu_started": time.process_time(),
+    "phases": defaultdict(lambda: {"seconds": 0.0, "cpu_seconds": 0.0, "calls": 0}),
+    "counters": defaultdict(int),
+    "profiler": None,
+}
+
+
+def start(step: str, profile: Optional[bool] = None) -> None:
+    """
+    Start instrumentation of the step, resetting previous values.
+
+    :param step: Step name.
+    :param profile: Run under cProfile, config.PROFILE if None.
+    """
+    with _LOCK:
+        _STATE["step"] = step
+        _STATE["started"] = time.perf_counter()
+        _STATE["cpu_started"] = time.process_time()
+        _STATE["phases"].clear()
+        _STATE["counters"].clear()
+    if config.PROFILE if profile is None else profile:
+        _STATE["profiler"] = cProfile.Profile()
+        _STATE["profiler"].enable()
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """
+    Time a phase of the step, e.g. load, transform, fit, predict or save.
+    Repeated phases are summed. CPU time is of the whole process,
+    all threads included.
+
+    :param name: Phase name.
+    """
+    start_time, start_cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start_time, time.process_time() - start_cpu)
+
+
+def record(name: str, seconds: float, cpu_seconds: float = 0.0) -> None:
+    """
+    Add time measured elsewhere to a phase.
+
+    :param name: Phase name.
+    :param seconds: Wall time in seconds.
+    :param cpu_seconds: CPU time in seconds.
+    """
+    with _LOCK:
+        values = _STATE["phases"][name]
+        values["seconds"] += seconds
+        values["cpu_seconds"] += cpu_seconds
+        values["calls"] += 1
+
+
+def count(name: str, value: int) -> None:
+    """
+    Increase a counter, e.g. s3_bytes_read. Thread-safe.
+
+    :param name: Counter name.
+    :param value: Increment.
+    """
+    with _LOCK:
+        _STATE["counters"][name] += value
+
+
+def snapshot() -> Dict[str, float]:
+    """
+    Current values as flat metric names.
+
+    :return: Values by name.
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    values = {
+        "wall_seconds": time.perf_counter() - _STATE["started"],
+        "cpu_seconds": time.process_time() - _STATE["cpu_started"],
+        "cpu_children_seconds": children.ru_utime + children.ru_stime,
+        # ru_maxrss is in kilobytes on Linux.
+        "peak_rss_bytes": usage.ru_maxrss * 1024,
+        "peak_rss_children_bytes": children.ru_maxrss * 1024,
+    }
+    with _LOCK:
+        for name, phase_values in _STATE["phases"].items():
+            values[f"phase_{name}_seconds"] = phase_values["seconds"]
+            values[f"phase_{name}_cpu_seconds"] = phase_values["cpu_seconds"]
+        values.update(_STATE["counters"])
+    return values
+
+
+def log_metrics(metrics: Any) -> None:
+    """
+    Log current values into KFP Metrics artifact.
+
+    :param metrics: KFP artifact (Output[Metrics]).
+    """
+    for name, value in snapshot().items():
+        metrics.log_metric(name, value)
+
+
+def to_prometheus(values: Dict[str, float], success: Optional[bool] = None) -> str:
+    """
+    Values in Prometheus text exposition format, as gauges
+    kfp_step_phase_seconds{phase=...}, kfp_step_bytes{counter=...} etc.
+
+    :param values: Values from snapshot.
+    :param success: Whether the step succeeded, left out if None.
+    :return: Text.
+    """
+    samples = defaultdict(list)
+    for name, value in values.items():
+        match = re.fullmatch(r"phase_(.+?)_(seconds|cpu_seconds)", name)
+        if match:
+            samples[f"kfp_step_phase_{match.group(2)}"].append(
+                (f'{{phase="{match.group(1)}"}}', value)
+            )
+        elif name in _STATE["counters"]:
+            samples["kfp_step_count"].append((f'{{counter="{name}"}}', value))
+        else:
+            samples[f"kfp_step_{name}"].append(("", value))
+    if success is not None:
+        samples["kfp_step_success"].append(("", int(success)))
+    samples["kfp_step_last_run_timestamp_seconds"].append(("", time.time()))
+    lines = []
+    for metric, metric_samples in samples.items():
+        lines.append(f"# TYPE {metric} gauge")
+        lines.extend(f"{metric}{labels} {value}" for labels, value in metric_samples)
+    return "\n".join(lines) + "\n"
+
+
+def push(
+    values: Dict[str, float],
+    success: Optional[bool] = None,
+    url: Optional[str] = None,
+    timeout: float = 10,
+) -> bool:
+    """
+    Push values to Prometheus pushgateway, grouped by job and step.
+    A failed push is logged and does not fail the step.
+
+    :param values: Values from snapshot.
+    :param success: Whether the step succeeded.
+    :param url: Pushgateway URL, PROMETHEUS_URL env if None.
+    :param timeout: Request timeout in seconds.
+    :return: Whether values were pushed.
+    """
+    if url is None:
+        url = os.getenv("PROMETHEUS_URL", "")
+    if not url:
+        return False
+    request = urllib.request.Request(
+        f"{url.rstrip('/')}/metrics/job/{config.PROMETHEUS_JOB}/step/{_STATE['step']}",
+        data=to_prometheus(values, success).encode("utf-8"),
+        method="PUT",
+        headers={"Content-Type": "text/plain; version=0.0.4"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout):
+            pass
+    except OSError as e:
+        _log.warning("Instrumentation: push to %s failed with %s.", url, e)
+        return False
+    return True
+
+
+def dump_profile() -> Optional[str]:
+    """
+    Stop the profiler and upload stats to S3 under config.PROFILE_PATH.
+    If the upload fails, the local file is kept.
+
+    :return: S3 key or local path of stats, None if not profiling.
+    """
+    profiler = _STATE["profiler"]
+    if profiler is None:
+        return None
+    profiler.disable()
+    _STATE["profiler"] = None
+    path = os.path.join(tempfile.gettempdir(), f"{_STATE['step']}.prof")
+    profiler.dump_stats(path)
+    key = f"{config.PROFILE_PATH}{_STATE['step']}/{datetime.now():%Y%m%d_%H%M%S}.prof"
+    try:
+        from lib import connectors
+
+        connectors.S3Connector().upload_file(path, key)
+    except Exception as e:
+        _log.warning("Instrumentation: profile upload failed with %s.", e)
+        return path
+    os.remove(path)
+    _log.info("Instrumentation: profile saved to %s.", key)
+    return key
+
+
+def finish(success: bool = True) -> Dict[str, float]:
+    """
+    Finish instrumentation of the step: log values,
+    push them to pushgateway and dump profile.
+
+    :param success: Whether the step succeeded.
+    :return: Values from snapshot.
+    """
+    dump_profile()
+    values = snapshot()
+    _log.info(
+        "Instrumentation: %s %s.",
+        _STATE["step"],
+        ", ".join(f"{name} {value:.6g}" for name, value in values.items()),
+    )
+    push(values, success)
+    return values
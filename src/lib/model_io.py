@@ -0,0 +1,62 @@
+"""
+Model serialization with numpy arrays stored out-of-band (joblib format).
+
+Arrays are written raw next to the pickle stream instead of being pickled
+as byte strings, so loading does not build an intermediate copy of the
+whole file. With mmap, arrays the model keeps as numpy arrays
+(e.g. HistGradientBoosting tree nodes, SGD coefficients) are paged in
+from the OS page cache shared by all processes reading the same file.
+sklearn trees of RandomForest copy their nodes into their own buffers
+on unpickling, so forests get no page sharing from mmap: processes
+share them only through fork copy-on-write (see model_inference).
+Plain pickle files are still loaded, so old artifacts keep working.
+"""
+from typing import Any, BinaryIO, Optional, Union
+
+from lib import config
+
+MODEL_EXTENSION = ".joblib"
+
+
+def dump_model(model: Any, file: Union[str, BinaryIO]) -> None:
+    """
+    Save model in joblib format, uncompressed so it can be memory-mapped.
+
+    :param model: Model.
+    :param file: Path or binary file object.
+    """
+    import joblib
+
+    joblib.dump(model, file, compress=0)
+
+
+def load_model(file: Union[str, BinaryIO], mmap: bool = True) -> Any:
+    """
+    Load model saved with dump_model or with pickle.
+
+    Estimators that copy arrays into their own buffers on unpickling
+    (sklearn trees, so RandomForest) still get a private copy, mmap only
+    saves reading the file into a byte string first.
+
+    :param file: Path or binary file object. Only paths can be memory-mapped.
+    :param mmap: Memory-map numpy arrays read-only.
+    :return: Model.
+    """
+    import joblib
+
+    mmap_mode = "r" if mmap and isinstance(file, str) else None
+    return joblib.load(file, mmap_mode=mmap_mode)
+
+
+def read_inference_model(s3_con: Any, mmap: bool = True) -> Optional[Any]:
+    """
+    Read current inference model from S3, falling back to the legacy pickle.
+
+    :param s3_con: S3Connector.
+    :param mmap: Memory-map arrays, pass False to train the model further.
+    :return: Model, None if there is no inference model yet.
+    """
+    for path in (config.INFERENCE_MODEL_PATH, config.LEGACY_INFERENCE_MODEL_PATH):
+        if s3_con.exists(path):
+            return s3_con.read_model(path, mmap=mmap)
+    return None
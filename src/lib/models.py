@@ -0,0 +1,74 @@
+"""
+Estimators the pipeline can train, shared by train_model and hp_trial.
+sklearn is imported on first use, not with the step module.
+"""
+import importlib
+from typing import Any, Dict, Optional
+
+from lib import config
+
+# Estimator classes by model type, as module and class name.
+MODELS = {
+    "random_forest": ("sklearn.ensemble", "RandomForestClassifier"),
+    "hist_gradient_boosting": ("sklearn.ensemble", "HistGradientBoostingClassifier"),
+    "sgd": ("sklearn.linear_model", "SGDClassifier"),
+}
+
+
+def model_class(model_type: str) -> Any:
+    """
+    Estimator class of model_type.
+
+    :param model_type: Key of MODELS.
+    :return: Class.
+    """
+    if model_type not in MODELS:
+        raise ValueError(
+            f"Models: Supported models are {list(MODELS)}, not {model_type}!"
+        )
+    module, name = MODELS[model_type]
+    return getattr(importlib.import_module(module), name)
+
+
+def build_model(
+    model_type: str, n_jobs: int, params: Optional[Dict[str, Any]] = None
+) -> Any:
+    """
+    New estimator of model_type with config.MODEL_PARAMS,
+    overridden by params (e.g. found by hyperparameter search).
+
+    :param model_type: Key of MODELS.
+    :param n_jobs: Number of parallel jobs.
+    :param params: Estimator parameters.
+    :return: Estimator.
+    """
+    cls = model_class(model_type)
+    params = {**config.MODEL_PARAMS, **(params or {})}
+    if model_type in ("random_forest", "sgd"):
+        # Boosting has no n_jobs, its OpenMP threads are limited in fit_model.
+        params.setdefault("n_jobs", n_jobs)
+    elif model_type == "hist_gradient_boosting":
+        # "auto" turns early stopping on only above 10000 rows, so fits on
+        # search subsamples, on all rows and continued fits would stop
+        # at different points. Boosting uses max_iter unless asked otherwise.
+        params.setdefault("early_stopping", False)
+    return cls(**params)
+
+
+def fit_model(clf: Any, X: Any, y: Any, incremental: bool, n_jobs: int) -> Any:
+    """
+    Fit model limiting native thread pools (OpenMP, BLAS) to n_jobs.
+
+    :param clf: Estimator.
+    :param X: Features.
+    :param y: Target.
+    :param incremental: Update with partial_fit if model supports it.
+    :param n_jobs: Number of threads.
+    :return: Fitted estimator.
+    """
+    from threadpoolctl import threadpool_limits
+
+    with threadpool_limits(limits=n_jobs):
+        if incremental and hasattr(clf, "partial_fit"):
+            return clf.partial_fit(X, y)
+        return clf.fit(X, y)
@@ -0,0 +1,21 @@
+"""
+Feature preprocessing shared by training and inference.
+"""
+import numpy as np
+
+
+def normalize_rows(features: np.ndarray) -> np.ndarray:
+    """
+    Scale rows to unit L2 norm in place, as sklearn normalize does.
+    Rows of zeros are left as is. Read-only arrays, e.g. zero-copy views
+    of Arrow batches, are copied first.
+
+    :param features: 2d float array.
+    :return: The same array, or its normalized copy if it is read-only.
+    """
+    if not features.flags.writeable:
+        features = features.copy()
+    norms = np.sqrt(np.einsum("ij,ij->i", features, features))
+    norms[norms == 0] = 1
+    features /= norms[:, np.newaxis]
+    return features
@@ -0,0 +1,55 @@
+"""
+Compute resources available to the pod.
+
+os.cpu_count() reports CPUs of the node, not the pod CPU limit,
+so parallel jobs sized by it oversubscribe the container and get throttled.
+"""
+import logging
+import os
+from typing import Optional
+
+_log = logging.getLogger(__name__)
+
+
+def _cgroup_cpu_limit() -> Optional[float]:
+    """
+    CPU limit of the container from cgroup v2 cpu.max or cgroup v1 CFS quota.
+
+    :return: Number of CPUs, None if not limited.
+    """
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota == "max":
+            return None
+        return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota <= 0 or period <= 0:
+            return None
+        return quota / period
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus() -> int:
+    """
+    Number of CPUs the process can use: CPUs it is allowed to run on,
+    bounded by the cgroup CPU limit rounded down (at least 1).
+
+    :return: Number of CPUs.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, max(1, int(limit)))
+    _log.info("Resources: %i CPUs available.", cpus)
+    return cpus
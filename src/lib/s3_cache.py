@@ -0,0 +1,278 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+
+class S3Cache:
+    """
+    On-disk cache of S3 objects keyed by bucket, key and ETag.
+    A cached object is revalidated with a conditional GET (If-None-Match),
+    so an unchanged object costs one empty 304 response instead of a transfer.
+    Total size is bounded by max_size, least recently used objects are evicted.
+
+    Safe for several processes on one node sharing the directory:
+    entries are locked with flock and written with atomic renames,
+    readers get their own hard link to the object.
+
+    :param directory: Cache directory.
+    :param max_size: Maximum total size of cached objects in bytes.
+    """
+
+    def __init__(self, directory: str, max_size: int = 10 * 1024**3) -> None:
+        self._log = logging.getLogger(__name__)
+        self.directory = directory
+        self.max_size = max_size
+        for subdirectory in ("objects", "index", "locks", "tmp"):
+            os.makedirs(os.path.join(directory, subdirectory), exist_ok=True)
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "bytes_downloaded": 0,
+            "bytes_from_cache": 0,
+        }
+
+    @contextmanager
+    def _lock(self, name: str, blocking: bool = True) -> Iterator[bool]:
+        """
+        Exclusive inter-process lock.
+
+        :param name: Lock name.
+        :param blocking: Wait for the lock, otherwise give up at once.
+        :return: Whether the lock is taken.
+        """
+        with open(os.path.join(self.directory, "locks", f"{name}.lock"), "w") as f:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(f, flags)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _hash(*parts: str) -> str:
+        return hashlib.sha256("/".join(parts).encode("utf-8")).hexdigest()
+
+    def _read_index(self, entry: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self.directory, "index", f"{entry}.json")) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_index(self, entry: str, meta: Dict[str, Any]) -> None:
+        path = os.path.join(self.directory, "index", f"{entry}.json")
+        with tempfile.NamedTemporaryFile(
+            "w", dir=os.path.dirname(path), delete=False
+        ) as f:
+            json.dump(meta, f)
+        os.replace(f.name, path)
+
+    @contextmanager
+    def fetch(
+        self,
+        client: Any,
+        bucket: str,
+        key: str,
+        transfer_config: Optional[Any] = None,
+    ) -> Iterator[str]:
+        """
+        Get local path of an up-to-date copy of S3 object,
+        downloading it only if it is not cached or has changed.
+
+        The path is a private hard link to the cached object made under
+        the entry lock, so other processes can evict or replace the object
+        while it is in use. The link is removed on exit.
+
+        :param client: boto3 S3 client.
+        :param bucket: Bucket name.
+        :param key: Object key.
+        :param transfer_config: boto3 TransferConfig for big objects.
+        :return: Local path of the object.
+        """
+        entry = self._hash(bucket, key)
+        link = os.path.join(
+            self.directory, "tmp", f"{entry}-{uuid.uuid4().hex}.link"
+        )
+        with self._lock(entry):
+            blob, downloaded = self._fetch_locked(
+                client, bucket, key, entry, transfer_config
+            )
+            os.link(blob, link)
+        try:
+            if downloaded:
+                self._evict(keep=blob)
+            yield link
+        finally:
+            os.remove(link)
+
+    def _fetch_locked(
+        self,
+        client: Any,
+        bucket: str,
+        key: str,
+        entry: str,
+        transfer_config: Optional[Any],
+    ) -> Tuple[str, bool]:
+        """
+        Revalidate or download the object, entry lock must be held.
+
+        :return: Path of the cached object, whether it was downloaded.
+        """
+        from botocore.exceptions import ClientError
+
+        meta = self._read_index(entry)
+        blob = None
+        if meta is not None:
+            blob = os.path.join(self.directory, "objects", meta["blob"])
+            if not os.path.exists(blob):
+                meta, blob = None, None
+
+        params = {"Bucket": bucket, "Key": key}
+        if meta is not None:
+            params["IfNoneMatch"] = meta["etag"]
+        try:
+            response = client.get_object(**params)
+        except ClientError as e:
+            if meta is None or e.response["Error"]["Code"] != "304":
+                raise
+            os.utime(blob)
+            self.stats["hits"] += 1
+            self.stats["bytes_from_cache"] += meta["size"]
+            self._log.info("S3Cache: Hit for %s/%s.", bucket, key)
+            return blob, False
+
+        etag = response["ETag"]
+        with tempfile.NamedTemporaryFile(
+            dir=os.path.join(self.directory, "tmp"), delete=False
+        ) as f:
+            try:
+                threshold = getattr(transfer_config, "multipart_threshold", None)
+                if threshold and response["ContentLength"] > threshold:
+                    # Big object, download it with parallel ranged GETs instead.
+                    response["Body"].close()
+                    f.close()
+                    etag = self._download(
+                        client, bucket, key, f.name, response, transfer_config
+                    )
+                else:
+                    shutil.copyfileobj(response["Body"], f, 1024**2)
+            except BaseException:
+                os.remove(f.name)
+                raise
+        # Blob name starts with the entry, so eviction can lock it.
+        new_blob = os.path.join(
+            self.directory, "objects", f"{entry}-{self._hash(etag)[:16]}"
+        )
+        os.replace(f.name, new_blob)
+        if blob is not None and blob != new_blob:
+            os.remove(blob)
+        size = os.path.getsize(new_blob)
+        self._write_index(
+            entry,
+            {
+                "bucket": bucket,
+                "key": key,
+                "etag": etag,
+                "blob": os.path.basename(new_blob),
+                "size": size,
+            },
+        )
+        self.stats["misses"] += 1
+        self.stats["bytes_downloaded"] += size
+        self._log.info("S3Cache: Miss for %s/%s, %i bytes.", bucket, key, size)
+        return new_blob, True
+
+    def _download(
+        self,
+        client: Any,
+        bucket: str,
+        key: str,
+        path: str,
+        response: Dict[str, Any],
+        transfer_config: Any,
+        attempts: int = 3,
+    ) -> str:
+        """
+        Download object with parallel ranged GETs, consistent with its ETag.
+        On versioned buckets the version of response is downloaded,
+        otherwise the ETag is checked after the download, which is repeated
+        if the object changed meanwhile.
+
+        :param client: boto3 S3 client.
+        :param bucket: Bucket name.
+        :param key: Object key.
+        :param path: Local path.
+        :param response: get_object response of the object.
+        :param transfer_config: boto3 TransferConfig.
+        :param attempts: Downloads of an object that keeps changing.
+        :return: ETag of the downloaded object.
+        """
+        etag, version = response["ETag"], response.get("VersionId")
+        if version and version != "null":
+            client.download_file(
+                bucket,
+                key,
+                path,
+                ExtraArgs={"VersionId": version},
+                Config=transfer_config,
+            )
+            return etag
+        for _ in range(attempts):
+            client.download_file(bucket, key, path, Config=transfer_config)
+            current = client.head_object(Bucket=bucket, Key=key)["ETag"]
+            if current == etag:
+                return etag
+            self._log.warning(
+                "S3Cache: %s/%s changed during download, downloading again.",
+                bucket,
+                key,
+            )
+            etag = current
+        raise RuntimeError(f"S3Cache: {bucket}/{key} keeps changing during download")
+
+    def _evict(self, keep: str) -> None:
+        """
+        Remove least recently used objects until the cache fits max_size.
+        Entries locked by other processes are skipped.
+
+        :param keep: Object not to evict.
+        """
+        with self._lock("eviction"):
+            objects_dir = os.path.join(self.directory, "objects")
+            blobs = []
+            for name in os.listdir(objects_dir):
+                path = os.path.join(objects_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                blobs.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in blobs)
+            for _, size, path in sorted(blobs):
+                if total <= self.max_size:
+                    break
+                if path == keep:
+                    continue
+                entry = os.path.basename(path).split("-")[0]
+                with self._lock(entry, blocking=False) as locked:
+                    if not locked:
+                        continue
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        continue
+                total -= size
+                self.stats["evictions"] += 1
+                self._log.info("S3Cache: Evicted %s.", path)
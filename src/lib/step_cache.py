@@ -0,0 +1,97 @@
+"""
+Skipping of pipeline steps whose inputs, code and config did not change.
+
+Outputs of a step run are stored on S3 under its fingerprint
+(config.STEP_CACHE_PATH/<step>/<fingerprint>/) with their metadata.
+A run with the same fingerprint restores them instead of doing the work.
+"""
+import json
+import logging
+import os
+from typing import Any, Dict, Optional
+
+from lib import config, connectors, fingerprint
+
+_log = logging.getLogger(__name__)
+
+_META = "_outputs.json"
+
+# S3Connector settings the cache needs when no connector is given.
+_S3_ENVS = ("S3_ENDPOINT", "S3_KEY_ID", "S3_ACCESS_KEY", "S3_BUCKET")
+
+
+class StepCache:
+    """
+    Output cache of one step run.
+
+    :param step: Step directory name in pipeline_steps.
+    :param inputs: Input artifacts by name.
+    :param enabled: Use the cache, also requires config.STEP_CACHE
+        and S3 settings in env if s3_con is None.
+    :param s3_con: S3Connector, created from env if None.
+    :param parameters: Input parameters by name, part of the fingerprint.
+    """
+
+    def __init__(
+        self,
+        step: str,
+        inputs: Dict[str, Any],
+        enabled: bool = True,
+        s3_con: Optional[Any] = None,
+        parameters: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.enabled = enabled and config.STEP_CACHE
+        self.fingerprint = None
+        if self.enabled and s3_con is None:
+            missing = [name for name in _S3_ENVS if not os.getenv(name)]
+            if missing:
+                # Steps must not need S3 only for the cache.
+                _log.info(
+                    "Step cache: disabled, %s env not found.", ", ".join(missing)
+                )
+                self.enabled = False
+        if not self.enabled:
+            return
+        self.fingerprint = fingerprint.step_fingerprint(step, inputs, parameters)
+        self._s3_con = s3_con or connectors.S3Connector()
+        self._prefix = f"{config.STEP_CACHE_PATH}{step}/{self.fingerprint}/"
+        _log.info("Step cache: %s fingerprint %s.", step, self.fingerprint)
+
+    def restore(self, outputs: Dict[str, Any]) -> bool:
+        """
+        Restore output files and metadata of a run with the same fingerprint.
+
+        :param outputs: Output artifacts by name.
+        :return: Whether outputs are restored and the step can be skipped.
+        """
+        if not self.enabled or not self._s3_con.exists(self._prefix + _META):
+            return False
+        with self._s3_con.open_reader(self._prefix + _META) as f:
+            stored = json.load(f)
+        if set(stored) != set(outputs):
+            return False
+        for name, artifact in outputs.items():
+            if stored[name]["has_file"]:
+                self._s3_con.download_file(self._prefix + name, artifact.path)
+            artifact.metadata.update(stored[name]["metadata"])
+        _log.info("Step cache: outputs restored from %s.", self._prefix)
+        return True
+
+    def save(self, outputs: Dict[str, Any]) -> None:
+        """
+        Store output files and metadata under the fingerprint.
+        The metadata file is written last, so partly stored runs are not used.
+
+        :param outputs: Output artifacts by name.
+        """
+        if not self.enabled:
+            return
+        stored = {}
+        for name, artifact in outputs.items():
+            has_file = os.path.isfile(artifact.path)
+            if has_file:
+                self._s3_con.upload_file(artifact.path, self._prefix + name)
+            stored[name] = {"has_file": has_file, "metadata": dict(artifact.metadata)}
+        with self._s3_con.open_writer(self._prefix + _META) as f:
+            f.write(json.dumps(stored, default=str).encode("utf-8"))
+        _log.info("Step cache: outputs saved to %s.", self._prefix)
@@ -0,0 +1,160 @@
+"""
+Shared entry point of pipeline steps:
+
+    python -m lib.step_runner <step> --executor_input '...' [--code_fingerprint ...]
+
+Arguments are parsed before anything heavy is imported, so a bad call fails
+at once. Vault secrets are loaded only for steps that use S3 or GP, in a
+background thread while the step module and its libraries are imported;
+the Vault client is imported before the thread starts.
+Startup phases are timed and logged, `--dry_run` stops after the import
+for startup benchmarks. The step is instrumented (see lib.instrumentation),
+values are pushed to pushgateway when it finishes or fails.
+"""
+import argparse
+import importlib
+import json
+import logging.config
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+_STARTED = time.perf_counter()
+
+sys.path.append(".")
+from lib import instrumentation
+from lib.logging_config import LOGGING_CONFIG
+
+_log = logging.getLogger(__name__)
+
+# Step function name, whether it needs Vault secrets, extra environment.
+STEPS: Dict[str, Dict[str, Any]] = {
+    "download_data": {"function": "download_data", "secrets": False},
+    "prepare_data": {"function": "prepare_data", "secrets": True},
+    "hp_trial": {"function": "hp_trial", "secrets": False},
+    "hp_select": {"function": "hp_select", "secrets": False},
+    "train_model": {
+        "function": "train_model",
+        "secrets": True,
+        "env": {"CLUSTER_SPEC": '{"task":{"type":"false"}}'},
+    },
+    "switch_model": {
+        "function": "switch_model",
+        "secrets": True,
+        "env": {"CLUSTER_SPEC": '{"task":{"type":"false"}}'},
+    },
+    "model_inference": {"function": "model_inference", "secrets": True},
+}
+
+
+def _load_secrets(connectors: Any, errors: List[BaseException]) -> None:
+    try:
+        vault_con = connectors.VaultConnector()
+        vault_con.set_secrets_as_envvars(
+            path=os.getenv("VAULT_PATH"), mount_point=os.getenv("VAULT_MOUNT_POINT")
+        )
+        _log.info("Secrets imported from vault\n")
+    except BaseException as e:
+        errors.append(e)
+
+
+def _import_step(step: str) -> Any:
+    """
+    Import step module, reusing it if the step runs as a script.
+
+    :param step: Step directory name in pipeline_steps.
+    :return: Module.
+    """
+    main = sys.modules.get("__main__")
+    path = os.path.abspath(os.path.join("pipeline_steps", step, "task.py"))
+    if os.path.abspath(getattr(main, "__file__", "") or "") == path:
+        return main
+    return importlib.import_module(f"pipeline_steps.{step}.task")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("step", choices=sorted(STEPS))
+    parser.add_argument("--executor_input", type=str, default=None)
+    parser.add_argument("--code_fingerprint", type=str, default=None)
+    parser.add_argument("--dry_run", action="store_true")
+    args = parser.parse_args(argv)
+    if args.executor_input is None and not args.dry_run:
+        parser.error("--executor_input is required")
+    step = STEPS[args.step]
+
+    logging.config.dictConfig(LOGGING_CONFIG)
+    timings = {"interpreter_to_runner": _STARTED - _process_start()}
+    os.environ.update(step.get("env", {}))
+
+    # Vault login runs while the step imports its libraries. The thread
+    # does no imports, modules are not imported by two threads at once.
+    errors: List[BaseException] = []
+    secrets = None
+    start = time.perf_counter()
+    if step["secrets"] and not args.dry_run:
+        import hvac  # noqa: F401
+        from lib import connectors
+
+        secrets = threading.Thread(
+            target=_load_secrets, args=(connectors, errors), daemon=True
+        )
+        secrets.start()
+
+    module = _import_step(args.step)
+    from kfp.dsl.executor import Executor
+    from lib import fingerprint
+
+    timings["imports"] = time.perf_counter() - start
+    if secrets is not None:
+        secrets.join()
+        if errors:
+            raise errors[0]
+    timings["secrets_wait"] = time.perf_counter() - start - timings["imports"]
+    timings["startup"] = time.perf_counter() - _STARTED + timings["interpreter_to_runner"]
+    _log.info(
+        "Step runner: %s started in %s.",
+        args.step,
+        ", ".join(f"{name} {seconds:.3f}s" for name, seconds in timings.items()),
+    )
+
+    if args.code_fingerprint not in (None, fingerprint.code_fingerprint(args.step)):
+        _log.warning("Code or config differ from the compiled pipeline.\n")
+    if args.dry_run:
+        print(json.dumps({"step": args.step, **timings}))
+        return
+
+    instrumentation.start(args.step)
+    instrumentation.record("startup", timings["startup"], time.process_time())
+    success = False
+    try:
+        executor_input = json.loads(args.executor_input)
+        _log.info(executor_input)
+        executor = Executor(executor_input, getattr(module, step["function"]))
+        executor.execute()
+        success = True
+    finally:
+        instrumentation.finish(success)
+
+
+def _process_start() -> float:
+    """
+    Process start on perf_counter clock, from /proc on Linux.
+
+    :return: perf_counter value, _STARTED if unknown.
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        age = uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+        return time.perf_counter() - age
+    except (OSError, ValueError, IndexError):
+        return _STARTED
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import fcntl
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+
+class VaultCache:
+    """
+    Cache of Vault tokens and KV secrets.
+    Kept in memory of the process, or, if directory is given, in a file
+    there shared by all processes and containers of the pod mounting it.
+    The directory should be on tmpfs (e.g. an emptyDir with medium Memory),
+    so secrets never reach a disk. The file is readable by the owner only.
+
+    State is changed in transactions, locked with flock between processes.
+
+    :param directory: Cache directory, in-memory cache if None.
+    """
+
+    _memory: Dict[str, Any] = {}
+    _memory_lock = threading.Lock()
+
+    def __init__(self, directory: Optional[str] = None) -> None:
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            self._path = os.path.join(directory, "vault-cache.json")
+
+    @contextmanager
+    def transaction(self) -> Iterator[Dict[str, Any]]:
+        """
+        Locked state of the cache, saved on exit without exception.
+
+        :return: State dictionary with tokens and secrets sections.
+        """
+        with self._memory_lock:
+            if self.directory is None:
+                state = json.loads(json.dumps(self._memory)) if self._memory else {}
+                state.setdefault("tokens", {})
+                state.setdefault("secrets", {})
+                yield state
+                VaultCache._memory = state
+                return
+
+            with open(os.path.join(self.directory, "vault-cache.lock"), "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    state = self._read()
+                    yield state
+                    self._write(state)
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            with open(self._path) as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            state = {}
+        state.setdefault("tokens", {})
+        state.setdefault("secrets", {})
+        return state
+
+    def _write(self, state: Dict[str, Any]) -> None:
+        with tempfile.NamedTemporaryFile(
+            "w", dir=self.directory, delete=False
+        ) as f:
+            os.chmod(f.name, 0o600)
+            json.dump(state, f)
+        os.replace(f.name, self._path)
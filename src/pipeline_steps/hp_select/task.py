@@ -0,0 +1,50 @@
+import json
+import logging.config
+import sys
+from typing import List
+
+from kfp.dsl import Metrics, Output, OutputPath
+
+sys.path.append(".")
+from lib import hp_search, instrumentation, step_runner
+from lib.logging_config import LOGGING_CONFIG
+
+logging.config.dictConfig(LOGGING_CONFIG)
+_log = logging.getLogger(__name__)
+
+
+def hp_select(results: List[dict],
+              keep: int,
+              metrics: Output[Metrics],
+              trials: OutputPath(list),
+              best_params: OutputPath(dict)) -> None:
+    """
+    Keep the best trials of a successive halving rung for the next one.
+    Parameters of the best trial are the output of the last rung.
+    Kept trials are JSON strings, items of the next rung ParallelFor.
+    """
+    selected = hp_search.select(results, keep)
+    with open(trials, "w") as f:
+        json.dump([json.dumps(trial) for trial in selected], f)
+    with open(best_params, "w") as f:
+        json.dump(selected[0]["params"], f)
+    best = next(
+        result for result in results if result["trial"] == selected[0]["trial"]
+    )
+    _log.info(
+        f"Task hp select: {len(selected)} of {len(results)} trials kept, "
+        f"best trial {best['trial']} {best['params']} scored {best['score']:.4f}.\n"
+    )
+
+    # Log metrics.
+    metrics.log_metric("trials", len(results))
+    metrics.log_metric("kept", len(selected))
+    metrics.log_metric("best_trial", best["trial"])
+    metrics.log_metric("f1score_best", best["score"])
+    for result in results:
+        metrics.log_metric(f"f1score_trial_{result['trial']}", result["score"])
+    instrumentation.log_metrics(metrics)
+
+
+if __name__ == "__main__":
+    step_runner.main(["hp_select"] + sys.argv[1:])
@@ -0,0 +1,92 @@
+import json
+import logging.config
+import sys
+import time
+from typing import Tuple
+
+import numpy as np
+from kfp.dsl import Dataset, Input, Metrics, Output, OutputPath
+
+sys.path.append(".")
+from lib import artifacts, config, evaluation, instrumentation, resources, step_runner
+from lib.logging_config import LOGGING_CONFIG
+from lib.models import build_model, fit_model
+
+logging.config.dictConfig(LOGGING_CONFIG)
+_log = logging.getLogger(__name__)
+
+
+def split_rows(n_rows: int, fraction: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Validation rows and a share of the other rows to train on.
+    Rows are shuffled with config.HP_SEARCH_SEED, so every trial is validated
+    on the same rows and bigger shares of later rungs contain smaller ones.
+
+    :param n_rows: Number of train rows.
+    :param fraction: Share of non-validation rows to train on.
+    :return: Train and validation row indices.
+    """
+    order = np.random.default_rng(config.HP_SEARCH_SEED).permutation(n_rows)
+    n_validation = int(round(n_rows * config.HP_SEARCH_VALIDATION_SIZE))
+    n_train = max(1, int(round((n_rows - n_validation) * fraction)))
+    return order[n_validation:n_validation + n_train], order[:n_validation]
+
+
+def hp_trial(train: Input[Dataset],
+             trial: str,
+             fraction: float,
+             metrics: Output[Metrics],
+             result: OutputPath(dict)) -> None:
+    """
+    Train model with trial parameters on a share of train rows
+    and score it on the validation part of train (f1 macro).
+    Test dataset is left for switch_model.
+    Trial is a JSON of hp_search.sample_trials item, as KFP passes
+    ParallelFor items over task outputs as strings.
+    """
+    trial = json.loads(trial)
+    # Read data from previous step.
+    with instrumentation.phase("load"):
+        dataset = artifacts.read_dataset(
+            train, columns=config.FEATURES + [config.TARGET]
+        )
+    train_rows, validation_rows = split_rows(dataset.shape[0], fraction)
+    X, y = dataset[config.FEATURES], dataset[config.TARGET]
+
+    # Train model on a share of rows.
+    n_jobs = config.N_JOBS or resources.available_cpus()
+    clf = build_model(config.MODEL_TYPE, n_jobs, trial["params"])
+    start = time.perf_counter()
+    with instrumentation.phase("fit"):
+        clf = fit_model(
+            clf, X.iloc[train_rows], y.iloc[train_rows], False, n_jobs
+        )
+    fit_seconds = time.perf_counter() - start
+
+    # Score on validation rows.
+    accumulator = evaluation.ConfusionAccumulator()
+    with instrumentation.phase("predict"):
+        accumulator.update(
+            y.iloc[validation_rows].to_numpy(),
+            np.asarray(clf.predict(X.iloc[validation_rows])),
+        )
+    score = accumulator.metrics()["f1_macro"]
+    _log.info(
+        f"Task hp trial: trial {trial['trial']} {trial['params']} on "
+        f"{len(train_rows)} rows scored {score:.4f} in {fit_seconds:.1f} s.\n"
+    )
+
+    with open(result, "w") as f:
+        json.dump({**trial, "score": score, "fraction": fraction}, f)
+
+    # Log metrics.
+    metrics.log_metric("trial", trial["trial"])
+    metrics.log_metric("fraction", fraction)
+    metrics.log_metric("train_rows", len(train_rows))
+    metrics.log_metric("f1score_validation", score)
+    metrics.log_metric("fit_seconds", fit_seconds)
+    instrumentation.log_metrics(metrics)
+
+
+if __name__ == "__main__":
+    step_runner.main(["hp_trial"] + sys.argv[1:])
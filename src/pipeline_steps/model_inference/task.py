@@ -0,0 +1,186 @@
+import logging.config
+import multiprocessing
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Iterable, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from kfp.dsl import Metrics, Output
+from threadpoolctl import threadpool_limits
+
+sys.path.append(".")
+from lib import (
+    config, connectors, instrumentation, model_io, preprocessing, resources,
+    step_runner,
+)
+from lib.logging_config import LOGGING_CONFIG
+
+logging.config.dictConfig(LOGGING_CONFIG)
+_log = logging.getLogger(__name__)
+
+# Model of the parent process, inherited by forked scoring processes.
+_MODEL = None
+
+
+def _init_worker() -> None:
+    # Every process scores one chunk at a time on one core.
+    threadpool_limits(limits=1)
+
+
+def _score(features: np.ndarray) -> Tuple[np.ndarray, float]:
+    """
+    Normalize features as prepare_data does and predict.
+
+    :param features: Features of a chunk in config.FEATURES order.
+    :return: Predictions and scoring time in seconds.
+    """
+    start = time.perf_counter()
+    X = pd.DataFrame(
+        preprocessing.normalize_rows(features), columns=config.FEATURES
+    )
+    return np.asarray(_MODEL.predict(X)), time.perf_counter() - start
+
+
+def read_chunks() -> Iterator[pd.DataFrame]:
+    """
+    Stream rows to score from config.INFERENCE_SOURCE.
+
+    :return: Iterator of dataframes with features and id columns.
+    """
+    columns = config.INFERENCE_ID_COLUMNS + config.FEATURES
+    if config.INFERENCE_SOURCE == "s3":
+        yield from connectors.S3Connector().iter_table(
+            config.INFERENCE_INPUT_PATH,
+            chunksize=config.INFERENCE_CHUNKSIZE,
+            columns=columns,
+        )
+    elif config.INFERENCE_SOURCE == "gp":
+        for chunk in connectors.GreenplumConnector().execute_chunked(
+            config.INFERENCE_INPUT_QUERY, chunksize=config.INFERENCE_CHUNKSIZE
+        ):
+            yield chunk[columns]
+    else:
+        raise ValueError(
+            f"Task model inference: Supported sources are s3 and gp, "
+            f"not {config.INFERENCE_SOURCE}!"
+        )
+
+
+def score_chunks(
+    chunks: Iterable[pd.DataFrame], workers: int, latencies: List[float]
+) -> Iterator[pd.DataFrame]:
+    """
+    Score chunks in a pool of forked processes sharing the model,
+    keeping input order. At most two chunks per process are in flight,
+    so memory is bounded whatever the input size.
+
+    :param chunks: Chunks with features and id columns.
+    :param workers: Number of processes.
+    :param latencies: List to append scoring time of every chunk to.
+    :return: Iterator of dataframes with id columns and prediction.
+    """
+    pending: Deque[Tuple[pd.DataFrame, Future]] = deque()
+
+    def collect() -> pd.DataFrame:
+        chunk, future = pending.popleft()
+        y_pred, seconds = future.result()
+        latencies.append(seconds)
+        predictions = chunk[config.INFERENCE_ID_COLUMNS].reset_index(drop=True)
+        predictions[config.INFERENCE_PREDICTION_COLUMN] = y_pred
+        return predictions
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=_init_worker,
+    ) as executor:
+        for chunk in chunks:
+            features = chunk[config.FEATURES].to_numpy(dtype=np.float64)
+            pending.append((chunk, executor.submit(_score, features)))
+            if len(pending) >= 2 * workers:
+                yield collect()
+        while pending:
+            yield collect()
+
+
+def write_predictions(predictions: Iterable[pd.DataFrame]) -> int:
+    """
+    Stream predictions to config.INFERENCE_SINK.
+
+    :param predictions: Dataframes with id columns and prediction.
+    :return: Number of written rows.
+    """
+    if config.INFERENCE_SINK == "gp":
+        return connectors.GreenplumConnector().load_table(
+            predictions, config.INFERENCE_OUTPUT_TABLE, mode="append"
+        )
+    if config.INFERENCE_SINK != "s3":
+        raise ValueError(
+            f"Task model inference: Supported sinks are s3 and gp, "
+            f"not {config.INFERENCE_SINK}!"
+        )
+
+    predictions = iter(predictions)
+    first = next(predictions, None)
+    if first is None:
+        return 0
+    n_rows = 0
+    table = pa.Table.from_pandas(first, preserve_index=False)
+    with connectors.S3Connector().open_writer(config.INFERENCE_OUTPUT_PATH) as f:
+        with pq.ParquetWriter(f, table.schema, compression="snappy") as writer:
+            while table is not None:
+                writer.write_table(table)
+                n_rows += table.num_rows
+                chunk = next(predictions, None)
+                table = (
+                    pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+                    if chunk is not None else None
+                )
+    return n_rows
+
+
+def model_inference(metrics: Output[Metrics]) -> None:
+    """
+    Score rows from S3 or GP with the inference model in chunks
+    and stream predictions to S3 or GP.
+    """
+    global _MODEL
+
+    # Load model once, forked processes share its memory.
+    with instrumentation.phase("load"):
+        _MODEL = model_io.read_inference_model(connectors.S3Connector())
+    assert _MODEL is not None, "Task model inference: there is no inference model"
+    if "n_jobs" in _MODEL.get_params():
+        _MODEL.set_params(n_jobs=1)
+    workers = config.INFERENCE_WORKERS or resources.available_cpus()
+    _log.info(f"Task model inference: model loaded, {workers} workers.\n")
+
+    # Score.
+    start = time.perf_counter()
+    latencies: List[float] = []
+    # Reading, scoring and writing are interleaved.
+    with instrumentation.phase("predict"):
+        n_rows = write_predictions(score_chunks(read_chunks(), workers, latencies))
+    seconds = time.perf_counter() - start
+    _log.info(f"Task model inference: {n_rows} rows scored in {seconds:.1f} s.\n")
+
+    # Log metrics.
+    metrics.log_metric("rows", n_rows)
+    metrics.log_metric("chunks", len(latencies))
+    metrics.log_metric("rows_per_second", n_rows / seconds if seconds else 0.0)
+    if latencies:
+        for q in (50, 95, 99):
+            metrics.log_metric(
+                f"chunk_latency_p{q}_ms", float(np.percentile(latencies, q)) * 1000
+            )
+    instrumentation.log_metrics(metrics)
+    _log.info("Task model inference: metrics collected.\n")
+
+
+if __name__ == "__main__":
+    step_runner.main(["model_inference"] + sys.argv[1:])
@@ -1,19 +1,16 @@
-import argparse
-import json
 import logging.config
-import os
 import sys
 from datetime import datetime
-from typing import Tuple
+from typing import Any, Iterable, Tuple
 
+import numpy as np
 import pandas as pd
 from kfp.dsl import Metrics, Input, Output, Dataset
-from kfp.dsl.executor import Executor
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import Normalizer
 
 sys.path.append(".")
-from lib import config, connectors
+from lib import (
+    artifacts, config, instrumentation, preprocessing, step_cache, step_runner,
+)
 from lib.logging_config import LOGGING_CONFIG
 
 logging.config.dictConfig(LOGGING_CONFIG)
@@ -24,6 +21,10 @@ def preprcocess_and_split_data(data: pd.DataFrame) -> Tuple[pd.DataFrame, pd.Dat
     """
     Normalize data.
     """
+    # sklearn takes a second to import, only this reference path needs it.
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import Normalizer
+
     target = data[config.TARGET].copy()
     features = data[config.FEATURES].copy()
 
@@ -49,40 +50,167 @@ def preprcocess_and_split_data(data: pd.DataFrame) -> Tuple[pd.DataFrame, pd.Dat
     )
 
 
+def stratified_split_indices(
+    target: np.ndarray, test_size: float, random_state: int = 42
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Shuffled stratified train/test split as index arrays, without sorting
+    by class: every row gets its rank within its class in a random
+    permutation, and rows ranked below the class test quota go to test.
+
+    As in sklearn, ceil(test_size * n) rows go to test, split between
+    classes in proportion to their size, the rows left after rounding down
+    go to the classes with the largest remainders.
+
+    :param target: Target values.
+    :param test_size: Share of test rows.
+    :param random_state: Seed of the permutation.
+    :return: Train and test row indices.
+    """
+    permutation = np.random.default_rng(random_state).permutation(target.shape[0])
+    classes, labels, counts = np.unique(
+        target[permutation], return_inverse=True, return_counts=True
+    )
+    n_test = int(np.ceil(test_size * target.shape[0]))
+    exact = counts * n_test / target.shape[0]
+    quotas = np.floor(exact).astype(np.int64)
+    largest_remainders = np.argsort(quotas - exact, kind="stable")
+    quotas[largest_remainders[: n_test - quotas.sum()]] += 1
+
+    order = np.argsort(labels, kind="stable")
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    ranks = np.empty_like(order)
+    ranks[order] = np.arange(order.shape[0]) - starts[labels[order]]
+    is_test = ranks < quotas[labels]
+    return permutation[~is_test], permutation[is_test]
+
+
+def preprocess_and_split_array(
+    data: pd.DataFrame, dtype: Any = np.float64
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Normalize data and split it with a single allocation of the features.
+    Same result as preprcocess_and_split_data up to the random split,
+    used with config.PREPARE_DATA_VECTORIZED.
+
+    Features are gathered column by column straight into one column-major
+    block in train-then-test row order, rows are normalized in place,
+    and train and test are views of that block.
+
+    :param data: Dataset with features and target.
+    :param dtype: Float dtype of features, np.float32 halves memory.
+    :return: Train and test datasets.
+    """
+    target = data[config.TARGET].to_numpy()
+    train_index, test_index = stratified_split_indices(target, config.TEST_SIZE)
+    order = np.concatenate([train_index, test_index])
+
+    # Column-major, so every column is filled in place without a temporary.
+    features = np.empty(
+        (order.shape[0], len(config.FEATURES)), dtype=dtype, order="F"
+    )
+    for i, column in enumerate(config.FEATURES):
+        np.take(
+            data[column].to_numpy(dtype=dtype), order, out=features[:, i], mode="clip"
+        )
+
+    preprocessing.normalize_rows(features)
+
+    n_train = train_index.shape[0]
+    target = target[order]
+    train_data = pd.DataFrame(features[:n_train], columns=config.FEATURES, copy=False)
+    train_data[config.TARGET] = target[:n_train]
+    test_data = pd.DataFrame(features[n_train:], columns=config.FEATURES, copy=False)
+    test_data[config.TARGET] = target[n_train:]
+
+    return train_data, test_data
+
+
+def preprocess_and_split_stream(
+    chunks: Iterable[pd.DataFrame],
+    train_writer: artifacts.DatasetWriter,
+    test_writer: artifacts.DatasetWriter,
+) -> None:
+    """
+    Normalize and split data chunk by chunk, writing train and test
+    incrementally, so only one chunk is in memory.
+
+    Rows are assigned to test by hash of their content: a row goes to test
+    if its hash is below TEST_SIZE share of the hash range. The hash is
+    uniform in every class, so every class gets about TEST_SIZE share
+    of test rows, and a row's split does not depend on chunk size
+    or on the rows around it.
+    """
+    threshold = np.uint64(min(int(config.TEST_SIZE * 2**64), 2**64 - 1))
+    for chunk in chunks:
+        target = chunk[config.TARGET]
+        hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+        is_test = hashes < threshold
+
+        # Normalization is row-wise and stateless, so chunks are independent.
+        features = chunk[config.FEATURES].to_numpy(dtype=np.float64)
+        normalized = pd.DataFrame(
+            preprocessing.normalize_rows(features),
+            columns=config.FEATURES,
+        )
+        normalized[config.TARGET] = target.to_numpy()
+        train_writer.write(normalized[~is_test])
+        test_writer.write(normalized[is_test])
+
+
 def prepare_data(data: Input[Dataset],
     metrics: Output[Metrics],
     train: Output[Dataset],
     test: Output[Dataset]) -> None:
     """
     Read train dataset from prevous step, normalize, save train and test splitted.
+    Outputs of a previous run with the same data, code and config are reused.
     """
-    # Read data from previous step.
-    dataset = pd.read_csv(data.path)
-    train_data, test_data = preprcocess_and_split_data(dataset)
-    _log.info("Task prepare data: datasets prepared.\n")
+    cache = step_cache.StepCache("prepare_data", {"data": data})
+    outputs = {"metrics": metrics, "train": train, "test": test}
+    if cache.restore(outputs):
+        _log.info("Task prepare data: outputs restored from step cache.\n")
+        return
+
+    # Big datasets are processed out-of-core.
+    num_rows = artifacts.dataset_num_rows(data)
+    if num_rows is not None and num_rows >= config.STREAMING_MIN_ROWS:
+        chunks = artifacts.iter_dataset(
+            data,
+            config.STREAMING_CHUNKSIZE,
+            columns=config.FEATURES + [config.TARGET],
+        )
+        # Reading, transforming and writing are interleaved.
+        with instrumentation.phase("transform"), \
+                artifacts.open_dataset_writer(train) as train_writer, \
+                artifacts.open_dataset_writer(test) as test_writer:
+            preprocess_and_split_stream(chunks, train_writer, test_writer)
+        train_size, test_size = train_writer.num_rows, test_writer.num_rows
+        _log.info("Task prepare data: datasets prepared in chunks.\n")
+    else:
+        # Read data from previous step.
+        with instrumentation.phase("load"):
+            dataset = artifacts.read_dataset(data)
+        with instrumentation.phase("transform"):
+            if config.PREPARE_DATA_VECTORIZED:
+                train_data, test_data = preprocess_and_split_array(dataset)
+            else:
+                train_data, test_data = preprcocess_and_split_data(dataset)
+        del dataset
+        _log.info("Task prepare data: datasets prepared.\n")
+        with instrumentation.phase("save"):
+            artifacts.write_dataset(train_data, train)
+            artifacts.write_dataset(test_data, test)
+        train_size, test_size = train_data.shape[0], test_data.shape[0]
 
     # Log metrics (choose your own!)
     datestamp = datetime.now().strftime("%Y%m%d")
     metrics.log_metric("date", datestamp)
-    metrics.log_metric("train_size", train_data.shape[0])
-    metrics.log_metric("test_size", test_data.shape[0])
+    metrics.log_metric("train_size", train_size)
+    metrics.log_metric("test_size", test_size)
     metrics.log_metric("split", config.TEST_SIZE)
-
-    train_data.to_csv(train.path, index_label=0)
-    test_data.to_csv(test.path, index_label=0)
+    cache.save(outputs)
+    instrumentation.log_metrics(metrics)
 
 if __name__ == "__main__":
-    vault_con = connectors.VaultConnector()
-    vault_con.set_secrets_as_envvars(
-        path=os.getenv("VAULT_PATH"), mount_point=os.getenv("VAULT_MOUNT_POINT")
-    )
-    _log.info("Secrets imported from vault\n")
-
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--executor_input", type=str, required=True)
-    args = parser.parse_args()
-
-    executor_input = json.loads(args.executor_input)
-    _log.info(executor_input)
-    executor = Executor(executor_input, prepare_data)
-    executor.execute()
+    step_runner.main(["prepare_data"] + sys.argv[1:])
@@ -1,17 +1,13 @@
-import argparse
-import json
 import logging.config
-import os
-import pandas as pd
-import pickle
 import sys
 
 from kfp.dsl import Artifact, Metrics, Input, Output, Dataset, InputPath, Model
-from kfp.dsl.executor import Executor
-from sklearn.metrics import f1_score
 
 sys.path.append(".")
-from lib import config, connectors
+from lib import (
+    artifacts, config, connectors, evaluation, instrumentation, model_io, resources,
+    step_runner,
+)
 from lib.logging_config import LOGGING_CONFIG
 
 logging.config.dictConfig(LOGGING_CONFIG)
@@ -23,28 +19,38 @@ def switch_model(model: Input[Model],
                  metrics: Output[Metrics]) -> None:
     """
     Switch inference model based on f1 score.
+    Both models are scored on the test dataset in batches, concurrently.
     """
     # Read new and current model from S3.
     s3_con = connectors.S3Connector()
-    current_model = s3_con.load_file("template/models/inference_model.pkl")
-    with open(model.path, "rb") as f:
-        new_model = pickle.load(f)
+    with instrumentation.phase("load"):
+        models = {"new": model_io.load_model(model.path)}
+        current_model = model_io.read_inference_model(s3_con)
+    if current_model is not None:
+        models["current"] = current_model
+    _log.info("Task switch model: models downloaded from S3.\n")
 
-    # Read test data from previous steps.
-    test = pd.read_csv(test.path)
-    _log.info("Task switch model: models and test data downloaded from S3.\n")
-
-    # Train model.
-    X_test, y_test = test[config.FEATURES], test[config.TARGET]
-    y_pred_current = current_model.predict(X_test)
-    y_pred_new = new_model.predict(X_test)
+    # Score models on test data from previous steps, read in batches.
+    with instrumentation.phase("predict"):
+        results = evaluation.evaluate_models(
+            models,
+            artifacts.iter_dataset(
+                test,
+                chunksize=config.EVALUATION_BATCH_SIZE,
+                columns=config.FEATURES + [config.TARGET],
+            ),
+            config.FEATURES,
+            config.TARGET,
+            max_workers=config.EVALUATION_WORKERS or resources.available_cpus(),
+        )
     _log.info("Task switch model: predictions made.\n")
 
     # Choose model.
-    f1_score_current = f1_score(y_test, y_pred_current, average="macro")
-    f1_score_new = f1_score(y_test, y_pred_new, average="macro")
+    f1_score_new = results["new"]["f1_macro"]
+    f1_score_current = results.get("current", {}).get("f1_macro", 0.0)
     if f1_score_new > f1_score_current:
-        s3_con.save_model(new_model, "template/models/inference_model.pkl")
+        with instrumentation.phase("save"):
+            s3_con.save_model(models["new"], config.INFERENCE_MODEL_PATH)
         _log.info("Task switch model: new model saved for inference.\n")
     else:
         _log.info("Task switch model: current model left for inference.\n")
@@ -52,21 +58,18 @@ def switch_model(model: Input[Model],
     # Log metrics.
     metrics.log_metric("f1score_current", f1_score_current)
     metrics.log_metric("f1score_new", f1_score_new)
+    for name, result in results.items():
+        for metric in ("accuracy", "precision_macro", "recall_macro",
+                       "latency_ms_per_1k_rows"):
+            metrics.log_metric(f"{metric}_{name}", result[metric])
+        for label, class_metrics in result["per_class"].items():
+            metrics.log_metric(f"f1score_{name}_class_{label}", class_metrics["f1"])
+    if s3_con.cache is not None:
+        metrics.log_metric("s3_cache_hits", s3_con.cache.stats["hits"])
+        metrics.log_metric("s3_cache_misses", s3_con.cache.stats["misses"])
+    instrumentation.log_metrics(metrics)
     _log.info("Task switch model: metrics collected.\n")
 
 
 if __name__ == "__main__":
-    vault_con = connectors.VaultConnector()
-    vault_con.set_secrets_as_envvars(
-        path=os.getenv("VAULT_PATH"), mount_point=os.getenv("VAULT_MOUNT_POINT")
-    )
-    _log.info("Secrets imported from vault\n")
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--executor_input", type=str, required=True)
-    args = parser.parse_args()
-
-    executor_input = json.loads(args.executor_input)
-    _log.info(executor_input)
-    os.environ["CLUSTER_SPEC"] = '{"task":{"type":"false"}}'
-    executor = Executor(executor_input, switch_model)
-    executor.execute()
+    step_runner.main(["switch_model"] + sys.argv[1:])
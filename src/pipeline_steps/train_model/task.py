@@ -1,69 +1,144 @@
-import argparse
-import json
 import logging.config
-import os
-import pandas as pd
-import pickle
 import sys
 
 from datetime import datetime
+from typing import Any, Optional
+
+import numpy as np
 from kfp.dsl import Artifact, ClassificationMetrics, Input, Output, Dataset, Model
-from kfp.dsl.executor import Executor
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import confusion_matrix
 
 sys.path.append(".")
-from lib import config, connectors
+from lib import (
+    artifacts, config, connectors, instrumentation, model_io, resources, step_cache,
+    step_runner,
+)
 from lib.logging_config import LOGGING_CONFIG
+from lib.models import build_model, fit_model, model_class
 
 logging.config.dictConfig(LOGGING_CONFIG)
 _log = logging.getLogger(__name__)
 
 
+def continue_model(current_model: Optional[Any], model_type: str,
+                   classes: np.ndarray, n_jobs: int) -> Optional[Any]:
+    """
+    Prepare current inference model for incremental training:
+    forests and boosting keep their trees and grow
+    config.INCREMENTAL_ESTIMATORS more, other models are updated with partial_fit.
+
+    :param current_model: Current inference model or None.
+    :param model_type: Key of MODELS.
+    :param classes: Classes of train dataset.
+    :param n_jobs: Number of parallel jobs.
+    :return: Model to continue training, None if it has to be trained from scratch.
+    """
+    from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+
+    if current_model is None:
+        _log.info("Task train model: no inference model, training from scratch.\n")
+        return None
+    if not isinstance(current_model, model_class(model_type)):
+        _log.warning(
+            f"Task train model: inference model is {type(current_model).__name__}, "
+            f"not {model_type}, training from scratch.\n"
+        )
+        return None
+    # Trees of the current model vote for its classes, new classes can't be added.
+    if not np.array_equal(np.sort(current_model.classes_), np.sort(classes)):
+        _log.warning(
+            f"Task train model: classes changed from {list(current_model.classes_)} "
+            f"to {list(classes)}, training from scratch.\n"
+        )
+        return None
+
+    if isinstance(current_model, RandomForestClassifier):
+        current_model.set_params(
+            warm_start=True,
+            n_estimators=len(current_model.estimators_) + config.INCREMENTAL_ESTIMATORS,
+            n_jobs=n_jobs,
+        )
+    elif isinstance(current_model, HistGradientBoostingClassifier):
+        # Pinned like in build_model, new trees are not cut by early stopping.
+        current_model.set_params(
+            warm_start=True,
+            max_iter=current_model.n_iter_ + config.INCREMENTAL_ESTIMATORS,
+            early_stopping=False,
+        )
+    return current_model
+
+
 def train_model(train: Input[Dataset],
                 test: Input[Dataset],
                 metrics: Output[ClassificationMetrics],
-                model: Output[Model]) -> None:
+                model: Output[Model],
+                params: Optional[dict] = None) -> None:
     """
     Read train dataset, normalize, save train and test splitted for the next steps.
+
+    Model is trained from scratch with config.MODEL_PARAMS overridden by params
+    (best parameters of hyperparameter search), or, with config.INCREMENTAL,
+    the current inference model is trained further on the train dataset.
+    Outputs of a previous run with the same data, code, config and params
+    are reused, unless training is incremental and depends on the inference model.
     """
+    cache = step_cache.StepCache(
+        "train_model",
+        {"train": train, "test": test},
+        enabled=not config.INCREMENTAL,
+        parameters={"params": params or {}},
+    )
+    outputs = {"metrics": metrics, "model": model}
+    if cache.restore(outputs):
+        _log.info("Task train model: outputs restored from step cache.\n")
+        return
+
     # Read data from previous step.
-    train_dataset = pd.read_csv(train.path)
-    test_dataset = pd.read_csv(test.path)
+    columns = config.FEATURES + [config.TARGET]
+    with instrumentation.phase("load"):
+        train_dataset = artifacts.read_dataset(train, columns=columns)
+        test_dataset = artifacts.read_dataset(test, columns=columns)
     _log.info("Task train model: datasets prepared.\n")
 
     # Train model.
     X_train, y_train = train_dataset[config.FEATURES], train_dataset[config.TARGET]
     X_test, y_test = test_dataset[config.FEATURES], test_dataset[config.TARGET]
-    clf = RandomForestClassifier()
-    clf.fit(X_train, y_train)
-    y_pred = clf.predict(X_test)
-    _log.info("Task train model: model trained.\n")
+    n_jobs = config.N_JOBS or resources.available_cpus()
+    clf = None
+    if config.INCREMENTAL:
+        with instrumentation.phase("load"):
+            current_model = model_io.read_inference_model(
+                connectors.S3Connector(), mmap=False
+            )
+        clf = continue_model(
+            current_model, config.MODEL_TYPE, np.unique(y_train), n_jobs
+        )
+    incremental = clf is not None
+    if clf is None:
+        clf = build_model(config.MODEL_TYPE, n_jobs, params)
+    start = datetime.now()
+    with instrumentation.phase("fit"):
+        clf = fit_model(clf, X_train, y_train, incremental, n_jobs)
+    with instrumentation.phase("predict"):
+        y_pred = clf.predict(X_test)
+    _log.info(
+        f"Task train model: {type(clf).__name__} "
+        f"{'updated' if incremental else 'trained'} with {n_jobs} jobs "
+        f"in {datetime.now() - start}.\n"
+    )
 
     # Log metrics.
+    from sklearn.metrics import confusion_matrix
+
     metrics.log_confusion_matrix(sorted(y_train.unique()),
                                  confusion_matrix(y_test, y_pred).tolist())
     _log.info("Task train model: metrics collected.\n")
 
     # Save model for next step.
-    with open(model.path, "wb") as f:
-        pickle.dump(clf, f)
+    with instrumentation.phase("save"):
+        model_io.dump_model(clf, model.path)
     _log.info(f"Task train model: model saved to {model.path}.\n")
+    cache.save(outputs)
 
 
 if __name__ == "__main__":
-    vault_con = connectors.VaultConnector()
-    vault_con.set_secrets_as_envvars(
-        path=os.getenv("VAULT_PATH"), mount_point=os.getenv("VAULT_MOUNT_POINT")
-    )
-    _log.info("Secrets imported from vault\n")
-
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--executor_input", type=str, required=True)
-    args = parser.parse_args()
-
-    executor_input = json.loads(args.executor_input)
-    _log.info(executor_input)
-    os.environ["CLUSTER_SPEC"] = '{"task":{"type":"false"}}'
-    executor = Executor(executor_input, train_model)
-    executor.execute()
+    step_runner.main(["train_model"] + sys.argv[1:])
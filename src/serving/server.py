@@ -0,0 +1,309 @@
+"""
+Online inference server for the current inference model.
+
+Concurrent requests are collected into micro-batches scored with one
+vectorized predict call. The model is read from S3 with S3Connector
+and reloaded in the background when its ETag changes,
+e.g. after switch_model saves a new one.
+
+Run from src directory:
+    python serving/server.py
+    python serving/server.py --model_file /tmp/model.joblib  # local model, no reload
+
+POST /predict {"instances": [[...features...], ...]}
+  or {"instances": [{"feature": value, ...}, ...]}
+  -> {"predictions": [...], "model_etag": "..."}
+GET /health -> {"status": "ok", "model_etag": "..."}
+"""
+import argparse
+import asyncio
+import logging.config
+import os
+import sys
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from aiohttp import web
+from botocore.exceptions import ClientError
+
+sys.path.append(".")
+from lib import config, connectors, model_io, preprocessing
+from lib.logging_config import LOGGING_CONFIG
+
+logging.config.dictConfig(LOGGING_CONFIG)
+_log = logging.getLogger(__name__)
+
+
+class ModelHolder:
+    """
+    Current inference model with the ETag of its S3 object.
+    With s3_con None the model is read once from model_file.
+
+    :param s3_con: S3Connector.
+    :param model_file: Local model file, used instead of S3.
+    """
+
+    def __init__(
+        self, s3_con: Optional[Any] = None, model_file: Optional[str] = None
+    ) -> None:
+        self._s3_con = s3_con
+        self._model_file = model_file
+        self.reloadable = s3_con is not None
+        self.model: Any = None
+        self.etag: Optional[str] = None
+
+    def _head(self) -> Tuple[str, str]:
+        """
+        Path and ETag of the inference model, legacy pickle if there is no joblib.
+
+        :return: Path and ETag.
+        """
+        for path in (config.INFERENCE_MODEL_PATH, config.LEGACY_INFERENCE_MODEL_PATH):
+            try:
+                response = self._s3_con.s3_session.head_object(
+                    Bucket=self._s3_con.bucket, Key=path
+                )
+            except ClientError as e:
+                if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                    continue
+                raise
+            return path, response["ETag"]
+        raise FileNotFoundError("Serving: there is no inference model on S3")
+
+    def reload(self) -> bool:
+        """
+        Load the model if it is not loaded or its ETag changed.
+        Blocking, called from a thread.
+
+        :return: Whether a new model is loaded.
+        """
+        if not self.reloadable:
+            if self.model is not None:
+                return False
+            self.model = model_io.load_model(self._model_file)
+            self.etag = os.path.basename(self._model_file)
+            return True
+
+        path, etag = self._head()
+        if etag == self.etag:
+            return False
+        model = self._s3_con.read_model(path)
+        # Single reference swap, batches in progress keep the old model.
+        self.model, self.etag = model, etag
+        _log.info("Serving: model %s with ETag %s loaded.", path, etag)
+        return True
+
+    async def watch(self, interval: float) -> None:
+        """
+        Reload the model every interval seconds if it has changed.
+
+        :param interval: Seconds between checks.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await loop.run_in_executor(None, self.reload)
+            except Exception:
+                _log.exception("Serving: model reload failed, serving the old one.")
+
+
+class MicroBatcher:
+    """
+    Collects rows of concurrent requests into batches of at most
+    max_batch_size rows, waiting at most max_wait_ms after the first one,
+    and scores every batch with one predict call in a worker thread.
+    Requests are not split between batches, a request bigger than
+    max_batch_size is scored alone in several predict calls.
+
+    :param holder: ModelHolder.
+    :param max_batch_size: Maximum number of rows in a batch.
+    :param max_wait_ms: Maximum wait for a batch to fill up in milliseconds.
+    """
+
+    def __init__(
+        self, holder: ModelHolder, max_batch_size: int, max_wait_ms: float
+    ) -> None:
+        self._holder = holder
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000
+        self._queue: "asyncio.Queue[Tuple[np.ndarray, asyncio.Future]]" = asyncio.Queue()
+
+    async def predict(self, features: np.ndarray) -> Tuple[np.ndarray, str]:
+        """
+        Score rows within the next batch.
+
+        :param features: 2d array of features in config.FEATURES order.
+        :return: Predictions and ETag of the model.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((features, future))
+        return await future
+
+    async def run(self) -> None:
+        """
+        Batching loop, runs until cancelled. A request that does not fit
+        into the batch waits for the next one, a failed batch fails only
+        its own requests.
+        """
+        loop = asyncio.get_running_loop()
+        carried = None
+        while True:
+            items = [carried if carried is not None else await self._queue.get()]
+            carried = None
+            rows = items[0][0].shape[0]
+            deadline = loop.time() + self._max_wait
+            while rows < self._max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if rows + item[0].shape[0] > self._max_batch_size:
+                    carried = item
+                    break
+                items.append(item)
+                rows += item[0].shape[0]
+
+            try:
+                await self._score_batch(items)
+            except Exception as e:
+                _log.exception("Serving: batch of %i rows failed.", rows)
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def _score_batch(
+        self, items: List[Tuple[np.ndarray, asyncio.Future]]
+    ) -> None:
+        """
+        Score batch in a worker thread and set results of its requests.
+
+        :param items: Features and futures of requests.
+        """
+        model, etag = self._holder.model, self._holder.etag
+        predictions = await asyncio.get_running_loop().run_in_executor(
+            None,
+            self._score,
+            model,
+            [features for features, _ in items],
+            self._max_batch_size,
+        )
+        offset = 0
+        for features, future in items:
+            if not future.done():
+                future.set_result(
+                    (predictions[offset: offset + features.shape[0]], etag)
+                )
+            offset += features.shape[0]
+
+    @staticmethod
+    def _score(
+        model: Any, batch: List[np.ndarray], max_batch_size: int
+    ) -> np.ndarray:
+        # Normalize features as prepare_data does.
+        X = pd.DataFrame(
+            preprocessing.normalize_rows(np.vstack(batch)), columns=config.FEATURES
+        )
+        # A single request can be bigger than max_batch_size, it is scored in slices.
+        return np.concatenate([
+            np.asarray(model.predict(X.iloc[offset: offset + max_batch_size]))
+            for offset in range(0, X.shape[0], max_batch_size)
+        ])
+
+
+def parse_instances(body: Any) -> np.ndarray:
+    """
+    Features of request instances, given as lists in config.FEATURES order
+    or as objects with feature names.
+
+    :param body: Request JSON.
+    :return: 2d float array.
+    """
+    instances = body["instances"]
+    if not instances:
+        raise ValueError("no instances")
+    if isinstance(instances[0], dict):
+        instances = [[row[feature] for feature in config.FEATURES] for row in instances]
+    features = np.asarray(instances, dtype=np.float64)
+    if features.ndim != 2 or features.shape[1] != len(config.FEATURES):
+        raise ValueError(f"instances must have {len(config.FEATURES)} features")
+    return features
+
+
+async def predict_handler(request: web.Request) -> web.Response:
+    try:
+        features = parse_instances(await request.json())
+    except (KeyError, TypeError, ValueError) as e:
+        return web.json_response({"error": f"Bad request: {e}"}, status=400)
+    predictions, etag = await request.app["batcher"].predict(features)
+    return web.json_response(
+        {"predictions": predictions.tolist(), "model_etag": etag}
+    )
+
+
+async def health_handler(request: web.Request) -> web.Response:
+    return web.json_response(
+        {"status": "ok", "model_etag": request.app["holder"].etag}
+    )
+
+
+def create_app(
+    holder: ModelHolder,
+    max_batch_size: int = config.SERVING_MAX_BATCH_SIZE,
+    max_wait_ms: float = config.SERVING_MAX_WAIT_MS,
+    reload_interval: float = config.SERVING_RELOAD_INTERVAL,
+) -> web.Application:
+    """
+    Application serving the model of holder, loaded on startup.
+
+    :param holder: ModelHolder.
+    :param max_batch_size: Maximum number of rows in a batch.
+    :param max_wait_ms: Maximum wait for a batch to fill up in milliseconds.
+    :param reload_interval: Seconds between checks of model ETag.
+    :return: Application.
+    """
+    app = web.Application()
+    app["holder"] = holder
+    app.router.add_post("/predict", predict_handler)
+    app.router.add_get("/health", health_handler)
+
+    async def background(app: web.Application) -> Any:
+        await asyncio.get_running_loop().run_in_executor(None, holder.reload)
+        app["batcher"] = MicroBatcher(holder, max_batch_size, max_wait_ms)
+        tasks = [asyncio.create_task(app["batcher"].run())]
+        if holder.reloadable:
+            tasks.append(asyncio.create_task(holder.watch(reload_interval)))
+        yield
+        for task in tasks:
+            task.cancel()
+
+    app.cleanup_ctx.append(background)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=config.SERVING_PORT)
+    parser.add_argument("--max_batch_size", type=int, default=config.SERVING_MAX_BATCH_SIZE)
+    parser.add_argument("--max_wait_ms", type=float, default=config.SERVING_MAX_WAIT_MS)
+    parser.add_argument("--model_file", type=str, default=None)
+    args = parser.parse_args()
+
+    if args.model_file is not None:
+        model_holder = ModelHolder(model_file=args.model_file)
+    else:
+        if os.getenv("VAULT_PATH"):
+            vault_con = connectors.VaultConnector()
+            vault_con.set_secrets_as_envvars(
+                path=os.getenv("VAULT_PATH"), mount_point=os.getenv("VAULT_MOUNT_POINT")
+            )
+            _log.info("Secrets imported from vault\n")
+        model_holder = ModelHolder(s3_con=connectors.S3Connector())
+    web.run_app(
+        create_app(model_holder, args.max_batch_size, args.max_wait_ms),
+        port=args.port,
+    )
@@ -0,0 +1,30 @@
+"""
+Tests run from src directory, as pipeline steps do:
+    python -m pytest -q tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from devtools import s3_stub
+
+BUCKET = "tests"
+
+
+@pytest.fixture(scope="session")
+def s3_server():
+    """
+    moto S3 server with BUCKET, S3_* env points to it.
+    """
+    server = s3_stub.serve(BUCKET)
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def s3_con(s3_server):
+    from lib import connectors
+
+    return connectors.S3Connector(part_size=5 * 1024**2, max_concurrency=4)
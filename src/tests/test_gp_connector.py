@@ -0,0 +1,94 @@
+"""
+GreenplumConnector parts that don't need a database, psycopg2 pool is faked.
+"""
+import pandas as pd
+import psycopg2.pool
+import psycopg2.sql
+import pytest
+
+from lib import connectors, instrumentation
+
+
+class FakePool:
+    instances = []
+
+    def __init__(self, minconn, maxconn, **dsn):
+        self.minconn, self.maxconn, self.closed = minconn, maxconn, False
+        FakePool.instances.append(self)
+
+    def closeall(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    FakePool.instances = []
+    monkeypatch.setattr(psycopg2.pool, "ThreadedConnectionPool", FakePool)
+    monkeypatch.setattr(connectors._GreenplumPool, "_pools", {})
+    dsn = dict(database="db", user="u", password="p", host="h", port="5432")
+    return lambda **kwargs: connectors.GreenplumConnector(**dsn, **kwargs)
+
+
+def test_pool_is_shared_until_last_connector_closes(fake_pool):
+    first, second = fake_pool(), fake_pool()
+    assert first._pool is second._pool
+    pool = first._pool._pool
+    assert (pool.minconn, pool.maxconn) == (4, 4)
+
+    first.close_conenction()
+    assert not pool.closed
+    second.close_conenction()
+    assert pool.closed
+    # A new connector gets a new pool.
+    assert fake_pool()._pool._pool is not pool
+
+
+def test_pool_is_keyed_by_size(fake_pool):
+    small, big = fake_pool(pool_size=2), fake_pool(pool_size=8)
+    assert small._pool is not big._pool
+    assert (small._pool.size, big._pool.size) == (2, 8)
+
+
+@pytest.mark.parametrize(
+    "error, calls",
+    [(psycopg2.OperationalError, 3), (psycopg2.ProgrammingError, 1)],
+)
+def test_partition_retried_only_on_connection_errors(
+    fake_pool, monkeypatch, error, calls
+):
+    gp_con = fake_pool(backoff=0)
+    attempts = []
+
+    def copy(query, filename=None):
+        attempts.append(query)
+        raise error("failed")
+
+    monkeypatch.setattr(gp_con, "_copy", copy)
+    with pytest.raises(error):
+        gp_con.execute_partitioned("SELECT 1", ["true"], retries=2)
+    assert len(attempts) == calls
+
+
+class CopyCursor:
+    def copy_expert(self, statement, file):
+        self.statement, self.data = statement, file.read()
+
+
+@pytest.mark.parametrize(
+    "chunk",
+    [
+        pd.DataFrame({"a": [1, 2, 3], "b": ["x", "y,z", None]}),
+        # Mixed types Arrow can't convert, copied via pandas.
+        pd.DataFrame({"a": [1, "x", 2.5]}),
+    ],
+    ids=["arrow", "pandas"],
+)
+def test_copy_counts_bytes_of_buffer(chunk):
+    instrumentation.start("test", profile=False)
+    cursor = CopyCursor()
+    connectors.GreenplumConnector._copy_from(cursor, psycopg2.sql.Identifier("t"), chunk)
+
+    values = instrumentation.snapshot()
+    assert values["gp_bytes_written"] == len(cursor.data) > 0
+    assert values["gp_rows_written"] == len(chunk)
+    assert cursor.data.count(b"\n") == len(chunk)
@@ -0,0 +1,69 @@
+"""
+Step instrumentation pushed to devtools/pushgateway_stub.
+"""
+import time
+
+import pytest
+
+from devtools import pushgateway_stub
+from lib import config, instrumentation
+
+
+@pytest.fixture
+def pushgateway(monkeypatch):
+    stub = pushgateway_stub.PushgatewayStub()
+    server = pushgateway_stub.serve(stub, port=0)
+    monkeypatch.setenv("PROMETHEUS_URL", f"http://127.0.0.1:{server.server_port}")
+    yield stub
+    server.shutdown()
+    server.server_close()
+
+
+def test_finish_pushes_phases_and_counters(pushgateway):
+    instrumentation.start("prepare_data", profile=False)
+    with instrumentation.phase("load"):
+        time.sleep(0.05)
+    with instrumentation.phase("load"):
+        pass
+    instrumentation.count("s3_bytes_read", 100)
+    instrumentation.count("s3_bytes_read", 23)
+    values = instrumentation.finish(success=True)
+
+    assert pushgateway.stats["pushes"] == 1
+    group = (("job", config.PROMETHEUS_JOB), ("step", "prepare_data"))
+    samples = pushgateway.groups[group]
+    assert samples['kfp_step_phase_seconds{phase="load"}'] == pytest.approx(
+        values["phase_load_seconds"]
+    )
+    assert samples['kfp_step_phase_seconds{phase="load"}'] >= 0.05
+    assert samples['kfp_step_count{counter="s3_bytes_read"}'] == 123
+    assert samples["kfp_step_success"] == 1
+    assert samples["kfp_step_peak_rss_bytes"] > 0
+
+    exposition = pushgateway.exposition()
+    labels = f'job="{config.PROMETHEUS_JOB}",step="prepare_data"'
+    assert f'kfp_step_count{{{labels},counter="s3_bytes_read"}} 123.0\n' in exposition
+    assert f"kfp_step_success{{{labels}}} 1.0\n" in exposition
+
+
+def test_exposition_declares_every_metric_once():
+    instrumentation.start("train_model", profile=False)
+    instrumentation.record("fit", 2.0, 3.0)
+    instrumentation.count("gp_rows_written", 7)
+    text = instrumentation.to_prometheus(instrumentation.snapshot(), success=False)
+
+    lines = text.splitlines()
+    types = [line.split()[2] for line in lines if line.startswith("# TYPE")]
+    assert len(types) == len(set(types))
+    assert 'kfp_step_phase_seconds{phase="fit"} 2.0' in lines
+    assert 'kfp_step_phase_cpu_seconds{phase="fit"} 3.0' in lines
+    assert 'kfp_step_count{counter="gp_rows_written"} 7' in lines
+    assert "kfp_step_success 0" in lines
+
+
+def test_failed_push_does_not_fail_step():
+    instrumentation.start("prepare_data", profile=False)
+    # Nothing listens on the discard port.
+    url = "http://127.0.0.1:9"
+
+    assert not instrumentation.push(instrumentation.snapshot(), url=url, timeout=1)
@@ -0,0 +1,36 @@
+"""
+Memory mapping of models saved with model_io.
+"""
+import numpy as np
+import pytest
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.linear_model import SGDClassifier
+
+from lib import model_io
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(0)
+    return rng.random((500, 4)), rng.integers(0, 3, 500)
+
+
+def fit_and_reload(model, data, tmp_path):
+    model.fit(*data)
+    path = str(tmp_path / f"model{model_io.MODEL_EXTENSION}")
+    model_io.dump_model(model, path)
+    loaded = model_io.load_model(path)
+    np.testing.assert_array_equal(loaded.predict(data[0]), model.predict(data[0]))
+    return loaded
+
+
+def test_boosting_and_sgd_arrays_are_memory_mapped(data, tmp_path):
+    boosting = fit_and_reload(HistGradientBoostingClassifier(max_iter=5), data, tmp_path)
+    assert isinstance(boosting._predictors[0][0].nodes, np.memmap)
+    sgd = fit_and_reload(SGDClassifier(), data, tmp_path)
+    assert isinstance(sgd.coef_, np.memmap)
+
+
+def test_forest_trees_copy_their_nodes(data, tmp_path):
+    forest = fit_and_reload(RandomForestClassifier(n_estimators=3), data, tmp_path)
+    assert not isinstance(forest.estimators_[0].tree_.value, np.memmap)
@@ -0,0 +1,45 @@
+"""
+In-memory split and normalization of prepare_data.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.model_selection import train_test_split
+
+from lib import config
+from pipeline_steps.prepare_data import task
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    rng = np.random.default_rng(0)
+    features = rng.random((1003, len(config.FEATURES)))
+    data = pd.DataFrame(features, columns=config.FEATURES)
+    # Unbalanced classes, so rounding of class quotas matters.
+    data[config.TARGET] = rng.choice(
+        [3, 5, 6, 7, 8], size=1003, p=[0.05, 0.4, 0.3, 0.2, 0.05]
+    )
+    return data
+
+
+def test_class_test_counts_match_sklearn(dataset):
+    target = dataset[config.TARGET].to_numpy()
+    _, test_index = task.stratified_split_indices(target, config.TEST_SIZE)
+    _, sklearn_test = train_test_split(
+        target, test_size=config.TEST_SIZE, random_state=42, stratify=target
+    )
+    assert test_index.shape[0] == np.ceil(config.TEST_SIZE * target.shape[0])
+    assert (
+        pd.Series(target[test_index]).value_counts().sort_index()
+        .equals(pd.Series(sklearn_test).value_counts().sort_index())
+    )
+
+
+def test_vectorized_path_normalizes_like_sklearn(dataset):
+    train, test = task.preprocess_and_split_array(dataset)
+    reference_train, reference_test = task.preprcocess_and_split_data(dataset)
+    assert (train.shape, test.shape) == (reference_train.shape, reference_test.shape)
+    prepared = pd.concat([train, test]).sort_values(config.FEATURES)
+    reference = pd.concat([reference_train, reference_test])
+    reference = reference.sort_values(config.FEATURES)
+    np.testing.assert_allclose(prepared.to_numpy(), reference.to_numpy())
@@ -0,0 +1,92 @@
+"""
+S3Cache against the moto S3 stub.
+"""
+import json
+import os
+
+import pytest
+
+from lib.s3_cache import S3Cache
+
+from conftest import BUCKET
+
+BIG = 6 * 1024**2
+
+
+class ChangingClient:
+    """
+    boto3 client replacing the object after the first multipart download,
+    as a concurrent writer would.
+    """
+
+    def __init__(self, client, new_body):
+        self._client = client
+        self._new_body = new_body
+        self.downloads = 0
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def download_file(self, *args, **kwargs):
+        self._client.download_file(*args, **kwargs)
+        self.downloads += 1
+        if self.downloads == 1:
+            self._client.put_object(Bucket=BUCKET, Key=args[1], Body=self._new_body)
+
+
+def read(cache, client, key, transfer_config):
+    with cache.fetch(client, BUCKET, key, transfer_config) as path:
+        with open(path, "rb") as f:
+            return f.read()
+
+
+def test_big_object_is_downloaded_in_parts_and_revalidated(s3_con, tmp_path):
+    body = os.urandom(BIG)
+    s3_con.s3_session.put_object(Bucket=BUCKET, Key="cache/big.bin", Body=body)
+    cache = S3Cache(str(tmp_path))
+    config = s3_con._transfer_config
+    assert BIG > config.multipart_threshold
+
+    assert read(cache, s3_con.s3_session, "cache/big.bin", config) == body
+    assert read(cache, s3_con.s3_session, "cache/big.bin", config) == body
+    assert (cache.stats["misses"], cache.stats["hits"]) == (1, 1)
+    # Only the object is left, links of readers are removed.
+    assert os.listdir(tmp_path / "tmp") == []
+
+
+def test_object_changed_during_download_is_downloaded_again(s3_con, tmp_path):
+    new_body = os.urandom(BIG)
+    s3_con.s3_session.put_object(
+        Bucket=BUCKET, Key="cache/changing.bin", Body=os.urandom(BIG)
+    )
+    client = ChangingClient(s3_con.s3_session, new_body)
+    cache = S3Cache(str(tmp_path))
+
+    config = s3_con._transfer_config
+    assert read(cache, client, "cache/changing.bin", config) == new_body
+    assert client.downloads == 2
+    head = s3_con.s3_session.head_object(Bucket=BUCKET, Key="cache/changing.bin")
+    (entry,) = os.listdir(tmp_path / "index")
+    with open(tmp_path / "index" / entry) as f:
+        assert json.load(f)["etag"] == head["ETag"]
+
+
+def test_evicted_object_stays_readable_while_in_use(s3_con, tmp_path):
+    s3_con.s3_session.put_object(Bucket=BUCKET, Key="cache/a.bin", Body=b"a" * 100)
+    s3_con.s3_session.put_object(Bucket=BUCKET, Key="cache/b.bin", Body=b"b" * 100)
+    cache = S3Cache(str(tmp_path), max_size=150)
+
+    with cache.fetch(s3_con.s3_session, BUCKET, "cache/a.bin") as path:
+        # Another reader evicts a to fit b.
+        other = S3Cache(str(tmp_path), max_size=150)
+        assert read(other, s3_con.s3_session, "cache/b.bin", None) == b"b" * 100
+        assert other.stats["evictions"] == 1
+        with open(path, "rb") as f:
+            assert f.read() == b"a" * 100
+
+
+def test_missing_object_raises(s3_con, tmp_path):
+    from botocore.exceptions import ClientError
+
+    with pytest.raises(ClientError):
+        read(S3Cache(str(tmp_path)), s3_con.s3_session, "cache/missing.bin", None)
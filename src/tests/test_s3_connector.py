@@ -0,0 +1,148 @@
+"""
+S3Connector concurrent and streaming transfers against the moto stub.
+"""
+import asyncio
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+from botocore.exceptions import ClientError
+
+PREFIX = "tests/s3_connector"
+
+
+async def collect(aiterator) -> list:
+    return [item async for item in aiterator]
+
+
+@pytest.fixture
+def tables(s3_con):
+    rng = np.random.default_rng(0)
+    tables = {
+        f"{PREFIX}/{i:02d}.parquet": pd.DataFrame(rng.random((10, 2)), columns=["a", "b"])
+        for i in range(8)
+    }
+    asyncio.run(s3_con.save_many(tables, max_concurrency=4))
+    yield tables
+    s3_con.clean_s3([PREFIX], 0)
+
+
+def test_load_many_returns_every_file_once(s3_con, tables):
+    loaded = asyncio.run(collect(s3_con.load_many(tables, max_concurrency=3)))
+
+    assert sorted(name for name, _ in loaded) == sorted(tables)
+    for name, data in loaded:
+        pd.testing.assert_frame_equal(data, tables[name])
+
+
+def test_load_many_yields_in_order_of_completion(s3_con):
+    filenames = [f"{PREFIX}/{i}" for i in range(4)]
+
+    def loader(name: str) -> str:
+        # The first file takes the longest.
+        time.sleep(0.05 * (len(filenames) - filenames.index(name)))
+        return name
+
+    loaded = asyncio.run(collect(s3_con.load_many(filenames, 4, loader=loader)))
+
+    assert loaded == [(name, name) for name in reversed(filenames)]
+
+
+def test_load_many_takes_files_as_results_are_consumed(s3_con):
+    max_concurrency, taken, running, peak = 3, [], [], [0]
+    lock = threading.Lock()
+
+    def filenames():
+        for i in range(20):
+            taken.append(i)
+            yield f"{PREFIX}/{i}"
+
+    def loader(name: str) -> str:
+        with lock:
+            running.append(name)
+            peak[0] = max(peak[0], len(running))
+        time.sleep(0.01)
+        with lock:
+            running.remove(name)
+        return name
+
+    async def consume() -> None:
+        consumed = 0
+        async for _ in s3_con.load_many(filenames(), max_concurrency, loader=loader):
+            consumed += 1
+            assert len(taken) <= consumed + max_concurrency
+            await asyncio.sleep(0.02)
+
+    asyncio.run(consume())
+    assert len(taken) == 20
+    assert peak[0] <= max_concurrency
+
+
+def test_load_many_raises_error_of_a_file_and_stops(s3_con, tables):
+    filenames, max_concurrency = list(tables), 3
+    # The failing file is in the first wave, the others wait for its failure,
+    # so no transfer may start after it. Ones not started yet are cancelled.
+    failed, started = threading.Event(), []
+
+    def loader(name: str) -> pd.DataFrame:
+        started.append(name)
+        if name == filenames[1]:
+            failed.set()
+            raise RuntimeError(f"failed {name}")
+        failed.wait(timeout=5)
+        return s3_con._load_object(name)
+
+    with pytest.raises(RuntimeError, match=f"failed {filenames[1]}"):
+        asyncio.run(collect(s3_con.load_many(filenames, max_concurrency, loader=loader)))
+    time.sleep(0.2)
+    assert filenames[1] in started
+    assert len(started) <= max_concurrency
+
+
+def test_load_many_raises_missing_file(s3_con, tables):
+    filenames = list(tables) + [f"{PREFIX}/missing.parquet"]
+
+    with pytest.raises(ClientError):
+        asyncio.run(collect(s3_con.load_many(filenames, max_concurrency=2)))
+
+
+def test_save_many_raises_error_of_a_table(s3_con):
+    def saver(data: pd.DataFrame, name: str) -> None:
+        if name.endswith("1"):
+            raise RuntimeError(f"failed {name}")
+
+    tables = {f"{PREFIX}/{i}": None for i in range(4)}
+    with pytest.raises(RuntimeError, match=f"failed {PREFIX}/1"):
+        asyncio.run(s3_con.save_many(tables, max_concurrency=2, saver=saver))
+
+
+def test_open_writer_and_reader_round_trip(s3_con):
+    filename = f"{PREFIX}/stream.bin"
+    # Above the part size, written in pieces not aligned to parts.
+    data = os.urandom(12 * 1024**2 + 123)
+    try:
+        with s3_con.open_writer(filename) as writer:
+            for start in range(0, len(data), 1024**2 + 7):
+                writer.write(data[start : start + 1024**2 + 7])
+
+        with s3_con.open_reader(filename) as reader:
+            assert reader.read() == data
+    finally:
+        s3_con.clean_s3([PREFIX], 0)
+
+
+def test_open_writer_aborts_on_error(s3_con):
+    filename = f"{PREFIX}/aborted.bin"
+
+    with pytest.raises(RuntimeError):
+        with s3_con.open_writer(filename) as writer:
+            writer.write(os.urandom(6 * 1024**2))
+            raise RuntimeError("failed")
+
+    with pytest.raises(ClientError):
+        s3_con.s3_session.head_object(Bucket=s3_con.bucket, Key=filename)
+    uploads = s3_con.s3_session.list_multipart_uploads(Bucket=s3_con.bucket)
+    assert not uploads.get("Uploads")
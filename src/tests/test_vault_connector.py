@@ -0,0 +1,95 @@
+"""
+VaultConnector token and secret caching against devtools/vault_stub.
+"""
+import os
+import stat
+
+import pytest
+
+from devtools import vault_stub
+from lib import connectors
+from lib.vault_cache import VaultCache
+
+SECRETS = {"prod/secret_vars": {"S3_KEY_ID": "id", "S3_ACCESS_KEY": "key"}}
+
+
+@pytest.fixture
+def vault(monkeypatch):
+    """
+    Stub with fresh state and an empty in-memory cache.
+    """
+    monkeypatch.setattr(VaultCache, "_memory", {})
+    stub = vault_stub.VaultStub(SECRETS)
+    server = vault_stub.serve(stub, port=0)
+    stub.url = f"http://127.0.0.1:{server.server_port}"
+    yield stub
+    server.shutdown()
+    server.server_close()
+
+
+def connect(vault, **kwargs):
+    return connectors.VaultConnector(
+        role_id="role", secret_id="secret", namespace="ns", url=vault.url, **kwargs
+    )
+
+
+@pytest.mark.parametrize("backend", ["memory", "file"])
+def test_token_is_reused_by_connectors(vault, tmp_path, backend):
+    cache_dir = str(tmp_path / "vault") if backend == "file" else None
+    first = connect(vault, cache_dir=cache_dir)
+    second = connect(vault, cache_dir=cache_dir)
+
+    assert vault.stats["logins"] == 1
+    assert second.client.token == first.client.token
+    assert second._get_secrets("secret_vars", "prod") == SECRETS["prod/secret_vars"]
+    if backend == "file":
+        path = os.path.join(cache_dir, "vault-cache.json")
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+        assert stat.S_IMODE(os.stat(cache_dir).st_mode) == 0o700
+
+
+def test_token_is_renewed_near_expiry(vault):
+    vault.token_ttl = 30
+    first = connect(vault, renew_before=60)
+    second = connect(vault, renew_before=60)
+
+    assert vault.stats["logins"] == 1
+    assert vault.stats["renewals"] == 1
+    assert second.client.token == first.client.token
+
+
+def test_token_is_not_renewed_far_from_expiry(vault):
+    connect(vault, renew_before=60)
+    connect(vault, renew_before=60)
+
+    assert vault.stats["renewals"] == 0
+
+
+@pytest.mark.parametrize("cache_ttl, reads", [(300, 1), (0, 2)])
+def test_secrets_are_cached_for_ttl(vault, cache_ttl, reads):
+    con = connect(vault, cache_ttl=cache_ttl)
+    for _ in range(2):
+        assert con._get_secrets("secret_vars", "prod") == SECRETS["prod/secret_vars"]
+
+    assert vault.stats["reads"] == reads
+
+
+def test_secrets_cache_is_shared_by_connectors(vault):
+    connect(vault)._get_secrets("secret_vars", "prod")
+    connect(vault)._get_secrets("secret_vars", "prod")
+
+    assert vault.stats["reads"] == 1
+
+
+def test_login_again_after_forbidden(vault):
+    con = connect(vault, cache_ttl=0)
+    revoked = con.client.token
+    # Revoked before its TTL, the cached token still looks valid.
+    vault.tokens.clear()
+
+    assert con._get_secrets("secret_vars", "prod") == SECRETS["prod/secret_vars"]
+    assert vault.stats["logins"] == 2
+    assert con.client.token != revoked
+    # The new token is cached for the next connectors.
+    assert connect(vault).client.token == con.client.token
+    assert vault.stats["logins"] == 2